@@ -0,0 +1,45 @@
+"""
+Benchmark: warming and reading a redis_lru_cache one call at a time versus with prefetch / get_many.
+Needs a running redis-server (REDIS_HOST / REDIS_PORT / REDIS_DB or --host/--port/--db).
+Keys are written under the 'bench_bulk' cache_id and removed afterwards.
+
+Usage:
+    python benchmarks/bench_bulk.py [--entries 5000]
+"""
+from HANK_Caching.decorators import redis_lru_cache
+from HANK_Caching.utils import RedisClientManager
+import argparse, time
+
+def timed(fn):
+    st = time.perf_counter()
+    fn()
+    return time.perf_counter() - st
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--entries', type=int, default=5000)
+    parser.add_argument('--host', default=None)
+    parser.add_argument('--port', type=int, default=None)
+    parser.add_argument('--db', type=int, default=None)
+    args = parser.parse_args()
+    conn = {k: v for k, v in (('host', args.host), ('port', args.port), ('db', args.db)) if v is not None}
+    RedisClientManager.get_redis_client(name='bench_bulk', raise_on_error=True, **conn)
+
+    @redis_lru_cache(cache_id='bench_bulk', maxsize=None, ttl=600)
+    def lookup(code):
+        return {'code': code, 'description': f"code {code}"}
+
+    calls = [(i,) for i in range(args.entries)]
+    n = len(calls)
+    lookup.cache_clear()
+    warm_sequential = timed(lambda: [lookup(*call) for call in calls])
+    read_sequential = timed(lambda: [lookup(*call) for call in calls])
+    lookup.cache_clear()
+    warm_bulk = timed(lambda: lookup.prefetch(calls))
+    read_bulk = timed(lambda: lookup.get_many(calls))
+    lookup.cache_clear()
+    print(f"warm  sequential {warm_sequential / n * 1e6:8.1f} us/entry   prefetch {warm_bulk / n * 1e6:8.1f} us/entry")
+    print(f"read  sequential {read_sequential / n * 1e6:8.1f} us/entry   get_many {read_bulk / n * 1e6:8.1f} us/entry")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Benchmark: clear time of a redis_lru_cache versus its entry count.
+  - per-key: read the whole index, then one DELETE round trip per entry (how cache_clear used to work)
+  - chunked: tag_index.clear_prefix, which detaches the index and UNLINKs --chunk entries per script call
+While each clear runs, another client PINGs the server in a loop; the worst PING latency shows how long the server
+was held at once.
+Needs a running redis-server (REDIS_HOST / REDIS_PORT / REDIS_DB). Keys are written under 'bench_clear'.
+
+Usage:
+    python benchmarks/bench_clear.py [--sizes 1000,10000,100000] [--chunk 1000]
+"""
+from HANK_Caching.decorators import redis_lru_cache
+from HANK_Caching.utils import RedisClientManager
+from HANK_Caching import redis_scripts, tag_index
+import argparse, threading, time
+
+def per_key_clear(redis_client, prefix):
+    lru_key, exp_key, legacy_key = redis_scripts.index_keys(prefix)
+    for key in redis_client.zrange(lru_key, 0, -1):
+        redis_client.delete(key, key + b":chunks")
+    redis_client.delete(lru_key, exp_key, legacy_key)
+
+def fill(cached, entries):
+    for start in range(0, entries, 5000):
+        cached.set_many([((x,), {'x': x, 'payload': 'x' * 100}) for x in range(start, min(entries, start + 5000))])
+
+def timed_with_probe(fn):
+    # run fn while a second client pings; returns (seconds, worst ping latency in seconds)
+    probe = RedisClientManager.get_redis_client(name='bench_clear_probe')
+    done, worst = threading.Event(), [0.0]
+    def ping():
+        while not done.is_set():
+            st = time.perf_counter()
+            probe.ping()
+            worst[0] = max(worst[0], time.perf_counter() - st)
+    thread = threading.Thread(target=ping)
+    thread.start()
+    st = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - st
+    done.set()
+    thread.join()
+    return elapsed, worst[0]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000,100000')
+    parser.add_argument('--chunk', type=int, default=1000)
+    args = parser.parse_args()
+    cached = redis_lru_cache(cache_id='bench_clear', maxsize=None)(lambda x: x)
+    redis_client, prefix = cached.redis_client, cached.cache_key_prefix
+    if redis_client is None:
+        raise SystemExit("Redis is not available")
+    print(f"{'entries':>9} {'per-key clear':>15} {'worst ping':>11} {'chunked clear':>15} {'worst ping':>11}")
+    for entries in (int(size) for size in args.sizes.split(',')):
+        fill(cached, entries)
+        old, old_ping = timed_with_probe(lambda: per_key_clear(redis_client, prefix))
+        fill(cached, entries)
+        new, new_ping = timed_with_probe(lambda: tag_index.clear_prefix(redis_client, prefix, args.chunk))
+        print(f"{entries:>9} {old * 1000:>12.1f} ms {old_ping * 1000:>8.1f} ms {new * 1000:>12.1f} ms {new_ping * 1000:>8.1f} ms")
+
+if __name__ == "__main__":
+    main()
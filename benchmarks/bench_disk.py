@@ -0,0 +1,76 @@
+"""
+Warm start with disk_lru_cache: a "restarted worker" (a fresh process) serving requests its predecessor already cached.
+Each scenario runs in a new interpreter and reports the time from process start (before importing HANK_Caching) to
+the first result, and the time to serve the first --requests requests, for:
+  - memory: conditional_lru_cache, which starts empty after a restart, so every request computes
+  - disk: disk_lru_cache on a database filled by the previous process
+It also reports steady-state disk hit and miss latency.
+
+Usage:
+    python benchmarks/bench_disk.py [--entries 2000] [--requests 500] [--compute-ms 5]
+"""
+import argparse, json, os, subprocess, sys, tempfile, time
+
+def child(mode, path, entries, requests, compute_ms):
+    st = time.perf_counter()
+    from HANK_Caching.decorators import conditional_lru_cache, disk_lru_cache
+    def expensive(x):
+        time.sleep(compute_ms / 1000)
+        return {'x': x, 'payload': list(range(50))}
+    if mode == 'memory':
+        cached = conditional_lru_cache(maxsize=entries)(expensive)
+    else:
+        cached = disk_lru_cache(maxsize=entries, path=path, cache_id='bench')(expensive)
+    if mode == 'fill':
+        cached.prefetch([(x,) for x in range(entries)])
+        cached.store.flush()
+        return {}
+    cached(0)
+    first = time.perf_counter() - st
+    for x in range(1, requests):
+        cached(x)
+    served = time.perf_counter() - st
+    result = {'first': first, 'served': served}
+    if mode == 'disk':
+        n = 2000
+        t = time.perf_counter()
+        for i in range(n):
+            cached(i % entries)
+        result['hit_us'] = (time.perf_counter() - t) / n * 1e6
+        uncached = disk_lru_cache(maxsize=entries, path=path, cache_id='bench-miss')(lambda x: x)
+        t = time.perf_counter()
+        for i in range(n):
+            uncached(i)
+        result['miss_us'] = (time.perf_counter() - t) / n * 1e6
+    return result
+
+def run(mode, path, entries, requests, compute_ms):
+    out = subprocess.run([sys.executable, __file__, '--child', mode, '--path', path, '--entries', str(entries),
+                          '--requests', str(requests), '--compute-ms', str(compute_ms)],
+                         check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+def main(entries=2000, requests=500, compute_ms=5.0):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'cache.sqlite3')
+        st = time.perf_counter()
+        run('fill', path, entries, requests, compute_ms)
+        print(f"filled {entries} entries in {time.perf_counter() - st:.2f}s ({os.path.getsize(path) / 1e6:.1f}MB)")
+        memory, disk = run('memory', path, entries, requests, compute_ms), run('disk', path, entries, requests, compute_ms)
+    print(f"{'restarted worker':<22} {'first result':>14} {f'first {requests} requests':>22}")
+    for name, result in (('memory (starts cold)', memory), ('disk (starts warm)', disk)):
+        print(f"{name:<22} {result['first'] * 1000:>11.1f} ms {result['served'] * 1000:>19.1f} ms")
+    print(f"disk hit {disk['hit_us']:.1f} us, disk miss (store included) {disk['miss_us']:.1f} us")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--entries', type=int, default=2000)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--compute-ms', type=float, default=5.0)
+    parser.add_argument('--child')
+    parser.add_argument('--path')
+    args = parser.parse_args()
+    if args.child:
+        print(json.dumps(child(args.child, args.path, args.entries, args.requests, args.compute_ms)))
+    else:
+        main(args.entries, args.requests, args.compute_ms)
@@ -0,0 +1,83 @@
+"""
+Benchmark: CachingBase construction with func_cache_map set in __init__ (every instance decorates every method)
+versus func_cache_map defined on a lazy_caching class (wired once; an instance decorates a method on its first call).
+Reports the time to construct an instance, to construct one and call one cached method, and the memory each live
+instance holds after that call (tracemalloc). Uses Redis (REDIS_HOST / REDIS_PORT) for the redis_lru_cache methods
+when it's available; without it those methods just run uncached.
+
+Usage:
+    python benchmarks/bench_instantiation.py [--instances 2000]
+"""
+from HANK_Caching.base import CachingBase
+from HANK_Caching.decorators import conditional_lru_cache, redis_lru_cache
+import argparse, time, tracemalloc
+
+def config(cache_id):
+    return {
+        'lookup': {'decorator': redis_lru_cache, 'cache_id': cache_id, 'tags': ['lookup'], 'ttl': 600},
+        'history': {'decorator': redis_lru_cache, 'cache_id': f"{cache_id}_history", 'tags': ['history']},
+        'score': {'decorator': conditional_lru_cache, 'maxsize': 128, 'tags': ['score']},
+        'format': {'decorator': conditional_lru_cache, 'maxsize': 128},
+    }
+
+class Methods:
+    def lookup(self, code):
+        return {'code': code}
+
+    def history(self, code):
+        return [code]
+
+    def score(self, code):
+        return len(code)
+
+    def format(self, code):
+        return str(code)
+
+class PerInstance(Methods, CachingBase):
+    def __init__(self, tenant='a'):
+        self.func_cache_map = config(f"bench_instantiation_{tenant}")
+        super().__init__()
+
+class ClassLevel(Methods, CachingBase):
+    lazy_caching = True
+    func_cache_map = {**config(None), 'lookup': {**config(None)['lookup'], 'cache_id': lambda self: f"bench_instantiation_{self.tenant}"},
+                      'history': {**config(None)['history'], 'cache_id': lambda self: f"bench_instantiation_{self.tenant}_history"}}
+
+    def __init__(self, tenant='a'):
+        self.tenant = tenant
+        super().__init__()
+
+def per_instance_us(fn, n):
+    st = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - st) / n * 1e6
+
+def memory_per_instance(cls, n):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    keep = []
+    for _ in range(n):
+        instance = cls()
+        instance.lookup('A')
+        keep.append(instance)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / n
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--instances', type=int, default=2000)
+    args = parser.parse_args()
+    n = args.instances
+    print(f"{'func_cache_map':<16} {'construct':>12} {'construct + 1 call':>20} {'memory/instance':>17}")
+    for label, cls in (('in __init__', PerInstance), ('lazy, on the class', ClassLevel)):
+        cls().lookup('A')  # warm up: client created, entry cached
+        construct = per_instance_us(cls, n)
+        construct_call = per_instance_us(lambda: cls().lookup('A'), n)
+        memory = memory_per_instance(cls, n)
+        print(f"{label:<16} {construct:>9.1f} us {construct_call:>17.1f} us {memory / 1024:>14.1f} KB")
+    ClassLevel().clear_caches()
+
+if __name__ == "__main__":
+    main()
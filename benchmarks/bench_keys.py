@@ -0,0 +1,49 @@
+"""
+Microbenchmark: per-call key building and the conditional_lru_cache hit path.
+Compares make_hashable_key (signature bound on every call) with the key function compiled
+once at decoration time by compile_key_builder.
+
+Usage:
+    python benchmarks/bench_keys.py [--number 100000]
+"""
+from HANK_Caching.utils import make_hashable_key, compile_key_builder
+from HANK_Caching.transforms import dos_transform_YYYYMM, zipcode_4
+from cachetools import LRUCache, cached
+import argparse, datetime, timeit
+
+class Sample:
+    def test_func(self, a, b, dos=None, quiet=None, **kwargs):
+        return a, b
+
+def main(number=100000):
+    func = Sample().test_func
+    transforms = {'dos': dos_transform_YYYYMM, 'zipcode': zipcode_4, 'quiet': lambda x: True}
+    args, kwargs = (1, 2), {'dos': datetime.datetime(2024, 5, 17), 'zipcode': 29220}
+    make_key = compile_key_builder(func, prefix='test_func', arg_transforms=transforms, use_id=False)
+    assert make_key(args, kwargs) == make_hashable_key(func, args, kwargs, prefix='test_func', arg_transforms=transforms, use_id=False)
+
+    #the hit path as it was: a fresh cached() wrapper and a signature bind per call
+    cache = LRUCache(128)
+    legacy_key = lambda *a, **kw: make_hashable_key(func, a, kw, prefix='test_func', arg_transforms=transforms, use_id=False)
+    cached(cache, key=legacy_key)(func)(*args, **kwargs)
+    legacy_hit = lambda: cached(cache, key=legacy_key)(func)(*args, **kwargs)
+    #the hit path now: compiled key + direct lookup
+    compiled_hit = lambda: cache[make_key(args, kwargs)]
+
+    results = {
+        'make_hashable_key': lambda: make_hashable_key(func, args, kwargs, prefix='test_func', arg_transforms=transforms, use_id=False),
+        'compiled key': lambda: make_key(args, kwargs),
+        'hit path (legacy)': legacy_hit,
+        'hit path (compiled)': compiled_hit,
+    }
+    timings = {}
+    for name, fn in results.items():
+        timings[name] = min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+        print(f"{name:<22} {timings[name]:8.3f} us/call")
+    print(f"key build speedup: {timings['make_hashable_key'] / timings['compiled key']:.1f}x")
+    print(f"hit path speedup:  {timings['hit path (legacy)'] / timings['hit path (compiled)']:.1f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=100000)
+    main(parser.parse_args().number)
@@ -0,0 +1,57 @@
+"""
+Benchmark: time per hit and peak memory for large buffer-backed results, 'legacy' pickle vs the 'oob'
+(pickle protocol 5 out-of-band, chunked) serializer.
+Needs a running redis-server (REDIS_HOST / REDIS_PORT / REDIS_DB or --host/--port/--db).
+Peak memory is Python allocations traced by tracemalloc during one hit (redis-py's reply buffers included).
+
+Usage:
+    python benchmarks/bench_oob.py [--mb 64] [--hits 5]
+"""
+from HANK_Caching.decorators import redis_lru_cache
+from HANK_Caching.serializers import OutOfBandSerializer
+from HANK_Caching.utils import RedisClientManager
+import argparse, time, tracemalloc
+
+def payloads(mb):
+    out = {'bytearray': lambda: bytearray(mb * 1024 * 1024)}
+    try:
+        import numpy as np
+        out['numpy float64'] = lambda: np.ones(mb * 1024 * 1024 // 8)
+    except ImportError:
+        pass
+    return out
+
+def measure(cached, hits):
+    cached(0)  # miss: store
+    times = []
+    for _ in range(hits):
+        st = time.perf_counter()
+        cached(0)
+        times.append(time.perf_counter() - st)
+    tracemalloc.start()
+    cached(0)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(times) * 1e3, peak / 1024 / 1024
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--mb', type=int, default=64)
+    parser.add_argument('--hits', type=int, default=5)
+    parser.add_argument('--host', default=None)
+    parser.add_argument('--port', type=int, default=None)
+    parser.add_argument('--db', type=int, default=None)
+    args = parser.parse_args()
+    conn = {k: v for k, v in (('host', args.host), ('port', args.port), ('db', args.db)) if v is not None}
+    RedisClientManager.get_redis_client(name="bench_oob", raise_on_error=True, **conn)
+    print(f"{'payload':<15} {'serializer':<8} {'ms/hit':>9} {'peak MB/hit':>12}")
+    for pname, make in payloads(args.mb).items():
+        for sname, serializer in (('legacy', None), ('oob', OutOfBandSerializer())):
+            cached = redis_lru_cache(cache_id="bench_oob", maxsize=2, serializer=serializer)(lambda i: make())
+            cached.cache_clear()
+            ms, peak = measure(cached, args.hits)
+            cached.cache_clear()
+            print(f"{pname:<15} {sname:<8} {ms:>9.1f} {peak:>12.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Trace replay: hit ratios of the in-process eviction policies (conditional_lru_cache's policy option) on key streams.
+Each trace is replayed against every policy at every cache size: a lookup that misses stores the key.
+Traces are text files with one key per line (e.g. cache keys or request arguments pulled from logs); without --trace,
+synthetic traces are generated:
+  - zipf: skewed popularity over a large key space (a typical interactive workload)
+  - zipf+scan: the same, interleaved with a batch job sweeping once through cold keys
+  - loop: a cyclic pattern a little larger than the cache (LRU's worst case)
+
+Usage:
+    python benchmarks/bench_policies.py [--trace keys.txt ...] [--sizes 100 1000] [--policies lru lfu tinylfu arc]
+"""
+from HANK_Caching.policies import make_policy_cache
+from itertools import accumulate
+import argparse, random, time
+
+def zipf(n, keys=10000, alpha=0.9, rng=None):
+    rng = rng or random.Random(0)
+    weights = list(accumulate(1 / (rank ** alpha) for rank in range(1, keys + 1)))
+    return rng.choices(range(keys), cum_weights=weights, k=n)
+
+def zipf_scan(n, scan_share=0.3, rng=None):
+    rng = rng or random.Random(0)
+    hot, cold, trace = iter(zipf(n, rng=rng)), 0, []
+    for _ in range(n):
+        if rng.random() < scan_share:
+            trace.append(f"cold-{cold}")
+            cold += 1
+        else:
+            trace.append(next(hot))
+    return trace
+
+def loop(n, length):
+    return [i % length for i in range(n)]
+
+def read_trace(path):
+    with open(path) as f:
+        return [line.rstrip('\n') for line in f if line.strip()]
+
+def replay(cache, trace):
+    hits = 0
+    for key in trace:
+        try:
+            cache[key]
+            hits += 1
+        except KeyError:
+            cache[key] = True
+    return hits / len(trace)
+
+def main(traces=None, sizes=(100, 1000), policies=('lru', 'lfu', 'tinylfu', 'arc'), n=200000):
+    print(f"{'trace':<20} {'size':>6} " + " ".join(f"{policy:>9}" for policy in policies) + "   (hit ratio)")
+    for size in sizes:
+        if traces:
+            named = {path: read_trace(path) for path in traces}
+        else:
+            named = {'zipf': zipf(n), 'zipf+scan': zipf_scan(n), 'loop': loop(n, int(size * 1.2))}
+        for name, trace in named.items():
+            ratios, timings = [], []
+            for policy in policies:
+                cache = make_policy_cache(policy, size)
+                st = time.perf_counter()
+                ratios.append(replay(cache, trace))
+                timings.append((time.perf_counter() - st) / len(trace) * 1e6)
+            print(f"{name:<20} {size:>6} " + " ".join(f"{ratio:>9.3f}" for ratio in ratios)
+                  + "   " + " ".join(f"{t:.2f}" for t in timings) + " us/op")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--trace', nargs='*', help="trace files, one key per line")
+    parser.add_argument('--sizes', nargs='*', type=int, default=[100, 1000])
+    parser.add_argument('--policies', nargs='*', default=['lru', 'lfu', 'tinylfu', 'arc'])
+    parser.add_argument('--n', type=int, default=200000, help="length of the synthetic traces")
+    args = parser.parse_args()
+    main(args.trace, args.sizes, args.policies, args.n)
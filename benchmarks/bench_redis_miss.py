@@ -0,0 +1,82 @@
+"""
+Benchmark: round trips and latency per redis_lru_cache miss, before and after the single-script miss path.
+Needs a running redis-server (REDIS_HOST / REDIS_PORT / REDIS_DB or --host/--port/--db).
+Keys are written under the 'bench_redis_miss' prefix and removed afterwards.
+
+Usage:
+    python benchmarks/bench_redis_miss.py [--misses 2000] [--maxsize 500] [--ttl 60]
+"""
+from HANK_Caching import redis_scripts
+from HANK_Caching.utils import RedisClientManager
+import argparse, pickle, time
+
+PREFIX = "bench_redis_miss"
+
+class RoundTripCounter:
+    """Counts commands sent by a client (each non-pipelined command is one round trip)."""
+    def __init__(self, client):
+        self.count = 0
+        self._execute = client.execute_command
+        client.execute_command = self
+
+    def __call__(self, *args, **kwargs):
+        self.count += 1
+        return self._execute(*args, **kwargs)
+
+def legacy_miss(r, cache_key, payload, ttl, maxsize):
+    """The miss path as it was: GET, SET/SETEX, LPUSH, LLEN, then RPOP and DELETE."""
+    r.get(cache_key)
+    if ttl:
+        r.setex(cache_key, ttl, payload)
+    else:
+        r.set(cache_key, payload)
+    r.lpush(f"{PREFIX}:keys", cache_key)
+    if maxsize and r.llen(f"{PREFIX}:keys") > maxsize:
+        oldest_key = r.rpop(f"{PREFIX}:keys")
+        r.delete(oldest_key)
+
+def script_miss(r, cache_key, payload, ttl, maxsize):
+    """The miss path now: GET (with recency touch), then one atomic STORE script."""
+    lru_key, exp_key, legacy_key = redis_scripts.index_keys(PREFIX)
+    redis_scripts.GET_AND_TOUCH(r, keys=(cache_key, lru_key), args=(redis_scripts.now_ms(),))
+    redis_scripts.STORE(r, keys=(lru_key, exp_key, legacy_key, cache_key),
+                        args=(redis_scripts.ttl_ms(ttl), maxsize or 0, redis_scripts.now_ms(), payload))
+
+def cleanup(r):
+    lru_key, exp_key, legacy_key = redis_scripts.index_keys(PREFIX)
+    keys = r.lrange(legacy_key, 0, -1) + r.zrange(lru_key, 0, -1)
+    if keys:
+        r.delete(*keys)
+    r.delete(lru_key, exp_key, legacy_key)
+
+def run(r, counter, miss, misses, ttl, maxsize):
+    cleanup(r)
+    payload = pickle.dumps({'result': list(range(20))})
+    counter.count = 0
+    st = time.perf_counter()
+    for i in range(misses):
+        miss(r, f"{PREFIX}:{i}", payload, ttl, maxsize)
+    elapsed = time.perf_counter() - st
+    trips = counter.count
+    cleanup(r)
+    return trips / misses, elapsed / misses * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--misses', type=int, default=2000)
+    parser.add_argument('--maxsize', type=int, default=500)
+    parser.add_argument('--ttl', type=int, default=60)
+    parser.add_argument('--host', default=None)
+    parser.add_argument('--port', type=int, default=None)
+    parser.add_argument('--db', type=int, default=None)
+    args = parser.parse_args()
+    conn = {k: v for k, v in (('host', args.host), ('port', args.port), ('db', args.db)) if v is not None}
+    r = RedisClientManager.get_redis_client(name=PREFIX, raise_on_error=True, **conn)
+    counter = RoundTripCounter(r)
+    script_miss(r, f"{PREFIX}:warmup", b"x", None, 0)  # load the scripts once so EVALSHA hits
+    for name, miss in (('legacy', legacy_miss), ('script', script_miss)):
+        trips, latency = run(r, counter, miss, args.misses, args.ttl, args.maxsize)
+        print(f"{name:<8} {trips:5.2f} round trips/miss  {latency:9.1f} us/miss")
+
+if __name__ == "__main__":
+    main()
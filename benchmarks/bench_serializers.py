@@ -0,0 +1,40 @@
+"""
+Benchmark: bytes stored and encode/decode time per serializer on representative payloads.
+
+Usage:
+    python benchmarks/bench_serializers.py [--number 20]
+"""
+from HANK_Caching.serializers import get_serializer, PickleSerializer
+import argparse, datetime, random, timeit
+
+def payloads():
+    rng = random.Random(0)
+    records = [{'code': f"{rng.randint(10000, 99999)}", 'zipcode': f"{rng.randint(10000, 99999)}",
+                'dos': datetime.date(2024, 1, 1) + datetime.timedelta(days=rng.randint(0, 365)),
+                'score': rng.random(), 'tags': ['keyphrase', 'billing']} for _ in range(5000)]
+    return {
+        'small dict': {'a': 1, 'b': [1, 2, 3], 'c': 'text'},
+        'records (5k dicts)': records,
+        'text (1MB)': ' '.join(rng.choice(['claim', 'patient', 'provider', 'code', 'modifier']) for _ in range(150000)),
+        'floats (100k)': [rng.random() for _ in range(100000)],
+        'bytes (1MB random)': rng.randbytes(1 << 20),
+    }
+
+def main(number=20):
+    codecs = {name: get_serializer(name) for name in ('legacy', 'pickle', 'zlib', 'lzma')}
+    codecs['zlib level 1'] = PickleSerializer(compression='zlib', level=1)
+    print(f"{'payload':<20} {'codec':<13} {'bytes':>10} {'ratio':>6} {'encode ms':>10} {'decode ms':>10}")
+    for pname, value in payloads().items():
+        baseline = None
+        for cname, codec in codecs.items():
+            data = codec.dumps(value)
+            baseline = baseline or len(data)
+            n = max(1, number // 10) if cname.startswith('lzma') else number
+            encode = min(timeit.repeat(lambda: codec.dumps(value), number=n, repeat=3)) / n * 1e3
+            decode = min(timeit.repeat(lambda: codec.loads(data), number=n, repeat=3)) / n * 1e3
+            print(f"{pname:<20} {cname:<13} {len(data):>10} {len(data) / baseline:>6.2f} {encode:>10.3f} {decode:>10.3f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=20)
+    main(parser.parse_args().number)
@@ -0,0 +1,79 @@
+"""
+Benchmark: one Redis node versus several, sharded with RedisClientManager.get_redis_client(nodes=...).
+  - caches: --threads threads calling --caches redis_lru_cache caches (hits); each cache lives on one node
+  - mget: ShardedRedis.mget of --keys keys spread over every node (one MGET per node, in parallel)
+With --spawn N, starts N redis-server processes on ports from --base-port (needs redis-server on PATH); otherwise pass
+the nodes with --nodes host:port,host:port (the first one is also the single-node baseline).
+
+Usage:
+    python benchmarks/bench_sharding.py --spawn 4 [--caches 32] [--threads 16] [--calls 2000] [--keys 5000]
+    python benchmarks/bench_sharding.py --nodes localhost:6379,localhost:6380
+"""
+from HANK_Caching.decorators import redis_lru_cache
+from HANK_Caching.utils import RedisClientManager
+from concurrent.futures import ThreadPoolExecutor
+import argparse, subprocess, time
+
+def spawn(count, base_port):
+    processes = [subprocess.Popen(['redis-server', '--port', str(port), '--save', '', '--appendonly', 'no'],
+                                  stdout=subprocess.DEVNULL) for port in range(base_port, base_port + count)]
+    time.sleep(0.5)
+    return processes, [f"localhost:{port}" for port in range(base_port, base_port + count)]
+
+def run_caches(label, nodes, caches, threads, calls):
+    cached = []
+    for i in range(caches):
+        name = f"bench_sharding_{label}_{i}"
+        RedisClientManager.get_redis_client(name=name, nodes=nodes, raise_on_error=True)
+        cached.append(redis_lru_cache(cache_id=name, maxsize=None)(lambda x, i=i: {'cache': i, 'x': x}))
+    for cache in cached:
+        cache.prefetch([(x,) for x in range(100)])
+    def worker(t):
+        for n in range(calls):
+            cached[(t + n) % caches](n % 100)
+    st = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(worker, range(threads)))
+    elapsed = time.perf_counter() - st
+    for cache in cached:
+        cache.cache_clear()
+    return threads * calls / elapsed
+
+def run_mget(label, nodes, keys):
+    client = RedisClientManager.get_redis_client(name=f"bench_sharding_{label}", nodes=nodes, raise_on_error=True)
+    names = [f"bench_sharding:{i}" for i in range(keys)]
+    client.mset({name: 'x' * 100 for name in names})
+    st = time.perf_counter()
+    for _ in range(20):
+        client.mget(names)
+    elapsed = (time.perf_counter() - st) / 20
+    client.delete(*names)
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--spawn', type=int, default=0)
+    parser.add_argument('--base-port', type=int, default=7100)
+    parser.add_argument('--nodes', default=None)
+    parser.add_argument('--caches', type=int, default=32)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--calls', type=int, default=2000)
+    parser.add_argument('--keys', type=int, default=5000)
+    args = parser.parse_args()
+    processes = []
+    if args.spawn:
+        processes, nodes = spawn(args.spawn, args.base_port)
+    else:
+        nodes = args.nodes.split(',') if args.nodes else ['localhost:6379']
+    try:
+        print(f"{'setup':<24} {'cache hits/s':>14} {f'mget of {args.keys} keys':>20}")
+        for label, setup in (('single', nodes[:1]), ('sharded', nodes)):
+            qps = run_caches(label, setup, args.caches, args.threads, args.calls)
+            mget = run_mget(label, setup, args.keys)
+            print(f"{f'{label} ({len(setup)} nodes)':<24} {qps:>14,.0f} {mget * 1000:>17.2f} ms")
+    finally:
+        for process in processes:
+            process.terminate()
+
+if __name__ == "__main__":
+    main()
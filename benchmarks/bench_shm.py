@@ -0,0 +1,73 @@
+"""
+Multi-process workers on one host: per-process conditional_lru_cache vs shared_lru_cache vs redis_lru_cache.
+Each of --workers processes reads the same --entries values (about --value-size bytes each), all of them cached,
+and reports its hit latency and memory. Memory is the workers' total PSS (proportional set size, so pages shared
+through /dev/shm are split between the processes mapping them instead of counted N times), minus what the same
+workers use with no cache. Redis is used at REDIS_HOST/REDIS_PORT and skipped if unreachable.
+
+Usage:
+    python benchmarks/bench_shm.py [--workers 4] [--entries 5000] [--value-size 1000]
+"""
+import argparse, multiprocessing, os, tempfile, time
+
+def pss_kb():
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                if line.startswith('Pss:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # no PSS outside Linux; peak RSS instead
+
+def worker(mode, entries, value_size, directory, rounds=3):
+    from HANK_Caching.decorators import conditional_lru_cache, shared_lru_cache, redis_lru_cache
+    def value(x):
+        return {'id': x, 'payload': 'x' * value_size}
+    if mode == 'none':
+        cached = value
+    elif mode == 'per-process':
+        cached = conditional_lru_cache(maxsize=entries)(value)
+    elif mode == 'shared':
+        cached = shared_lru_cache(maxsize=entries * 2, slot_size=value_size + 256, directory=directory, cache_id='bench')(value)
+    else:
+        cached = redis_lru_cache(maxsize=entries * 2, cache_id='bench-shm')(value)
+    for x in range(entries):
+        cached(x)  # warm: computes here, or hits what another worker stored
+    st = time.perf_counter()
+    for _ in range(rounds):
+        for x in range(entries):
+            cached(x)
+    return (time.perf_counter() - st) / (rounds * entries) * 1e6, pss_kb()
+
+def run(mode, workers, entries, value_size, directory):
+    ctx = multiprocessing.get_context('spawn')
+    with ctx.Pool(workers) as pool:
+        results = pool.starmap(worker, [(mode, entries, value_size, directory)] * workers)
+    return sum(us for us, _ in results) / workers, sum(kb for _, kb in results)
+
+def redis_available():
+    from HANK_Caching.utils import RedisClientManager
+    return RedisClientManager.get_redis_client(name='bench-shm') is not None
+
+def main(workers=4, entries=5000, value_size=1000):
+    modes = ['none', 'per-process', 'shared'] + (['redis'] if redis_available() else [])
+    with tempfile.TemporaryDirectory() as directory:
+        results = {mode: run(mode, workers, entries, value_size, directory) for mode in modes}
+    if 'redis' in results:
+        from HANK_Caching.decorators import redis_lru_cache
+        redis_lru_cache(cache_id='bench-shm')(lambda x: x).cache_clear()
+    baseline = results.pop('none')[1]
+    print(f"{workers} workers, {entries} entries of ~{value_size} bytes")
+    print(f"{'cache':<14} {'hit latency':>12} {'cache memory (total PSS)':>26}")
+    for mode, (us, kb) in results.items():
+        print(f"{mode:<14} {us:>9.2f} us {(kb - baseline) / 1024:>23.1f} MB")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--entries', type=int, default=5000)
+    parser.add_argument('--value-size', type=int, default=1000)
+    args = parser.parse_args()
+    main(args.workers, args.entries, args.value_size)
@@ -0,0 +1,38 @@
+"""
+Microbenchmark: cost of the stats option on the conditional_lru_cache hit path.
+Compares the wrapper with stats off (the default) and on against the bare work of a hit (compiled key + cache lookup),
+so the "off" overhead shows what the None checks cost.
+
+Usage:
+    python benchmarks/bench_stats.py [--number 200000]
+"""
+from HANK_Caching.decorators import conditional_lru_cache
+from HANK_Caching.utils import compile_key_builder
+from cachetools import LRUCache
+import argparse, timeit
+
+def func(a, b, c=None):
+    return a, b
+
+def main(number=200000):
+    off = conditional_lru_cache()(func)
+    on = conditional_lru_cache(stats=True)(func)
+    cache, make_key = LRUCache(128), compile_key_builder(func)
+    cache[make_key((1, 2), {})] = func(1, 2)
+    off(1, 2), on(1, 2)
+    paths = {
+        'bare hit (key + lookup)': lambda: cache[make_key((1, 2), {})],
+        'wrapper hit, stats off': lambda: off(1, 2),
+        'wrapper hit, stats on': lambda: on(1, 2),
+    }
+    timings = {}
+    for name, fn in paths.items():
+        timings[name] = min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+        print(f"{name:<26} {timings[name]:8.3f} us/call")
+    print(f"stats on costs {timings['wrapper hit, stats on'] - timings['wrapper hit, stats off']:.3f} us/hit; "
+          f"{on.cache_stats()['hits']} hits recorded")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=200000)
+    main(parser.parse_args().number)
@@ -0,0 +1,45 @@
+"""
+Benchmark: caller-visible latency of redis_lru_cache misses, writing on the caller's thread versus write-behind.
+The cached function returns immediately, so any latency above the lookup itself is the cost of the write.
+Needs a running redis-server (REDIS_HOST / REDIS_PORT / REDIS_DB or --host/--port/--db).
+Keys are written under the 'bench_write_behind' cache_id and removed afterwards.
+
+Usage:
+    python benchmarks/bench_write_behind.py [--misses 5000]
+"""
+from HANK_Caching.decorators import redis_lru_cache
+from HANK_Caching.concurrency import WriteBehind
+from HANK_Caching.utils import RedisClientManager
+import argparse, time
+
+def run(misses, write_behind):
+    @redis_lru_cache(cache_id='bench_write_behind', maxsize=None, ttl=600, write_behind=write_behind)
+    def lookup(code):
+        return {'code': code}
+    lookup.cache_clear()
+    st = time.perf_counter()
+    for i in range(misses):
+        lookup(i)
+    elapsed = time.perf_counter() - st
+    if write_behind is not None:
+        write_behind.flush()
+    lookup.cache_clear()
+    return elapsed / misses * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--misses', type=int, default=5000)
+    parser.add_argument('--host', default=None)
+    parser.add_argument('--port', type=int, default=None)
+    parser.add_argument('--db', type=int, default=None)
+    args = parser.parse_args()
+    conn = {k: v for k, v in (('host', args.host), ('port', args.port), ('db', args.db)) if v is not None}
+    RedisClientManager.get_redis_client(name='bench_write_behind', raise_on_error=True, **conn)
+    through = run(args.misses, None)
+    queue = WriteBehind(max_queue=args.misses)
+    behind = run(args.misses, queue)
+    print(f"write-through {through:8.1f} us/miss")
+    print(f"write-behind  {behind:8.1f} us/miss   {queue.stats()}")
+
+if __name__ == "__main__":
+    main()
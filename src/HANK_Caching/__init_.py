@@ -1,7 +1,19 @@
 from .base import CachingBase
-from .decorators import conditional_lru_cache, redis_lru_cache
+from .breaker import CircuitBreaker
+from .decorators import conditional_lru_cache, redis_lru_cache, disk_lru_cache, shared_lru_cache
+from .concurrency import SingleFlight, AsyncSingleFlight, RedisSingleFlight, BackgroundRefresher, WriteBehind
+from .disk import DiskStore
+from .invalidation import InvalidationBus
+from .memory import MemoryBudget, estimate_size, set_memory_budget, get_memory_budget
+from .policies import WTinyLFUCache, ARCCache
+from .stats import CacheStats, LatencyHistogram, merge_snapshots
+from .admission import AdmissionPolicy
+from .negative import NegativeCache
+from .shm import SharedMemoryCache
+from .sharding import HashRing, ShardedRedis
+from .serializers import Serializer, PickleSerializer, LegacyPickleSerializer, OutOfBandSerializer, get_serializer
 from .transforms import dos_transform, dos_transform_YYYYMM, zipcode_4
-from .utils import RedisClientManager, make_hashable, make_hashable_key, hash_key, compress_key, decompress_key, get_function_identity
+from .utils import RedisClientManager, make_hashable, make_hashable_key, compile_key_builder, hash_key, compress_key, decompress_key, get_function_identity
 from .test import TestCachingBase
 
 __all__ = ['CachingBase']
\ No newline at end of file
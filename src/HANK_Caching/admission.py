@@ -0,0 +1,136 @@
+"""
+Admission control for the cache decorators (their admission option): which computed results are worth a cache slot.
+Caching a result that was cheap to compute saves little and evicts entries that were expensive; caching a huge one
+costs memory that could hold many others. An AdmissionPolicy decides per result, from how long it took to compute,
+its size and/or a predicate, and counts what it turned away and why.
+"""
+from collections import OrderedDict, deque
+import threading
+
+CHEAP, TOO_LARGE, PREDICATE = 'cheap', 'too_large', 'predicate'
+REASONS = (CHEAP, TOO_LARGE, PREDICATE)
+
+class AdmissionPolicy:
+    """
+    Admit a result into the cache only if:
+      - its key's compute cost is at least the threshold (min_compute, raised by adaptive). A key's cost is the moving
+        average of its compute times (per_key_alpha), so one fast or slow run doesn't decide for good: a key turned away
+        while cheap is admitted once it gets slow, and the other way around.
+      - its size is at most max_size bytes: the serialized payload for redis_lru_cache (what Redis would hold; the L1
+        tier is bounded separately, by l1_maxsize / l1_max_bytes), the getsizeof estimate for conditional_lru_cache.
+      - predicate(result) is true, e.g. lambda df: not df.empty.
+    Results stored with set_many / prefetch have no compute time, so only the size and predicate checks apply to them.
+    Args:
+      - min_compute: float. Seconds. default None (no cost check unless adaptive)
+      - max_size: int. Bytes. default None
+      - predicate: result -> bool. default None
+      - adaptive: float in (0, 1). Also reject keys cheaper than this quantile of the recent compute costs (the last
+        window of them, across keys), e.g. 0.25 keeps the cheapest quarter of computations out of the cache, whatever
+        their absolute cost. min_compute, if given, is then a floor. default None
+      - window: int. Compute costs the adaptive threshold is taken from. default 256
+      - per_key_alpha: float. Weight of the latest compute time in a key's moving average. default 0.5
+      - history_size: int. Keys whose cost history is kept (least recently computed ones are forgotten). default 10000
+    snapshot() has the admitted / rejected counts, rejections by reason, the current threshold and the last few
+    rejections; a decorator's CacheStats (stats option) also counts rejections by reason.
+    """
+    def __init__(self, min_compute:float=None, max_size:int=None, predicate=None, adaptive:float=None, window:int=256,
+                 per_key_alpha:float=0.5, history_size:int=10000):
+        if adaptive is not None and not 0 < adaptive < 1:
+            raise ValueError("adaptive is a quantile, between 0 and 1")
+        self.min_compute = min_compute
+        self.max_size = max_size
+        self.predicate = predicate
+        self.adaptive = adaptive
+        self.per_key_alpha = per_key_alpha
+        self.history_size = history_size
+        self.costs = OrderedDict()  # key -> moving average of its compute time
+        self.recent_costs = deque(maxlen=window)
+        self.measures_cost = min_compute is not None or adaptive is not None
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Zero the counters and forget the cost history."""
+        with self._lock:
+            self.admitted = 0
+            self.rejected = dict.fromkeys(REASONS, 0)
+            self.recent_rejections = deque(maxlen=20)
+            self.costs.clear()
+            self.recent_costs.clear()
+            self.threshold = self.min_compute or 0.0
+            self._since_threshold = 0
+
+    def admit(self, key, result, seconds:float=None, size:int=None, stats=None) -> bool:
+        """
+        Whether to cache result under key, given its compute time (seconds) and size (bytes), where known.
+        Counts the decision; a rejection is also counted on stats (a CacheStats), if given.
+        """
+        if seconds is not None and self.measures_cost:
+            cost = self.record_cost(key, seconds)
+            if cost < self.threshold:
+                return self.reject(key, CHEAP, cost, stats)
+        if size is not None and self.max_size is not None and size > self.max_size:
+            return self.reject(key, TOO_LARGE, size, stats)
+        if self.predicate is not None and not self.predicate(result):
+            return self.reject(key, PREDICATE, None, stats)
+        self.admitted += 1
+        return True
+
+    def admit_size(self, key, size:int, stats=None) -> bool:
+        """
+        The size check alone, for a result admit() already let through before it was serialized (redis_lru_cache
+        only knows the payload size when it writes); a rejection here takes back admit()'s count.
+        """
+        if self.max_size is not None and size > self.max_size:
+            self.admitted -= 1
+            return self.reject(key, TOO_LARGE, size, stats)
+        return True
+
+    def reject(self, key, reason:str, measure, stats=None) -> bool:
+        self.rejected[reason] += 1
+        self.recent_rejections.append((key, reason, measure))
+        if stats is not None:
+            stats.reject(reason)
+        return False
+
+    def record_cost(self, key, seconds:float) -> float:
+        """Fold seconds into key's moving average (and the adaptive threshold's window); returns the key's cost."""
+        with self._lock:
+            cost = self.costs.pop(key, None)
+            cost = seconds if cost is None else cost + self.per_key_alpha * (seconds - cost)
+            self.costs[key] = cost
+            if len(self.costs) > self.history_size:
+                self.costs.popitem(last=False)
+            if self.adaptive is not None:
+                self.recent_costs.append(seconds)
+                self._since_threshold += 1
+                # re-sorting the window on every call would cost more than most cache hits; every 16 samples is plenty
+                if self._since_threshold >= 16 or len(self.recent_costs) < 16:
+                    self._since_threshold = 0
+                    ordered = sorted(self.recent_costs)
+                    quantile = ordered[min(len(ordered) - 1, int(self.adaptive * len(ordered)))]
+                    self.threshold = max(self.min_compute or 0.0, quantile)
+            return cost
+
+    def cost(self, key):
+        """key's moving-average compute time in seconds, or None if it hasn't been seen (or was forgotten)."""
+        return self.costs.get(key)
+
+    def snapshot(self):
+        """A JSON-serializable dict of the counters, the current threshold and the last rejections."""
+        rejected = sum(self.rejected.values())
+        return {
+            'admitted': self.admitted,
+            'rejected': rejected,
+            'rejected_by_reason': dict(self.rejected),
+            'rejection_rate': rejected / (rejected + self.admitted) if rejected + self.admitted else None,
+            'threshold': self.threshold if self.measures_cost else None,
+            'recent_rejections': [{'key': str(key), 'reason': reason, 'measure': measure}
+                                  for key, reason, measure in list(self.recent_rejections)],
+        }
+
+def get_admission(admission):
+    """Resolve a decorator's admission argument: None (admit everything), an AdmissionPolicy, or a dict of its options."""
+    if isinstance(admission, dict):
+        return AdmissionPolicy(**admission)
+    return admission or None
@@ -1,17 +1,86 @@
 #%%
 from HANK_Caching.decorators import redis_lru_cache, conditional_lru_cache
 from HANK_Caching.utils import RedisClientManager
-import time, datetime, random, logging
+import inspect, time, datetime, random, logging
+
+
+class CachedMethod:
+    """
+    A method listed in the class-level func_cache_map of a class with lazy_caching = True (see
+    CachingBase.__init_subclass__). The decorator configuration is
+    worked out once per class; the first access on an instance decorates that instance's bound method and stores the
+    wrapper in the instance's __dict__, so later accesses are plain attribute lookups and an instance never pays for
+    the methods it doesn't call. A callable cache_id is called with the instance, for per-instance caches.
+    """
+    def __init__(self, name:str, func, config:dict):
+        self.name = name
+        self.func = func
+        self.source = config
+        self.config = dict(config)
+        self.decorator = self.config.pop('decorator', conditional_lru_cache)
+        self.cache_id = self.config.get('cache_id') if callable(self.config.get('cache_id')) else None
+        self.__doc__ = getattr(func, '__doc__', None)
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        config = self.config if self.cache_id is None else {**self.config, 'cache_id': self.cache_id(instance)}
+        wrapper = self.decorator(**config)(self.func.__get__(instance, owner))
+        if not getattr(instance, 'caches_enabled', True) and wrapper.enabled:
+            wrapper.disable_cache(quiet=True)
+        instance.__dict__[self.name] = wrapper
+        return wrapper
 
 
 class CachingBase:
     SENTINEL = object()
+    lazy_caching = False
+    _cache_descriptors = {}
     
+    def __init_subclass__(cls, **kwargs):
+        """
+        With lazy_caching = True on the class, a func_cache_map defined on the class (rather than set in __init__) is
+        wired once, here: each listed method becomes a CachedMethod, decorated per instance on first use, and __init__
+        no longer decorates anything. Per-instance cache_ids can then be given as a callable taking the instance,
+        e.g. lambda self: f"{self.name}_lookup". Otherwise __init__ decorates every listed method, as usual.
+        """
+        super().__init_subclass__(**kwargs)
+        function_cache_map = inspect.getattr_static(cls, 'func_cache_map', None) if cls.lazy_caching else {}
+        if not isinstance(function_cache_map, dict):
+            return
+        descriptors = {}
+        for func_name, config in function_cache_map.items():
+            attr = inspect.getattr_static(cls, func_name, None)
+            if attr is None:
+                raise AttributeError(f"Method '{func_name}' not found in class {cls.__name__}")
+            if not (isinstance(attr, CachedMethod) and attr.source is config):
+                func = attr.func if isinstance(attr, CachedMethod) else attr
+                attr = CachedMethod(func_name, func, config)
+                setattr(cls, func_name, attr)
+                setattr(cls, f"__ORIGINAL_{func_name}", func)
+            descriptors[func_name] = attr
+        for func_name, inherited in cls._cache_descriptors.items():
+            # methods dropped from an overriding func_cache_map (or all of them, in a subclass that turns lazy_caching
+            # off) go back to being plain methods
+            if func_name not in descriptors and inspect.getattr_static(cls, func_name) is inherited:
+                setattr(cls, func_name, inherited.func)
+        cls._cache_descriptors = descriptors
+
     def __init__(self, caches_enabled=True, cached_methods:list=None, quiet=True):
         self.quiet = quiet
         self._cached_methods = cached_methods if cached_methods else []
         self.caches_enabled=caches_enabled
         
+        if self._cache_descriptors and 'func_cache_map' not in self.__dict__:
+            # class-level func_cache_map: methods are decorated on first use (see CachedMethod), disabled if need be
+            self._cached_methods = list(self._cache_descriptors)
+            if not caches_enabled:
+                # methods already used (e.g. in a subclass's __init__ before this ran); the rest start disabled
+                for method_name in self._cached_methods:
+                    if method_name in self.__dict__:
+                        self.__dict__[method_name].disable_cache(quiet=self.quiet)
+            return
+
         if hasattr(self, 'func_cache_map'):
             self._cached_methods = self.initialize_caching(self.func_cache_map, quiet=self.quiet)
             
@@ -34,7 +103,8 @@ class CachingBase:
             
         cached_methods = []
         for func_name, config in function_cache_map.items():
-            func = getattr(self, func_name)
+            descriptor = self._cache_descriptors.get(func_name)
+            func = descriptor.func.__get__(self, type(self)) if descriptor is not None else getattr(self, func_name)
             if func is None:
                 raise AttributeError(f"Method '{func_name}' not found in class {self.__class__.__name__}")
             #pop the decorator
@@ -76,8 +146,8 @@ class CachingBase:
                 if hasattr(self, f"__ORIGINAL_{method_name}"):
                     original_method = getattr(self, f"__ORIGINAL_{method_name}")
                     setattr(self, method_name, original_method)
-                    #optionally remove the orginal method
-                    if remove_originals: delattr(self, f"__ORIGINAL_{method_name}")
+                    #optionally remove the orginal method (class-wired methods keep theirs on the class)
+                    if remove_originals and f"__ORIGINAL_{method_name}" in self.__dict__: delattr(self, f"__ORIGINAL_{method_name}")
                 if not quiet: print(f"Removed caching from {method.__name__}")
             else:
                 remaining_caches.append(method_name)
@@ -92,16 +162,69 @@ class CachingBase:
             out += f"\n-> {method.__name__}: id={id(method)}. enabled={enabled}. cacheinfo={cache_info}"
         return out
 
-    def clear_caches(self, tags=[], quiet=None, gc=False):
-        """Clear all lru_cache caches."""
-        import gc
+    def clear_caches(self, tags=[], quiet=None, gc=False, broadcast_tags=False, everywhere=False):
+        """
+        Clear all lru_cache caches.
+        Methods with an invalidation bus (redis_lru_cache with l1_maxsize and invalidation_bus) also clear their L1 tier
+        in other processes. With broadcast_tags=True, every process additionally clears the L1 tier of every registered
+        method carrying any of tags, not just the methods of this instance.
+        With everywhere=True (and tags), every redis_lru_cache carrying any of tags is also cleared in Redis, whichever
+        process or class created it (see tag_index.invalidate_tags).
+        """
         quiet = quiet if quiet is not None else self.quiet
+        buses = []
         for method_name in self._cached_methods:
             method = getattr(self, method_name)
             if not tags or method.tags.intersection(tags):
                 method.cache_clear(quiet=quiet)
-        if gc: gc.collect()
+                bus = getattr(method, 'invalidation_bus', None)
+                if bus is not None and bus not in buses:
+                    buses.append(bus)
+        if broadcast_tags and tags:
+            for bus in buses:
+                bus.invalidate_tags(tags)
+        if everywhere and tags:
+            from HANK_Caching.tag_index import invalidate_tags
+            invalidate_tags(tags, broadcast=False)
+        if gc:
+            import gc
+            gc.collect()
     
+    def cache_stats(self, tags=[]):
+        """
+        Snapshot the stats of the cached methods (those decorated with stats=True or a stats.CacheStats).
+        Returns {'methods': {method_name: snapshot}, 'total': the snapshots merged}, limited to methods with any of tags.
+        """
+        from HANK_Caching.stats import merge_snapshots
+        methods = {}
+        for method_name in self._cached_methods:
+            method = getattr(self, method_name)
+            if (not tags or method.tags.intersection(tags)) and getattr(method, 'stats', None) is not None:
+                methods[method_name] = method.cache_stats()
+        return {'methods': methods, 'total': merge_snapshots(methods.values(), name=self.__class__.__name__)}
+
+    def reset_cache_stats(self, tags=[]):
+        """Zero the stats of the cached methods with any of tags."""
+        for method_name in self._cached_methods:
+            method = getattr(self, method_name)
+            if (not tags or method.tags.intersection(tags)) and getattr(method, 'stats', None) is not None:
+                method.stats.reset()
+
+    def memory_usage(self, tags=[]):
+        """
+        Estimated bytes held by the byte-bounded in-process caches of the cached methods (conditional_lru_cache with
+        max_bytes or a memory budget, redis_lru_cache's L1 with l1_max_bytes or a budget), per method and in total.
+        For usage across all caches in the process, see memory.get_memory_budget().usage().
+        """
+        methods = {}
+        for method_name in self._cached_methods:
+            method = getattr(self, method_name)
+            if (not tags or method.tags.intersection(tags)) and getattr(method, 'memory_usage', None) is not None:
+                usage = method.memory_usage()
+                if usage is not None:
+                    methods[method_name] = usage
+        return {'methods': methods, 'total': sum(methods.values())}
+
     def remove_locks(self, tags=[], quiet=None):
         """Remove locks from all lru_cache methods."""
         quiet = quiet if quiet is not None else self.quiet
@@ -0,0 +1,329 @@
+"""
+Benchmark suite for the cache hot paths and backends, for catching performance regressions between commits.
+
+    python -m HANK_Caching.benchmark [--redis auto|server|fake|none] [--quick] [--only NAME,...]
+                                     [--json results.json] [--compare baseline.json] [--threshold 1.25]
+
+--redis server uses the Redis at REDIS_HOST / REDIS_PORT / REDIS_DB; fake starts a local stand-in (fakeredis's TCP
+server, `pip install fakeredis`) on a free local port, which the process benchmarks' workers reach as well; auto
+(the default) uses the server if it answers and the stand-in otherwise; none skips the Redis benchmarks.
+Each benchmark reports one or more metrics with a unit and whether lower or higher is better. --json writes them with
+the environment (commit, Python, Redis mode) as JSON ('-' for stdout); --compare reads such a file, prints the ratio
+of every metric to it and exits with status 1 if any got worse by more than --threshold.
+Timings are the median of several rounds. Numbers against the stand-in are only comparable with other stand-in runs.
+"""
+from HANK_Caching.base import CachingBase
+from HANK_Caching.decorators import conditional_lru_cache, redis_lru_cache
+from HANK_Caching.utils import RedisClientManager, compile_key_builder
+import argparse, atexit, gc, json, multiprocessing, os, platform, socket, statistics, subprocess, sys, threading, time, tracemalloc
+
+BENCHMARKS = {}
+PREFIX = "HANK_Caching_benchmark"
+
+def benchmark(name:str, redis:bool=False):
+    """Register fn(scale) -> {metric: (value, unit, better)} under name. Redis benchmarks are skipped without Redis."""
+    def register(fn):
+        fn.redis = redis
+        BENCHMARKS[name] = fn
+        return fn
+    return register
+
+def per_op(fn, n:int, rounds:int=5) -> float:
+    """Median microseconds per call of fn(i) over rounds of n calls."""
+    samples = []
+    for _ in range(rounds):
+        st = time.perf_counter()
+        for i in range(n):
+            fn(i)
+        samples.append((time.perf_counter() - st) / n * 1e6)
+    return statistics.median(samples)
+
+def us(value):
+    return (round(value, 3), 'us', 'lower')
+
+def value(x):
+    return {'id': x, 'name': f"item {x}", 'tags': ['a', 'b']}
+
+# ---- key building, hits and misses -------------------------------------------------------------------------------
+
+@benchmark('key_build')
+def key_build(scale):
+    def func(self, code, year=2024, region=None):
+        pass
+    positional = compile_key_builder(func, use_id=False)
+    transformed = compile_key_builder(func, arg_transforms={'code': str.upper}, use_id=False)
+    n = 2000 * scale
+    return {
+        'positional': us(per_op(lambda i: positional((None, i), {}), n)),
+        'keywords': us(per_op(lambda i: positional((None,), {'code': i, 'region': 'x'}), n)),
+        'transformed': us(per_op(lambda i: transformed((None, 'abc'), {}), n)),
+    }
+
+def hit_and_miss(make_cached, n):
+    # (hit, miss overhead) in us: a miss is timed against calling the function directly
+    cached = make_cached(value)
+    for i in range(100):
+        cached(i)
+    hit = per_op(lambda i: cached(i % 100), n)
+    direct = per_op(value, n)
+    counter = iter(range(10 ** 9))
+    miss = per_op(lambda i: cached(1000 + next(counter)), n // 4 or 1)
+    if hasattr(cached, 'cache_clear'):
+        cached.cache_clear()
+    return hit, max(0.0, miss - direct)
+
+@benchmark('memory_cache')
+def memory_cache(scale):
+    n = 5000 * scale
+    results = {}
+    for label, options in (('lru', {}), ('thread_safe', {'thread_safe': True}), ('tinylfu', {'policy': 'tinylfu'})):
+        hit, miss = hit_and_miss(lambda f: conditional_lru_cache(maxsize=n * 2, **options)(f), n)
+        results[f"{label}_hit"], results[f"{label}_miss_overhead"] = us(hit), us(miss)
+    return results
+
+@benchmark('redis_cache', redis=True)
+def redis_cache(scale):
+    n = 500 * scale
+    results = {}
+    for label, options in (('plain', {}), ('ttl', {'ttl': 600}), ('l1', {'l1_maxsize': 1000})):
+        hit, miss = hit_and_miss(lambda f: redis_lru_cache(cache_id=f"{PREFIX}_{label}", maxsize=n * 2, **options)(f), n)
+        results[f"{label}_hit"], results[f"{label}_miss_overhead"] = us(hit), us(miss)
+    return results
+
+# ---- CachingBase ----------------------------------------------------------------------------------------------------
+
+class _Methods:
+    def lookup(self, code):
+        return value(code)
+
+    def history(self, code):
+        return [code]
+
+    def score(self, code):
+        return len(str(code))
+
+def _method_map(cache_id):
+    return {
+        'lookup': {'decorator': conditional_lru_cache, 'maxsize': 256, 'tags': ['lookup']},
+        'history': {'decorator': conditional_lru_cache, 'maxsize': 256, 'tags': ['history']},
+        'score': {'decorator': conditional_lru_cache, 'maxsize': 256, 'tags': ['score', 'lookup']},
+    }
+
+class _InitMap(_Methods, CachingBase):
+    def __init__(self):
+        self.func_cache_map = _method_map(None)
+        super().__init__()
+
+class _ClassMap(_Methods, CachingBase):
+    func_cache_map = _method_map(None)
+
+@benchmark('caching_base')
+def caching_base(scale):
+    n = 1000 * scale
+    service = _InitMap()
+    for i in range(100):
+        service.lookup(i)
+        service.score(i)
+    return {
+        'construct_init_map': us(per_op(lambda i: _InitMap(), n)),
+        'construct_class_map': us(per_op(lambda i: _ClassMap(), n)),
+        'construct_class_map_and_call': us(per_op(lambda i: _ClassMap().lookup(1), n)),
+        'clear_caches_by_tag': us(per_op(lambda i: service.clear_caches(tags=['lookup']), n)),
+        'disable_enable_by_tag': us(per_op(lambda i: (service.disable_caching(tags=['lookup']), service.enable_caching(tags=['lookup'])), n)),
+    }
+
+# ---- concurrency --------------------------------------------------------------------------------------------------
+
+def _hammer(cached, calls, offset=0):
+    for i in range(calls):
+        cached((offset + i) % 500)
+
+def thread_throughput(make_cached, threads, calls):
+    cached = make_cached(value)
+    _hammer(cached, 500)
+    workers = [threading.Thread(target=_hammer, args=(cached, calls, t)) for t in range(threads)]
+    st = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - st
+    if hasattr(cached, 'cache_clear'):
+        cached.cache_clear()
+    return (round(threads * calls / elapsed), 'ops/s', 'higher')
+
+@benchmark('threads')
+def threads(scale):
+    calls = 2000 * scale
+    return {'memory_8_threads': thread_throughput(lambda f: conditional_lru_cache(maxsize=1000, thread_safe=True)(f), 8, calls)}
+
+@benchmark('redis_threads', redis=True)
+def redis_threads(scale):
+    calls = 200 * scale
+    return {'redis_8_threads': thread_throughput(lambda f: redis_lru_cache(cache_id=f"{PREFIX}_threads", maxsize=1000)(f), 8, calls)}
+
+def _process_worker(calls, offset):
+    cached = redis_lru_cache(cache_id=f"{PREFIX}_processes", maxsize=1000)(value)
+    _hammer(cached, 500)
+    st = time.perf_counter()
+    _hammer(cached, calls, offset)
+    return calls, time.perf_counter() - st
+
+@benchmark('redis_processes', redis=True)
+def redis_processes(scale):
+    calls, processes = 300 * scale, 4
+    with multiprocessing.get_context('spawn').Pool(processes) as pool:
+        results = pool.starmap(_process_worker, [(calls, p) for p in range(processes)])
+    redis_lru_cache(cache_id=f"{PREFIX}_processes")(value).cache_clear()
+    # aggregate rate while all workers run: total calls over the slowest worker's time
+    return {'redis_4_processes': (round(sum(c for c, _ in results) / max(t for _, t in results)), 'ops/s', 'higher')}
+
+# ---- memory -------------------------------------------------------------------------------------------------------
+
+@benchmark('memory_per_entry')
+def memory_per_entry(scale):
+    entries = 2000 * scale
+    results = {}
+    for label, options in (('lru', {}), ('max_bytes', {'max_bytes': 10 ** 9}), ('tinylfu', {'policy': 'tinylfu'})):
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        cached = conditional_lru_cache(maxsize=entries, **options)(lambda x: x)
+        for i in range(entries):
+            cached(i)  # small int values: what's measured is the cache's own overhead per entry
+        used = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        results[label] = (round(used / entries, 1), 'bytes', 'lower')
+        del cached
+    return results
+
+# ---- running, output and comparison -------------------------------------------------------------------------------
+
+STAND_IN = """
+import sys
+from fakeredis import TcpFakeServer
+TcpFakeServer(('127.0.0.1', int(sys.argv[1])), server_type='redis').serve_forever()
+"""
+
+def start_stand_in() -> int:
+    """
+    Start fakeredis's TCP server in a child process (so it doesn't compete with the benchmarks for the GIL), stopped
+    when this process exits; returns its port.
+    """
+    try:
+        import fakeredis
+    except ImportError:
+        raise SystemExit("--redis fake needs fakeredis>=2.26 (pip install fakeredis)")
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+    server = subprocess.Popen([sys.executable, '-c', STAND_IN, str(port)])
+    atexit.register(server.terminate)
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return port
+        except OSError:
+            if server.poll() is not None or time.monotonic() > deadline:
+                raise SystemExit("the fakeredis stand-in didn't start")
+            time.sleep(0.05)
+
+def setup_redis(mode:str) -> str:
+    """Point RedisClientManager (and worker processes, through the environment) at the Redis to use; returns the mode used."""
+    if mode in ('auto', 'server'):
+        if RedisClientManager.get_redis_client(name=f"{PREFIX}_probe") is not None:
+            return 'server'
+        if mode == 'server':
+            raise SystemExit("Redis is not available at REDIS_HOST / REDIS_PORT")
+    if mode in ('auto', 'fake'):
+        os.environ.update({'REDIS_HOST': '127.0.0.1', 'REDIS_PORT': str(start_stand_in()), 'REDIS_DB': '0'})
+        os.environ.pop('REDIS_NODES', None)
+        return 'fake'
+    return 'none'
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def run(names=None, redis:str='auto', quick:bool=False, progress=None) -> dict:
+    """Run the benchmarks (all, or those in names) and return {'meta': {...}, 'results': {name: {metric: {...}}}}."""
+    redis = setup_redis(redis)
+    scale = 1 if quick else 4
+    results = {}
+    for name, fn in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        if fn.redis and redis == 'none':
+            continue
+        if progress: progress(f"{name} ...")
+        results[name] = {metric: {'value': v, 'unit': unit, 'better': better} for metric, (v, unit, better) in fn(scale).items()}
+    meta = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'redis': redis,
+        'quick': quick,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+    return {'meta': meta, 'results': results}
+
+def compare(current:dict, baseline:dict, threshold:float=1.25) -> list:
+    """[(name, metric, baseline value, current value, ratio, regressed)] for the metrics in both; ratio > 1 is worse."""
+    rows = []
+    for name, metrics in current['results'].items():
+        for metric, result in metrics.items():
+            old = baseline.get('results', {}).get(name, {}).get(metric)
+            if old is None or not old['value'] or not result['value']:
+                continue
+            ratio = result['value'] / old['value'] if result['better'] == 'lower' else old['value'] / result['value']
+            rows.append((name, metric, old['value'], result['value'], ratio, ratio > threshold))
+    return rows
+
+def format_results(report:dict) -> str:
+    lines = [f"{'benchmark':<18} {'metric':<30} {'value':>14}"]
+    for name, metrics in report['results'].items():
+        for metric, result in metrics.items():
+            lines.append(f"{name:<18} {metric:<30} {result['value']:>14,} {result['unit']}")
+    return "\n".join(lines)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m HANK_Caching.benchmark', description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--redis', choices=('auto', 'server', 'fake', 'none'), default='auto')
+    parser.add_argument('--quick', action='store_true', help="fewer iterations, for smoke runs")
+    parser.add_argument('--only', default=None, help=f"comma-separated subset of: {', '.join(BENCHMARKS)}")
+    parser.add_argument('--json', default=None, help="write the results as JSON to this file ('-' for stdout)")
+    parser.add_argument('--compare', default=None, help="a previous --json file to compare against")
+    parser.add_argument('--threshold', type=float, default=1.25, help="ratio past which a metric counts as a regression")
+    args = parser.parse_args(argv)
+    names = set(args.only.split(',')) if args.only else None
+    unknown = (names or set()) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+    to_stdout = args.json == '-'
+    log = lambda message: print(message, file=sys.stderr if to_stdout else sys.stdout, flush=True)
+    report = run(names, redis=args.redis, quick=args.quick, progress=log)
+    if to_stdout:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        log(format_results(report))
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            rows = compare(report, json.load(f), args.threshold)
+        log(f"\ncompared with {args.compare} (ratio > 1 is worse; regression past {args.threshold}):")
+        for name, metric, old, new, ratio, regressed in rows:
+            log(f"{name:<18} {metric:<30} {old:>12,} -> {new:>12,}  x{ratio:.2f}{'  REGRESSION' if regressed else ''}")
+        if any(row[-1] for row in rows):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+"""
+Circuit breaker for the Redis calls on the cache decorators' hot path (see RedisClientManager.get_breaker).
+While Redis is failing, calls skip it right away (a miss, or a skipped store) instead of waiting for socket timeouts;
+after reset_timeout a probe call is let through (half-open), and a successful one closes the circuit again.
+"""
+import logging, threading, time
+
+try:
+    from redis.exceptions import ConnectionError as _RedisConnectionError, TimeoutError as _RedisTimeoutError
+    # what an unreachable, dead or stalled Redis raises (redis-py wraps socket errors in these)
+    REDIS_ERRORS = (_RedisConnectionError, _RedisTimeoutError)
+except ImportError:
+    REDIS_ERRORS = ()
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+class CircuitBreaker:
+    """
+    Closed: calls go through; failure_threshold consecutive failures open the circuit.
+    Open: calls are rejected (allow() is False) for reset_timeout seconds.
+    Half-open: up to half_open_calls probe calls go through; a success closes the circuit, a failure reopens it.
+    Counters (see snapshot()): successes, failures, rejected calls, times opened. Listeners added with add_listener are
+    called as listener(name, old_state, new_state) on every transition, e.g. to forward to a metrics system.
+    Args:
+      - name: str. For logs and metrics
+      - failure_threshold: int. Consecutive failures that open the circuit. default 5
+      - reset_timeout: float. Seconds to stay open before probing. default 5
+      - half_open_calls: int. Concurrent probe calls allowed while half-open. default 1
+    """
+    def __init__(self, name:str=None, failure_threshold:int=5, reset_timeout:float=5.0, half_open_calls:int=1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_calls = half_open_calls
+        self.listeners = []
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Close the circuit and zero the counters."""
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probes = 0
+        self.successes = 0
+        self.failures = 0
+        self.rejected = 0
+        self.opened = 0
+        self.last_error = None
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def allow(self) -> bool:
+        """Whether a call may go to Redis now. In the open state this is a couple of attribute reads."""
+        if self.state == CLOSED:
+            return True
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    self.rejected += 1
+                    return False
+                self._transition(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self.probes >= self.half_open_calls:
+                    self.rejected += 1
+                    return False
+                self.probes += 1
+            return True
+
+    def is_open(self) -> bool:
+        """Whether calls are being rejected, without taking a half-open probe slot."""
+        return self.state != CLOSED and (self.state == HALF_OPEN or time.monotonic() - self.opened_at < self.reset_timeout)
+
+    def success(self):
+        self.successes += 1
+        self.consecutive_failures = 0
+        if self.state != CLOSED:
+            with self._lock:
+                if self.state == HALF_OPEN:
+                    self._transition(CLOSED)
+
+    def failure(self, error=None):
+        self.failures += 1
+        self.last_error = repr(error) if error is not None else None
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.consecutive_failures >= self.failure_threshold):
+                self._transition(OPEN)
+
+    def _transition(self, state):
+        # called with the lock held
+        old, self.state = self.state, state
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+            self.opened += 1
+            logging.warning(f"Redis circuit {self.name!r} opened after {self.consecutive_failures} failures "
+                            f"({self.last_error}); skipping Redis for {self.reset_timeout}s")
+        elif state == HALF_OPEN:
+            self.probes = 0
+        elif state == CLOSED:
+            self.consecutive_failures = 0
+            logging.info(f"Redis circuit {self.name!r} closed")
+        for listener in self.listeners:
+            try:
+                listener(self.name, old, state)
+            except Exception as e:
+                logging.error(f"Circuit breaker listener failed: {e}")
+
+    def guard(self, fn, fallback=None, errors=REDIS_ERRORS):
+        """fn, returning fallback instead of calling it while the circuit is open, and instead of raising errors."""
+        def guarded(*args, **kwargs):
+            if not self.allow():
+                return fallback
+            try:
+                result = fn(*args, **kwargs)
+            except errors as e:
+                self.failure(e)
+                return fallback
+            self.success()
+            return result
+        return _named(guarded, fn)
+
+    def aguard(self, fn, fallback=None, errors=REDIS_ERRORS):
+        """guard() for a coroutine function."""
+        async def guarded(*args, **kwargs):
+            if not self.allow():
+                return fallback
+            try:
+                result = await fn(*args, **kwargs)
+            except errors as e:
+                self.failure(e)
+                return fallback
+            self.success()
+            return result
+        return _named(guarded, fn)
+
+    def snapshot(self) -> dict:
+        return {
+            'name': self.name,
+            'state': self.state,
+            'consecutive_failures': self.consecutive_failures,
+            'successes': self.successes,
+            'failures': self.failures,
+            'rejected': self.rejected,
+            'opened': self.opened,
+            'last_error': self.last_error,
+        }
+
+def _named(guarded, fn):
+    # The metadata that matters for debugging and introspection, without functools.wraps' full copy: decorators guard
+    # their internal functions every time they're applied, so this runs once per guarded function per decoration
+    guarded.__wrapped__ = fn
+    guarded.__name__ = getattr(fn, '__name__', guarded.__name__)
+    guarded.__qualname__ = getattr(fn, '__qualname__', guarded.__qualname__)
+    return guarded
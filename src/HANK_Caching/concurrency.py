@@ -0,0 +1,432 @@
+"""
+Concurrency helpers for the cache decorators: single-flight stampede protection (concurrent misses on the same key
+compute once), its asyncio counterpart, the bounded background pool behind stale-while-revalidate / refresh-ahead,
+and the background writer behind write-behind.
+"""
+import asyncio, atexit, collections, functools, logging, os, threading, time, uuid, weakref
+
+from HANK_Caching.breaker import REDIS_ERRORS
+
+class _Call:
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    In-process single-flight: while one thread computes the value for a key, other threads asking for the same key
+    wait for that computation and share its result (or its exception) instead of running it again.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.deduplicated = 0  # calls that waited for another thread instead of computing
+
+    def do(self, key, fn):
+        """Return fn() for key, running fn at most once at a time per key across threads."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.deduplicated += 1
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def in_flight(self):
+        """Number of keys currently being computed."""
+        return len(self._calls)
+
+class AsyncSingleFlight:
+    """
+    asyncio single-flight: concurrent awaits for the same key share one task instead of each running the coroutine.
+    Waiters await the task through asyncio.shield, so one cancelled waiter doesn't cancel it for the others.
+    Tasks belong to the running event loop, so each loop has its own in-flight table.
+    """
+    def __init__(self):
+        self._tasks = {}
+        self.deduplicated = 0  # awaits that joined another caller's task
+
+    def start(self, key, fn):
+        """The in-flight task for key on the running loop, starting fn() as a new task if there is none."""
+        loop = asyncio.get_running_loop()
+        flight_key = (loop, key)
+        task = self._tasks.get(flight_key)
+        if task is not None:
+            self.deduplicated += 1
+            return task
+        task = loop.create_task(fn())
+        self._tasks[flight_key] = task
+        def done(task):
+            if self._tasks.get(flight_key) is task:
+                del self._tasks[flight_key]
+        task.add_done_callback(done)
+        return task
+
+    async def do(self, key, fn):
+        """Return await fn() for key, running at most one fn() at a time per key on this loop."""
+        return await asyncio.shield(self.start(key, fn))
+
+    def spawn(self, key, fn):
+        """Run fn() for key in the background (joining an in-flight task if there is one); failures are logged."""
+        task = self.start(key, fn)
+        task.add_done_callback(_log_background_failure)
+        return task
+
+    def in_flight(self):
+        """Number of keys currently being computed."""
+        return len(self._tasks)
+
+def _log_background_failure(task):
+    if not task.cancelled() and task.exception() is not None:
+        logging.error(f"Background cache refresh failed, keeping the stale value: {task.exception()}")
+
+class RedisSingleFlight:
+    """
+    Cross-process single-flight on top of a short-lived Redis lock ({cache_key}:lock, SET NX PX).
+    The process that gets the lock computes and stores the value. The others poll for the value with
+    backoff until it shows up, the lock is released without a value (then they try for the lock themselves),
+    or wait_timeout passes (then they compute without the lock, so a stuck worker can't stall everyone).
+    If Redis fails around the lock, the value is computed without it; a lock that can't be released (Redis went away
+    mid-compute) is left to expire, and the computed value is still returned.
+
+    Args:
+      - lock_timeout: float. Seconds before an abandoned lock expires. Should exceed the normal compute time.
+      - wait_timeout: float. Seconds a waiter polls before computing itself. Default: lock_timeout
+      - poll_interval: float. Initial poll interval in seconds; doubles up to max_poll_interval.
+    """
+    def __init__(self, lock_timeout:float=30, wait_timeout:float=None, poll_interval:float=0.01, max_poll_interval:float=0.2):
+        self.lock_timeout_ms = max(1, int(lock_timeout * 1000))
+        self.wait_timeout = wait_timeout if wait_timeout is not None else lock_timeout
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.deduplicated = 0  # misses served by another process's computation
+        self.timeouts = 0  # waits that gave up and computed anyway
+
+    def do(self, redis_client, cache_key:str, fetch, compute, on_error=None):
+        """
+        Return the value for cache_key.
+        fetch() returns the cached value or SENTINEL; compute() computes and stores it and returns it.
+        A Redis connection error or timeout while taking the lock, polling or releasing it is passed to on_error (e.g.
+        a circuit breaker's failure) and logged; the value is then computed without the lock. Exceptions from
+        compute() propagate as they are: they're the function's, not the lock's.
+        """
+        from HANK_Caching.utils import SENTINEL
+        lock_key = f"{cache_key}:lock"
+        token = uuid.uuid4().hex
+        deadline = time.time() + self.wait_timeout
+        interval = self.poll_interval
+        while True:
+            try:
+                locked = redis_client.set(lock_key, token, nx=True, px=self.lock_timeout_ms)
+            except REDIS_ERRORS as e:
+                self._lock_failed(lock_key, e, on_error)
+                return compute()
+            if locked:
+                try:
+                    # another process may have stored the value between our miss and getting the lock
+                    try:
+                        value = fetch()
+                    except REDIS_ERRORS as e:
+                        self._lock_failed(lock_key, e, on_error)
+                        value = SENTINEL
+                    return compute() if value is SENTINEL else value
+                finally:
+                    self._release(redis_client, lock_key, token, on_error)
+            time.sleep(interval)
+            interval = min(interval * 2, self.max_poll_interval)
+            try:
+                value = fetch()
+            except REDIS_ERRORS as e:
+                self._lock_failed(lock_key, e, on_error)
+                return compute()
+            if value is not SENTINEL:
+                self.deduplicated += 1
+                return value
+            if time.time() >= deadline:
+                self.timeouts += 1
+                return compute()
+
+    async def ado(self, redis_client, cache_key:str, fetch, compute, on_error=None):
+        """do() for a redis.asyncio client: fetch and compute are coroutine functions, and waiting doesn't block the loop."""
+        from HANK_Caching.utils import SENTINEL
+        lock_key = f"{cache_key}:lock"
+        token = uuid.uuid4().hex
+        deadline = time.time() + self.wait_timeout
+        interval = self.poll_interval
+        while True:
+            try:
+                locked = await redis_client.set(lock_key, token, nx=True, px=self.lock_timeout_ms)
+            except REDIS_ERRORS as e:
+                self._lock_failed(lock_key, e, on_error)
+                return await compute()
+            if locked:
+                try:
+                    try:
+                        value = await fetch()
+                    except REDIS_ERRORS as e:
+                        self._lock_failed(lock_key, e, on_error)
+                        value = SENTINEL
+                    return await compute() if value is SENTINEL else value
+                finally:
+                    await self._arelease(redis_client, lock_key, token, on_error)
+            await asyncio.sleep(interval)
+            interval = min(interval * 2, self.max_poll_interval)
+            try:
+                value = await fetch()
+            except REDIS_ERRORS as e:
+                self._lock_failed(lock_key, e, on_error)
+                return await compute()
+            if value is not SENTINEL:
+                self.deduplicated += 1
+                return value
+            if time.time() >= deadline:
+                self.timeouts += 1
+                return await compute()
+
+    def _release(self, redis_client, lock_key, token, on_error=None):
+        from HANK_Caching import redis_scripts
+        try:
+            redis_scripts.RELEASE_LOCK(redis_client, keys=(lock_key,), args=(token,))
+        except REDIS_ERRORS as e:
+            self._lock_failed(lock_key, e, on_error)
+
+    async def _arelease(self, redis_client, lock_key, token, on_error=None):
+        from HANK_Caching import redis_scripts
+        try:
+            await redis_scripts.RELEASE_LOCK.acall(redis_client, keys=(lock_key,), args=(token,))
+        except REDIS_ERRORS as e:
+            self._lock_failed(lock_key, e, on_error)
+
+    def _lock_failed(self, lock_key, error, on_error):
+        # a lock that wasn't released has a PX expiry, so it goes away by itself; whatever failed, it must not replace
+        # or repeat compute()
+        logging.warning(f"Redis failed around single-flight lock {lock_key}: {error}")
+        if on_error is not None:
+            on_error(error)
+
+class BackgroundRefresher:
+    """
+    Runs stale-while-revalidate / refresh-ahead recomputations on a bounded thread pool.
+    A key already being refreshed isn't queued again, and refreshes beyond max_pending are dropped
+    (the caller already has a usable value, so dropping only delays freshness).
+    """
+    def __init__(self, max_workers:int=4, max_pending:int=1000):
+        from concurrent.futures import ThreadPoolExecutor
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="HANK_Caching-refresh")
+        self._lock = threading.Lock()
+        self._pending = set()
+        self.submitted = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def submit(self, key, fn):
+        """Schedule fn() to refresh key. Returns False if it was already pending or the queue is full."""
+        with self._lock:
+            if key in self._pending:
+                return False
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return False
+            self._pending.add(key)
+            self.submitted += 1
+        self._executor.submit(self._run, key, fn)
+        return True
+
+    def _run(self, key, fn):
+        try:
+            fn()
+        except Exception as e:
+            self.failed += 1
+            logging.error(f"Background cache refresh failed, keeping the stale value: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+    def pending(self):
+        return len(self._pending)
+
+_default_refresher = None
+_default_refresher_lock = threading.Lock()
+
+def get_refresher():
+    """The process-wide BackgroundRefresher shared by all cached methods."""
+    global _default_refresher
+    with _default_refresher_lock:
+        if _default_refresher is None:
+            _default_refresher = BackgroundRefresher()
+        return _default_refresher
+
+class WriteBehind:
+    """
+    Write-behind for redis_lru_cache: cache writes are queued and a background thread sends them to Redis in
+    pipelined batches, so a miss returns as soon as the function does.
+    Each write is (redis_client, writer, cache_key, value). A batch is grouped by client and writer, and each writer
+    is called once per batch as writer(pipeline, [(cache_key, value), ...]) to queue its commands (for redis_lru_cache,
+    one STORE script call for all of a cache's entries). Later writes to the same key in a batch replace earlier ones.
+    Values are serialized on the background thread, so a result mutated right after it's returned may be stored mutated.
+
+    Args:
+      - max_queue: int. Maximum number of queued writes. Default: 10000
+      - flush_interval: float. Seconds the worker waits after the first queued write to collect a batch. Default: 0.05
+      - max_batch: int. Maximum writes per pipeline; a full batch is sent without waiting. Default: 500
+      - policy: str. What put() does when the queue is full. Default: 'drop_newest'
+          'drop_newest': drop the new write. 'drop_oldest': drop the oldest queued write to make room.
+          'block': wait up to block_timeout seconds for room, then drop the new write.
+      - block_timeout: float. See policy. Default: 1
+    Pending writes are flushed at interpreter shutdown (atexit) and by flush().
+    """
+    POLICIES = ('drop_newest', 'drop_oldest', 'block')
+
+    def __init__(self, max_queue:int=10000, flush_interval:float=0.05, max_batch:int=500, policy:str='drop_newest',
+                 block_timeout:float=1):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown write-behind policy {policy!r}. Choose from {self.POLICIES}")
+        self.max_queue = max_queue
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.queued = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.failed = 0
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self._start()
+        atexit.register(_close_at_exit, weakref.ref(self))
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=functools.partial(_reset_after_fork, weakref.ref(self)))
+
+    def _after_fork(self):
+        # In a forked child the parent's queued writes and worker thread aren't ours, and another of the parent's
+        # threads may have held the locks at fork time: start over with fresh ones (put() restarts the worker)
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+
+    def _start(self):
+        self.pid = os.getpid()
+        self._worker = threading.Thread(target=self._run, name="HANK_Caching-write-behind", daemon=True)
+        self._worker.start()
+
+    def put(self, redis_client, writer, cache_key, value):
+        """Queue a write. Returns False if it was dropped (queue full, see policy)."""
+        if self._closed:
+            self._write([(redis_client, writer, cache_key, value)])  # shutting down: write through
+            return True
+        with self._cond:
+            if self.pid != os.getpid():
+                # forked child (see _after_fork): start its own worker
+                self._start()
+            if len(self._queue) >= self.max_queue:
+                if self.policy == 'drop_oldest':
+                    self._queue.popleft()
+                    self.dropped += 1
+                elif self.policy == 'block' and self._cond.wait_for(lambda: len(self._queue) < self.max_queue, self.block_timeout):
+                    pass
+                else:
+                    self.dropped += 1
+                    return False
+            self._queue.append((redis_client, writer, cache_key, value))
+            self.queued += 1
+            if len(self._queue) == 1 or len(self._queue) >= self.max_batch:
+                self._cond.notify_all()
+        return True
+
+    def flush(self):
+        """Write everything queued so far, now, on the calling thread."""
+        with self._flush_lock:
+            while True:
+                with self._cond:
+                    if not self._queue:
+                        return
+                    batch = [self._queue.popleft() for _ in range(min(len(self._queue), self.max_batch))]
+                    self._cond.notify_all()  # room for blocked producers
+                self._write(batch)
+
+    def close(self):
+        """Flush pending writes and stop the worker."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self.flush()
+
+    def pending(self):
+        return len(self._queue)
+
+    def stats(self):
+        return {'queued': self.queued, 'flushed': self.flushed, 'dropped': self.dropped, 'failed': self.failed,
+                'pending': self.pending()}
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._queue or self._closed)
+                if self._closed:
+                    return
+                deadline = time.monotonic() + self.flush_interval
+                while len(self._queue) < self.max_batch and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            self.flush()
+
+    def _write(self, batch):
+        clients = {}
+        for redis_client, writer, cache_key, value in batch:
+            writers = clients.setdefault(id(redis_client), (redis_client, {}))[1]
+            writers.setdefault(writer, {})[cache_key] = value
+        for redis_client, writers in clients.values():
+            count = sum(len(items) for items in writers.values())
+            try:
+                # MULTI/EXEC: a chunked value's manifest (in the STORE call) and its chunks must land together
+                pipe = redis_client.pipeline(transaction=True)
+                for writer, items in writers.items():
+                    writer(pipe, list(items.items()))
+                pipe.execute()
+                self.flushed += count
+            except Exception as e:
+                self.failed += count
+                logging.error(f"Error writing {count} cache entries behind: {e}")
+
+def _reset_after_fork(ref):
+    write_behind = ref()
+    if write_behind is not None:
+        write_behind._after_fork()
+
+def _close_at_exit(ref):
+    write_behind = ref()
+    if write_behind is not None:
+        write_behind.close()
+
+_default_write_behind = None
+
+def get_write_behind():
+    """The process-wide WriteBehind shared by all cached methods with write_behind=True."""
+    global _default_write_behind
+    with _default_refresher_lock:
+        if _default_write_behind is None:
+            _default_write_behind = WriteBehind()
+        return _default_write_behind
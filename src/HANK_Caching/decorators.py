@@ -1,21 +1,58 @@
 from functools import wraps
-from cachetools import LRUCache, cached
-import pickle, logging
+from contextlib import nullcontext
+import asyncio, inspect, logging, math, random, sqlite3, threading, time, uuid
 
-from HANK_Caching.utils import RedisClientManager, make_hashable_key, hash_key, compress_key, decompress_key, get_function_identity
+from HANK_Caching import redis_scripts, tag_index
+from HANK_Caching.stats import get_stats
+from HANK_Caching.admission import get_admission
+from HANK_Caching import negative as negative_cache
+from HANK_Caching.disk import DiskCache, get_disk_store
+from HANK_Caching.memory import estimate_size, resolve_budget
+from HANK_Caching.policies import make_policy_cache
+from HANK_Caching.shm import get_shared_cache
+from HANK_Caching.serializers import get_serializer, is_manifest, manifest_chunk_count, loads_chunked
+from HANK_Caching.concurrency import SingleFlight, AsyncSingleFlight, RedisSingleFlight, get_refresher, get_write_behind
+from HANK_Caching.utils import SENTINEL, RedisClientManager, BatchArgument, split_call, compile_key_builder, hash_key, compress_key, decompress_key, get_function_identity
+
+def make_memory_cache(maxsize, ttl=None, max_bytes=None, getsizeof=None, budget=None, timestamped=False, policy=None):
+    """
+    The cachetools cache behind conditional_lru_cache and the redis_lru_cache L1 tier: an LRUCache (TTLCache with a ttl,
+    or another eviction policy from policies.POLICIES) bounded by item count, or by estimated bytes when max_bytes or a
+    memory budget is given.
+    """
+    if getsizeof is not None and max_bytes is None and budget is None:
+        raise ValueError("getsizeof needs max_bytes or a memory_budget")
+    if max_bytes is None and budget is None:
+        return make_policy_cache(policy, maxsize, ttl)
+    capacity = max_bytes if max_bytes is not None else budget.max_bytes
+    sizer = getsizeof or estimate_size
+    if timestamped:
+        value_size = sizer
+        sizer = lambda entry: value_size(entry[0])
+    return make_policy_cache(policy, capacity, ttl, getsizeof=sizer)
 
 def redis_lru_cache(maxsize=1000, enabled=True, quiet=True, ttl=None, arg_transforms={}, tags=[], 
                     use_self_id:bool=False, cache_id:str=None,
-                    allow_disable=True, hash_keys:bool=True, compress_keys:bool=False, **kwargs):
+                    allow_disable=True, hash_keys:bool=True, compress_keys:bool=False, lru_touch_rate:float=1.0,
+                    l1_maxsize:int=None, l1_ttl:float=None, invalidation_bus=None, single_flight=False, lock_timeout:float=30,
+                    soft_ttl:float=None, refresh_ahead:float=None, refresher=None, serializer=None, batch_arg:str=None,
+                    write_behind=None, stats=None, l1_max_bytes:int=None, getsizeof=None, memory_budget=None, admission=None,
+                    cache_exceptions=None, cache_empty=None, negative_ttl:float=60, negative_maxsize:int=1000, **kwargs):
     """
     A decorator to cache the result of a function in a Redis cache.
     The filename, class, function, and arguments are used to create a unique key.
-    The result is pickled and stored in the Redis cache.
+    The result is pickled (see serializer) and stored in the Redis cache.
+    Recency is tracked in a sorted set ({cache_key_prefix}:lru) scored by last access, so eviction is true LRU.
+    On a miss, storing the value, marking it most recently used and evicting past maxsize happen in one atomic
+    server-side script (see redis_scripts.STORE), so a miss costs a GET plus a single round trip.
+    A hit is one round trip too: the value is read and its recency refreshed by one script.
     Prerequisites:
     - A redis database running on either:
         1) localhost:6379 or
         2) at environment variables REDIS_HOST, REDIS_PORT, REDIS_DB
         3) or a custom host, port, and db and redis_client created using those custom values
+        4) or several nodes (REDIS_NODES, or RedisClientManager.get_redis_client(nodes=...)): each cache then lives
+           entirely on the node its cache_key_prefix hashes to (see sharding.ShardedRedis)
     Args:
     - redis_client: a Redis client instance .. you can generate one with CachingBase.create_redis_client()
     - maxsize: the maximum number of items to cache. default: 1000. Set to None for unlimited (sorta, still limited by Redis memory policy which should be lru)
@@ -28,8 +65,76 @@ def redis_lru_cache(maxsize=1000, enabled=True, quiet=True, ttl=None, arg_transf
     - use_self_id: whether to include the id of the first argument (usually self) in the cache key. this is useful for instance methods where the instance state may affect the result
     - allow_disable: whether to allow the cache to be disabled. if False, the cache will always be enabled and disable_cache will be a no-op
     - compress_keys: whether to compress the keys before storing in Redis. this is useful for very long keys that may exceed the 512 byte limit in Redis
+    - lru_touch_rate: fraction of hits (0-1) that refresh recency. default 1.0 (every hit). Lower values trade LRU precision
+        for cheaper hits: the untouched hits are a plain GET with no write.
+    - l1_maxsize: if set, keep an in-process cachetools tier (L1) of up to this many unpickled values in front of Redis (L2).
+        L1 is checked first, filled on L2 hits and on misses, and cleared along with L2 by cache_clear. default None (no L1)
+    - l1_ttl: time-to-live for L1 entries (in seconds). default None (L1 is a plain LRU). Keep it short if other
+        processes write to the same cache_id, since L1 doesn't see their updates (or use invalidation_bus).
+    - invalidation_bus: name of a RedisClientManager invalidation bus (or True for "default") to keep L1 tiers consistent
+        across processes. cache_clear() and cache_invalidate() are broadcast, and invalidations received from other
+        processes are applied to this wrapper's L1. Only used together with l1_maxsize/l1_ttl. default None
+    - single_flight: stampede protection, so concurrent misses on the same key compute once. default False
+        True: threads in this process share one computation per key, and processes coordinate through a short-lived
+        Redis lock ({cache_key}:lock) while the others poll for the stored value. "local": threads only, no Redis lock.
+        single_flight_info() reports how many duplicate computations were avoided.
+    - lock_timeout: seconds before an abandoned single-flight Redis lock expires (and waiters stop waiting). default 30
+    - soft_ttl: stale-while-revalidate. Entries older than soft_ttl (but younger than the hard ttl) are returned right away
+        and recomputed in the background. Requires ttl. default None
+    - refresh_ahead: entries hit within refresh_ahead seconds of their ttl expiring are recomputed in the background,
+        so entries that are still being used don't expire. Requires ttl. default None
+    - refresher: the concurrency.BackgroundRefresher to run refreshes on. default: the shared, bounded process-wide pool
+    - serializer: how values are encoded in Redis: a serializers.Serializer, or one of 'legacy', 'pickle' (protocol 5),
+        'zlib', 'lzma' (pickle compressed above a size threshold), 'oob' (protocol 5 out-of-band buffers, large values
+        chunked next to a manifest). default None = 'legacy', headerless pickle readable by older versions.
+        Payloads are self-describing, so a cache can be read whatever serializer wrote it.
+    - batch_arg: name of a list argument the function returns one result per element for, in order. Each element is cached
+        separately (its key is built as if the element were passed in place of the list, so arg_transforms for batch_arg
+        apply to each element). A call checks L1 for every element, fetches the rest with one MGET (pipelined with their
+        recency update), calls the function once with only the missing (deduplicated) elements, stores them with one
+        STORE script call and returns the results in the original order. Can't be combined with single_flight,
+        soft_ttl or refresh_ahead. default None
+    - write_behind: don't wait for Redis on a miss. The result is returned as soon as the function returns, and its
+        write is queued on a concurrency.WriteBehind (True for the shared process-wide one, or pass your own to set the
+        queue size, flush interval and drop policy) whose background thread stores queued writes in pipelined batches.
+        Until a write is flushed, other processes miss on that key. cache_clear and cache_invalidate flush first.
+        wrapper.write_behind.stats() has the queued / flushed / dropped counters. default None (write on the caller's thread)
+    - stats: hit/miss counters and per-phase latency histograms (key_build, lookup, deserialize, compute, store), see
+        stats.CacheStats. True for this wrapper's own, or pass a CacheStats to share. wrapper.cache_stats() returns a
+        snapshot (None when off) and CachingBase.cache_stats() aggregates them by tag. default None (off, no overhead
+        beyond a None check per call)
+    - l1_max_bytes, getsizeof, memory_budget: bound the L1 tier by estimated bytes and/or count it against a shared
+        memory.MemoryBudget, as max_bytes, getsizeof and memory_budget in conditional_lru_cache. default None (by count;
+        the process-wide budget, if one was set, applies to L1 tiers)
+    - admission: which computed results get cached, by compute time, serialized size and/or a predicate on the result:
+        an admission.AdmissionPolicy (share one to pool the cost history), or a dict of its options, e.g.
+        {'min_compute': 0.005, 'max_size': 1_000_000}. A rejected result is returned but stored in neither tier (a
+        result over max_size may still be kept in L1). wrapper.admission_stats() has the counts, rejections by reason
+        and the current threshold. default None (cache every result)
+    - cache_exceptions: an exception class (or several) to cache: a call raising one of them is remembered for
+        negative_ttl seconds, and the same exception (type, args and attributes, with a fresh traceback) is raised again
+        for those arguments without calling the function. Exceptions that can't be pickled aren't cached. default None
+    - cache_empty: cache "empty" results in the negative tier too: True for None and anything with len() 0, or a
+        predicate result -> bool. They are returned from there, under negative_ttl, instead of being stored with the
+        positive entries. default None
+    - negative_ttl, negative_maxsize: the ttl (seconds) and capacity of the negative tier, separate from the positive
+        entries' so a storm of bad inputs can't evict good ones. In Redis it is its own index ({cache_key_prefix}:neg),
+        read with one more round trip on a miss; wrapper.negative_cache_info() has its size and counters. default 60, 1000
+        Negative entries skip the admission policy and the L1 tier; can't be combined with batch_arg.
+    Bulk methods on the wrapper, for checking or warming the cache for many argument sets at once. Each call is a tuple
+    of positional arguments or a dict of keyword arguments (in batch_arg mode, pass a single element in place of the list):
+    - get_many(calls): (hits, misses) = ([(call, value), ...], [call, ...]), from L1 and one MGET. Never calls the function.
+    - contains_many(calls): [bool, ...], from L1 and pipelined EXISTS; doesn't refresh recency.
+    - set_many([(call, value), ...]): store values without calling the function, with one STORE script call.
+    - prefetch(calls): compute the calls that aren't cached yet and store them with one set_many. Returns how many.
+    Coroutine functions (async def) get an async wrapper: results are awaited before they are cached, Redis is used
+    through a redis.asyncio client (RedisClientManager.get_async_redis_client) so the event loop isn't blocked, and
+    concurrent awaits of the same key always share one computation (single_flight=True adds the cross-process Redis
+    lock). prefetch is then a coroutine too; cache_clear, cache_info and the other bulk methods stay synchronous.
     
     """
+    stats_option, admission_option = stats, admission
+
     def decorator(func):
         nonlocal enabled, quiet, compress_keys, hash_keys, use_self_id, cache_id
         if cache_id is not None:
@@ -41,76 +146,708 @@ def redis_lru_cache(maxsize=1000, enabled=True, quiet=True, ttl=None, arg_transf
             if hash_keys:
                 cache_key_prefix = hash_key(cache_key_prefix)
         if not cache_id: cache_id = "default"
+        make_key = compile_key_builder(func, arg_transforms=arg_transforms, use_id=use_self_id)
+        codec = get_serializer(serializer)
+        ttl_ms, negative_ttl_ms = redis_scripts.ttl_ms(ttl), redis_scripts.ttl_ms(negative_ttl)
+        touch_always = lru_touch_rate >= 1
+        if (soft_ttl or refresh_ahead) and not ttl:
+            raise ValueError("soft_ttl and refresh_ahead need a (hard) ttl")
+        if batch_arg and (single_flight or soft_ttl or refresh_ahead):
+            raise ValueError("batch_arg can't be combined with single_flight, soft_ttl or refresh_ahead")
+        negative_exceptions, negative_empty = negative_cache.exception_types(cache_exceptions), negative_cache.empty_test(cache_empty)
+        negative = bool(negative_exceptions or negative_empty)
+        if batch_arg and negative:
+            raise ValueError("batch_arg can't be combined with cache_exceptions or cache_empty")
+        negative_counts = {'hits': 0, 'exceptions': 0, 'empty': 0}
+        batch = BatchArgument(func, batch_arg) if batch_arg else None
+        refresh_below_ms = max(ttl_ms - redis_scripts.ttl_ms(soft_ttl) if soft_ttl else 0, redis_scripts.ttl_ms(refresh_ahead))
+        is_async = inspect.iscoroutinefunction(func)
+        writer = (get_write_behind() if write_behind is True else write_behind) or None
+        stats = get_stats(stats_option, func.__qualname__)
+        admission = get_admission(admission_option)
+        breaker = RedisClientManager.get_breaker(cache_id)
+        local_flight = SingleFlight() if single_flight and not is_async else None
+        async_flight = AsyncSingleFlight() if is_async else None
+        remote_flight = RedisSingleFlight(lock_timeout=lock_timeout) if single_flight and single_flight != "local" else None
+        registered = False  # in the server-side tag index (see queue_store)
+        budget = None
+        if l1_maxsize is not None or l1_ttl is not None or l1_max_bytes is not None:
+            l1_size = l1_maxsize if l1_maxsize is not None else 1000000
+            budget = resolve_budget(memory_budget)
+            l1 = make_memory_cache(l1_size, l1_ttl, l1_max_bytes, getsizeof, budget)
+        else:
+            l1 = None
+        
+        def l1_get(cache_key):
+            with wrapper.l1_lock:
+                return l1.get(cache_key, SENTINEL)
+
+        def l1_set(cache_key, value):
+            with wrapper.l1_lock:
+                try:
+                    l1[cache_key] = value
+                except ValueError:
+                    pass  # value too large for the cache
+            if budget is not None:
+                budget.enforce()
+        
+        def fetch(redis_client, key, cache_key, args=None, kwargs=None):
+            # Try fetching the result from Redis, refreshing its recency (every hit, or a sample of them)
+            # With args given, a stale or nearly expired hit also schedules a background refresh
+            touch = touch_always or random.random() < lru_touch_rate
+            stale = False
+            if refresh_below_ms:
+                lru_key = redis_scripts.index_keys(wrapper.cache_key_prefix)[0]
+                reply = redis_scripts.GET_WITH_TTL(redis_client, keys=(cache_key, lru_key), args=(redis_scripts.now_ms(), 1 if touch else 0))
+                result, pttl = reply if reply else (None, -1)
+                stale = 0 <= pttl <= refresh_below_ms
+            elif touch:
+                lru_key = redis_scripts.index_keys(wrapper.cache_key_prefix)[0]
+                result = redis_scripts.GET_AND_TOUCH(redis_client, keys=(cache_key, lru_key), args=(redis_scripts.now_ms(),))
+            else:
+                result = redis_client.get(cache_key)
+            if result is None:
+                return SENTINEL
+            result = decode(redis_client, cache_key, result)
+            if result is SENTINEL:
+                return SENTINEL
+            on_hit(key, cache_key, result, stale)
+            if stale and args is not None:
+                (refresher or get_refresher()).submit(cache_key, lambda: refresh(redis_client, cache_key, args, kwargs))
+            return result
+
+        def on_hit(key, cache_key, result, stale=False):
+            if not wrapper.quiet: 
+                print(f" -> Cache hit!{' (stale, refreshing in the background)' if stale else ''}")
+                if wrapper.compress_keys: print(f"  -> Original key after : = {decompress_key(key)}")
+            if l1 is not None: l1_set(cache_key, result)
+
+        def refresh(redis_client, cache_key, args, kwargs):
+            # Background recompute; a short Redis lock keeps other processes from refreshing the same entry at once
+            lock_key, token = f"{cache_key}:refresh", uuid.uuid4().hex
+            if not take_lock(redis_client, lock_key, token):
+                return
+            try:
+                compute_and_store(redis_client, cache_key, args, kwargs)
+            finally:
+                release_lock(redis_client, lock_key, token)
+
+        def take_lock(redis_client, lock_key, token):
+            return redis_client.set(lock_key, token, nx=True, px=redis_scripts.ttl_ms(lock_timeout))
+
+        def release_lock(redis_client, lock_key, token):
+            redis_scripts.RELEASE_LOCK(redis_client, keys=(lock_key,), args=(token,))
+
+        def decode(redis_client, cache_key, payload):
+            # Chunked values (serializers.OutOfBandSerializer) need a second read for their chunks
+            if not is_manifest(payload):
+                return codec.loads(payload)
+            chunks = redis_client.hmget(f"{cache_key}:chunks", list(range(manifest_chunk_count(payload))))
+            if any(chunk is None for chunk in chunks):
+                return SENTINEL  # chunks expired or were evicted under us; treat as a miss
+            return loads_chunked(payload, chunks)
+
+        def encode(result):
+            if codec.chunked:
+                return codec.dumps_parts(result)
+            return codec.dumps(result), None
+
+        def store_many(redis_client, items):
+            # Store (cache_key, value) pairs with one STORE script call; chunked values add their chunks in the same MULTI
+            keys, args, chunked = store_args(items)
+            if not args[3:]:
+                return  # all too large to admit
+            if not chunked and registered:
+                redis_scripts.STORE(redis_client, keys=keys, args=args)
+                return
+            # manifests and chunks go in one MULTI block, so readers never see a manifest without its chunks
+            pipe = redis_client.pipeline(transaction=bool(chunked))
+            queue_store(pipe, keys, args, chunked)
+            pipe.execute()
+
+        def store_args(items):
+            keys, payloads, chunked = [], [], []
+            for cache_key, result in items:
+                payload, chunks = encode(result)
+                if admission is not None and admission.max_size is not None:
+                    size = sum(memoryview(part).nbytes for part in (payload, *(chunks or ())))
+                    if not admission.admit_size(cache_key, size, stats):
+                        continue
+                keys.append(cache_key)
+                payloads.append(payload)
+                if chunks:
+                    chunked.append((cache_key, chunks))
+            keys = (*redis_scripts.index_keys(wrapper.cache_key_prefix), *keys)
+            args = (ttl_ms, maxsize or 0, redis_scripts.now_ms(), *payloads)
+            return keys, args, chunked
+
+        def queue_store(pipe, keys, args, chunked):
+            nonlocal registered
+            if not registered:
+                # the first store also records the cache (and its tags) in the server-side index, see tag_index
+                tag_index.queue_register(pipe, wrapper.cache_key_prefix, wrapper.tags, cache_id, func.__qualname__)
+                registered = True
+            redis_scripts.STORE.queue(pipe, keys=keys, args=args)
+            for cache_key, chunks in chunked:
+                chunks_key = f"{cache_key}:chunks"
+                pipe.hset(chunks_key, mapping=dict(enumerate(chunks)))
+                if ttl_ms:
+                    pipe.pexpire(chunks_key, ttl_ms)
+
+        def write(redis_client, items):
+            # Store computed (cache_key, value) pairs now, or hand them to the write-behind queue
+            if writer is None:
+                store_many(redis_client, items)
+                return
+            for cache_key, result in items:
+                writer.put(redis_client, queue_writes, cache_key, result)
+
+        def queue_writes(pipe, items):
+            # the write-behind worker's writer: one STORE call for this cache's queued entries
+            keys, args, chunked = store_args(items)
+            if args[3:]:
+                queue_store(pipe, keys, args, chunked)
+
+        def admit(items, seconds=None):
+            # the (cache_key, value) pairs the admission policy lets into the cache; seconds is each one's compute time
+            if admission is None:
+                return items
+            return [(cache_key, result) for cache_key, result in items if admission.admit(cache_key, result, seconds, stats=stats)]
+
+        def negative_index(cache_key):
+            # (index keys, key) of cache_key's entry in the negative tier, an index of its own under {prefix}:neg
+            prefix = f"{wrapper.cache_key_prefix}:neg"
+            return redis_scripts.index_keys(prefix), f"{prefix}{cache_key[len(wrapper.cache_key_prefix):]}"
+
+        def fetch_negative(redis_client, cache_key):
+            # the negative entry (pass it to negative_cache.unwrap) or SENTINEL
+            payload = redis_client.get(negative_index(cache_key)[1])
+            if payload is None:
+                return SENTINEL
+            negative_counts['hits'] += 1
+            if stats is not None: stats.hit()
+            return codec.loads(payload)
+
+        def store_negative(redis_client, cache_key, entry):
+            index, negative_key = negative_index(cache_key)
+            payload = negative_cache.dumps_entry(codec, entry)
+            if payload is not None:
+                redis_scripts.STORE(redis_client, keys=(*index, negative_key), args=(negative_ttl_ms, negative_maxsize or 0, redis_scripts.now_ms(), payload))
+                negative_counts['exceptions' if type(entry) is negative_cache.CachedException else 'empty'] += 1
+
+        def compute_and_store(redis_client, cache_key, args, kwargs):
+            # Calculate the result as it's not cached
+            st = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except negative_exceptions as e:  # () unless cache_exceptions is set: catches nothing
+                store_negative(redis_client, cache_key, negative_cache.CachedException(e))
+                raise
+            if negative_empty is not None and negative_empty(result):
+                store_negative(redis_client, cache_key, result)
+                return result
+            if not admit([(cache_key, result)], time.perf_counter() - st):
+                return result
+            write(redis_client, [(cache_key, result)])
+            if l1 is not None: l1_set(cache_key, result)
+            return result
+
+        def miss(redis_client, key, cache_key, args, kwargs):
+            # Runs once per key per process (single_flight); with a Redis lock also once across processes
+            if remote_flight is None or breaker.is_open():
+                return compute_and_store(redis_client, cache_key, args, kwargs)
+            # Redis errors around the lock count against the breaker (and the value is computed without the lock);
+            # errors from the function itself propagate untouched
+            compute = lambda: compute_and_store(redis_client, cache_key, args, kwargs)
+            if not negative:
+                return remote_flight.do(redis_client, cache_key, lambda: fetch(redis_client, key, cache_key), compute, on_error=breaker.failure)
+            # waiters also pick up a failure (or empty result) the lock holder cached
+            poll = lambda: fetch_either(redis_client, key, cache_key)
+            return negative_cache.unwrap(remote_flight.do(redis_client, cache_key, poll, compute, on_error=breaker.failure))
+
+        def fetch_either(redis_client, key, cache_key):
+            result = fetch(redis_client, key, cache_key)
+            return fetch_negative(redis_client, cache_key) if result is SENTINEL else result
+
+        def make_cache_key(args, kwargs):
+            key = make_key(args, kwargs)
+            if wrapper.hash_keys:
+                key = hash_key(key)
+            elif wrapper.compress_keys:
+                key = compress_key(key)
+            return key, f"{wrapper.cache_key_prefix}:{key}"
+
+        def fetch_many(redis_client, cache_keys):
+            # Read many entries in one round trip: MGET, pipelined with the recency update of the ones that exist
+            touch = touch_always or random.random() < lru_touch_rate
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.mget(cache_keys)
+            if touch:
+                now = redis_scripts.now_ms()
+                pipe.zadd(redis_scripts.index_keys(wrapper.cache_key_prefix)[0], {cache_key: now for cache_key in cache_keys}, xx=True)
+            found = {}
+            for cache_key, payload in zip(cache_keys, pipe.execute()[0]):
+                if payload is not None:
+                    result = decode(redis_client, cache_key, payload)
+                    if result is not SENTINEL:
+                        found[cache_key] = result
+            return found
+
+        def batch_call(args, kwargs):
+            # One cache entry per element: L1 scan, one MGET for the rest, one call for what's still missing
+            cache_keys, pending, found = batch_start(args, kwargs)
+            redis_client = get_client() if pending else None
+            if redis_client is not None:
+                batch_found(found, pending, fetch_many(redis_client, list(pending)))
+            if not wrapper.quiet: print(f" -> Batch of {len(cache_keys)}: {len(found)} cached, {len(pending)} to compute")
+            if stats is not None: stats.hit(len(found)); stats.miss(len(pending))
+            if pending:
+                st = time.perf_counter()
+                computed = list(zip(pending, batch.compute(func, args, kwargs, list(pending.values()))))
+                admitted = admit(computed, (time.perf_counter() - st) / len(computed))
+                if redis_client is not None and admitted:
+                    write(redis_client, admitted)
+                batch_found(found, pending, dict(admitted))
+                found.update(computed)
+            return [found[cache_key] for cache_key in cache_keys]
+
+        def batch_start(args, kwargs):
+            # (cache_keys, pending, found): a key per element, the unique keys L1 doesn't have, and L1's values
+            items = list(batch.get(args, kwargs))
+            cache_keys = [make_cache_key(*batch.replace(args, kwargs, item))[1] for item in items]
+            pending = dict(zip(cache_keys, items))
+            found = {}
+            if l1 is not None:
+                with wrapper.l1_lock:
+                    for cache_key in list(pending):
+                        result = l1.get(cache_key, SENTINEL)
+                        if result is not SENTINEL:
+                            found[cache_key] = result
+                            del pending[cache_key]
+            return cache_keys, pending, found
+
+        def batch_found(found, pending, values):
+            for cache_key, result in values.items():
+                found[cache_key] = result
+                del pending[cache_key]
+                if l1 is not None: l1_set(cache_key, result)
+
+        def get_client():
+            if wrapper.redis_client is None:
+                wrapper.redis_client = RedisClientManager.get_redis_client(name=cache_id, shard_key=cache_key_prefix)
+                if wrapper.redis_client is None:
+                    logging.error("Redis client is not available. Caching will be disabled.")
+            return wrapper.redis_client
+
+        # Bulk methods: each call is a tuple of positional arguments or a dict of keyword arguments
+        def get_many(calls):
+            # (hits, misses): [(call, value), ...] for the cached calls and [call, ...] for the rest. Never calls func.
+            # L1 first, then one MGET (pipelined with the recency update) for the rest; Redis hits fill L1
+            cache_keys = [make_cache_key(*split_call(call))[1] for call in calls]
+            found = {}
+            if l1 is not None:
+                with wrapper.l1_lock:
+                    for cache_key in cache_keys:
+                        result = l1.get(cache_key, SENTINEL)
+                        if result is not SENTINEL:
+                            found[cache_key] = result
+            remaining = list(dict.fromkeys(cache_key for cache_key in cache_keys if cache_key not in found))
+            redis_client = get_client() if remaining else None
+            if redis_client is not None:
+                hits = fetch_many(redis_client, remaining)
+                found.update(hits)
+                if l1 is not None:
+                    for cache_key, result in hits.items():
+                        l1_set(cache_key, result)
+            hits, misses = [], []
+            for call, cache_key in zip(calls, cache_keys):
+                if cache_key in found:
+                    hits.append((call, found[cache_key]))
+                else:
+                    misses.append(call)
+            return hits, misses
+
+        def contains_many(calls):
+            # Existence only: no values are transferred and recency isn't refreshed
+            cache_keys = [make_cache_key(*split_call(call))[1] for call in calls]
+            present = {}
+            if l1 is not None:
+                with wrapper.l1_lock:
+                    present = {cache_key: True for cache_key in cache_keys if cache_key in l1}
+            remaining = list(dict.fromkeys(cache_key for cache_key in cache_keys if cache_key not in present))
+            redis_client = get_client() if remaining else None
+            if redis_client is not None:
+                present.update(exists_many(redis_client, remaining))
+            return [present.get(cache_key, False) for cache_key in cache_keys]
+
+        def exists_many(redis_client, cache_keys):
+            pipe = redis_client.pipeline(transaction=False)
+            for cache_key in cache_keys:
+                pipe.exists(cache_key)
+            return dict(zip(cache_keys, (bool(n) for n in pipe.execute())))
+
+        def set_many(items):
+            # Store (call, value) pairs without calling func: one STORE script call for all of them
+            entries = admit(list({make_cache_key(*split_call(call))[1]: value for call, value in items}.items()))
+            if not entries:
+                return 0
+            redis_client = get_client()
+            if redis_client is not None:
+                store_many(redis_client, entries)
+            if l1 is not None:
+                for cache_key, value in entries:
+                    l1_set(cache_key, value)
+            return len(entries)
+
+        def prefetch(calls):
+            # Compute and store the calls that aren't cached yet (one get_many, one set_many); returns how many were computed
+            _, misses = get_many(calls)
+            return set_many(zip(misses, compute_calls([split_call(call) for call in misses])))
+
+        def compute_calls(calls):
+            # Call func for each (args, kwargs); in batch_arg mode calls differing only in their element share one call
+            if batch is not None:
+                return batch.compute_calls(func, calls, make_key)
+            return [func(*args, **kwargs) for args, kwargs in calls]
+
+        async def acompute_calls(calls):
+            if batch is not None:
+                return await batch.acompute_calls(func, calls, make_key)
+            return await asyncio.gather(*(func(*args, **kwargs) for args, kwargs in calls))
         
         @wraps(func)
         def wrapper(*args, **kwargs):
             if wrapper.enabled:
-                key = make_hashable_key(func, args, kwargs, arg_transforms=arg_transforms, use_id=use_self_id)
-                if wrapper.hash_keys:
-                    key = hash_key(key)
-                elif wrapper.compress_keys:
-                    key = compress_key(key)
-                cache_key = f"{wrapper.cache_key_prefix}:{key}"
+                if batch is not None:
+                    return batch_call(args, kwargs)
+                key, cache_key = make_cache_key(args, kwargs)
                 if not wrapper.quiet: print(f"Using cache_key: {cache_key}")
+                if l1 is not None:
+                    result = l1_get(cache_key)
+                    if result is not SENTINEL:
+                        if not wrapper.quiet: print(f" -> L1 cache hit!")
+                        if stats is not None: stats.hit(l1=True)
+                        return result
                 if wrapper.redis_client is None:
-                    wrapper.redis_client = RedisClientManager.get_redis_client(name=cache_id)
+                    wrapper.redis_client = RedisClientManager.get_redis_client(name=cache_id, shard_key=cache_key_prefix)
                     if wrapper.redis_client is None:
                         logging.error("Redis client is not available. Caching will be disabled.")
-                        return func(*args, **kwargs)
-
-                # Try fetching the result from Redis
-                result = wrapper.redis_client.get(cache_key) if wrapper.redis_client is not None else None
-                if result is not None:
-                    if not wrapper.quiet: 
-                        print(f" -> Cache hit!")
-                        if wrapper.compress_keys: print(f"  -> Original key after : = {decompress_key(key)}")
-                    
-                    return pickle.loads(result)
-
-                # Calculate the result as it's not cached
-                result = func(*args, **kwargs)
-                if wrapper.redis_client is not None:
-                    if ttl:
-                        wrapper.redis_client.setex(cache_key, ttl, pickle.dumps(result))
-                    else:
-                        # Set the result in Redis cache
-                        wrapper.redis_client.set(cache_key, pickle.dumps(result))
-                    
-                    # Maintain a list of keys for LRU behavior
-                    wrapper.redis_client.lpush(f"{wrapper.cache_key_prefix}:keys", cache_key)
-                    if maxsize and wrapper.redis_client.llen(f"{cache_key_prefix}:keys") > maxsize:
-                        # Evict the oldest key
-                        oldest_key = wrapper.redis_client.rpop(f"{wrapper.cache_key_prefix}:keys")
-                        wrapper.redis_client.delete(oldest_key)
-                return result
+                        if stats is not None: stats.miss()
+                        st = time.perf_counter()
+                        result = func(*args, **kwargs)
+                        if l1 is not None and admit([(cache_key, result)], time.perf_counter() - st): l1_set(cache_key, result)
+                        return result
+
+                redis_client = wrapper.redis_client
+                result = fetch(redis_client, key, cache_key, args, kwargs)
+                if result is SENTINEL and negative:
+                    result = fetch_negative(redis_client, cache_key)
+                    if result is not SENTINEL:
+                        return negative_cache.unwrap(result)
+                if stats is not None: stats.miss() if result is SENTINEL else stats.hit()
+                if result is not SENTINEL:
+                    return result
+                if local_flight is None:
+                    return compute_and_store(redis_client, cache_key, args, kwargs)
+                return local_flight.do(cache_key, lambda: miss(redis_client, key, cache_key, args, kwargs))
             else:
                 return func(*args, **kwargs)
+
+        # Coroutine functions: the same cache through a redis.asyncio client, awaiting results before caching them.
+        # Concurrent awaits of the same key always share one computation (async_flight).
+        async def afetch(redis_client, key, cache_key, args=None, kwargs=None):
+            touch = touch_always or random.random() < lru_touch_rate
+            stale = False
+            lru_key = redis_scripts.index_keys(wrapper.cache_key_prefix)[0]
+            if refresh_below_ms:
+                reply = await redis_scripts.GET_WITH_TTL.acall(redis_client, keys=(cache_key, lru_key), args=(redis_scripts.now_ms(), 1 if touch else 0))
+                result, pttl = reply if reply else (None, -1)
+                stale = 0 <= pttl <= refresh_below_ms
+            elif touch:
+                result = await redis_scripts.GET_AND_TOUCH.acall(redis_client, keys=(cache_key, lru_key), args=(redis_scripts.now_ms(),))
+            else:
+                result = await redis_client.get(cache_key)
+            if result is None:
+                return SENTINEL
+            result = await adecode(redis_client, cache_key, result)
+            if result is SENTINEL:
+                return SENTINEL
+            on_hit(key, cache_key, result, stale)
+            if stale and args is not None:
+                async_flight.spawn(("refresh", cache_key), lambda: arefresh(redis_client, cache_key, args, kwargs))
+            return result
+
+        async def arefresh(redis_client, cache_key, args, kwargs):
+            lock_key, token = f"{cache_key}:refresh", uuid.uuid4().hex
+            if not await atake_lock(redis_client, lock_key, token):
+                return
+            try:
+                await acompute_and_store(redis_client, cache_key, args, kwargs)
+            finally:
+                await arelease_lock(redis_client, lock_key, token)
+
+        async def atake_lock(redis_client, lock_key, token):
+            return await redis_client.set(lock_key, token, nx=True, px=redis_scripts.ttl_ms(lock_timeout))
+
+        async def arelease_lock(redis_client, lock_key, token):
+            await redis_scripts.RELEASE_LOCK.acall(redis_client, keys=(lock_key,), args=(token,))
+
+        async def adecode(redis_client, cache_key, payload):
+            if not is_manifest(payload):
+                return codec.loads(payload)
+            chunks = await redis_client.hmget(f"{cache_key}:chunks", list(range(manifest_chunk_count(payload))))
+            if any(chunk is None for chunk in chunks):
+                return SENTINEL
+            return loads_chunked(payload, chunks)
+
+        async def astore_many(redis_client, items):
+            keys, args, chunked = store_args(items)
+            if not args[3:]:
+                return
+            if not chunked and registered:
+                await redis_scripts.STORE.acall(redis_client, keys=keys, args=args)
+                return
+            pipe = redis_client.pipeline(transaction=bool(chunked))
+            queue_store(pipe, keys, args, chunked)
+            await pipe.execute()
+
+        async def awrite(redis_client, items):
+            if writer is None:
+                await astore_many(redis_client, items)
+                return
+            sync_client = get_client()  # the write-behind worker is a thread, so it writes with the sync client
+            if sync_client is not None:
+                for cache_key, result in items:
+                    writer.put(sync_client, queue_writes, cache_key, result)
+
+        async def afetch_negative(redis_client, cache_key):
+            payload = await redis_client.get(negative_index(cache_key)[1])
+            if payload is None:
+                return SENTINEL
+            negative_counts['hits'] += 1
+            if stats is not None: stats.hit()
+            return codec.loads(payload)
+
+        async def astore_negative(redis_client, cache_key, entry):
+            index, negative_key = negative_index(cache_key)
+            payload = negative_cache.dumps_entry(codec, entry)
+            if payload is not None:
+                await redis_scripts.STORE.acall(redis_client, keys=(*index, negative_key), args=(negative_ttl_ms, negative_maxsize or 0, redis_scripts.now_ms(), payload))
+                negative_counts['exceptions' if type(entry) is negative_cache.CachedException else 'empty'] += 1
+
+        async def acompute_and_store(redis_client, cache_key, args, kwargs):
+            st = time.perf_counter()
+            try:
+                result = await func(*args, **kwargs)
+            except negative_exceptions as e:
+                if redis_client is not None:
+                    await astore_negative(redis_client, cache_key, negative_cache.CachedException(e))
+                raise
+            if negative_empty is not None and negative_empty(result):
+                if redis_client is not None:
+                    await astore_negative(redis_client, cache_key, result)
+                return result
+            if not admit([(cache_key, result)], time.perf_counter() - st):
+                return result
+            if redis_client is not None:
+                await awrite(redis_client, [(cache_key, result)])
+            if l1 is not None: l1_set(cache_key, result)
+            return result
+
+        async def amiss(redis_client, key, cache_key, args, kwargs):
+            if remote_flight is None or breaker.is_open():
+                return await acompute_and_store(redis_client, cache_key, args, kwargs)
+            compute = lambda: acompute_and_store(redis_client, cache_key, args, kwargs)
+            if not negative:
+                return await remote_flight.ado(redis_client, cache_key, lambda: afetch(redis_client, key, cache_key), compute, on_error=breaker.failure)
+            async def poll():
+                result = await afetch(redis_client, key, cache_key)
+                return await afetch_negative(redis_client, cache_key) if result is SENTINEL else result
+            return negative_cache.unwrap(await remote_flight.ado(redis_client, cache_key, poll, compute, on_error=breaker.failure))
+
+        async def afetch_many(redis_client, cache_keys):
+            touch = touch_always or random.random() < lru_touch_rate
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.mget(cache_keys)
+            if touch:
+                now = redis_scripts.now_ms()
+                pipe.zadd(redis_scripts.index_keys(wrapper.cache_key_prefix)[0], {cache_key: now for cache_key in cache_keys}, xx=True)
+            found = {}
+            for cache_key, payload in zip(cache_keys, (await pipe.execute())[0]):
+                if payload is not None:
+                    result = await adecode(redis_client, cache_key, payload)
+                    if result is not SENTINEL:
+                        found[cache_key] = result
+            return found
+
+        def get_async_client():
+            redis_client = RedisClientManager.get_async_redis_client(name=cache_id, shard_key=cache_key_prefix)
+            if redis_client is None:
+                logging.error("Redis client is not available. Caching will be disabled.")
+            return redis_client
+
+        async def abatch_call(args, kwargs):
+            cache_keys, pending, found = batch_start(args, kwargs)
+            redis_client = get_async_client() if pending else None
+            if redis_client is not None:
+                batch_found(found, pending, await afetch_many(redis_client, list(pending)))
+            if not wrapper.quiet: print(f" -> Batch of {len(cache_keys)}: {len(found)} cached, {len(pending)} to compute")
+            if stats is not None: stats.hit(len(found)); stats.miss(len(pending))
+            if pending:
+                st = time.perf_counter()
+                computed = list(zip(pending, await batch.acompute(func, args, kwargs, list(pending.values()))))
+                admitted = admit(computed, (time.perf_counter() - st) / len(computed))
+                if redis_client is not None and admitted:
+                    await awrite(redis_client, admitted)
+                batch_found(found, pending, dict(admitted))
+                found.update(computed)
+            return [found[cache_key] for cache_key in cache_keys]
+
+        async def aprefetch(calls):
+            # prefetch() for coroutine functions: misses are computed concurrently, then stored with one STORE call
+            pending = {}
+            for call in calls:
+                pending.setdefault(make_cache_key(*split_call(call))[1], call)
+            if l1 is not None:
+                with wrapper.l1_lock:
+                    pending = {cache_key: call for cache_key, call in pending.items() if cache_key not in l1}
+            redis_client = get_async_client() if pending else None
+            if redis_client is not None:
+                for cache_key, result in (await afetch_many(redis_client, list(pending))).items():
+                    del pending[cache_key]
+                    if l1 is not None: l1_set(cache_key, result)
+            if not pending:
+                return 0
+            computed = list(zip(pending, await acompute_calls([split_call(call) for call in pending.values()])))
+            admitted = admit(computed)
+            if redis_client is not None and admitted:
+                await astore_many(redis_client, admitted)
+            if l1 is not None:
+                for cache_key, result in admitted:
+                    l1_set(cache_key, result)
+            return len(computed)
+
+        if is_async:
+            @wraps(func)
+            async def wrapper(*args, **kwargs):
+                if not wrapper.enabled:
+                    return await func(*args, **kwargs)
+                if batch is not None:
+                    return await abatch_call(args, kwargs)
+                key, cache_key = make_cache_key(args, kwargs)
+                if not wrapper.quiet: print(f"Using cache_key: {cache_key}")
+                if l1 is not None:
+                    result = l1_get(cache_key)
+                    if result is not SENTINEL:
+                        if not wrapper.quiet: print(f" -> L1 cache hit!")
+                        if stats is not None: stats.hit(l1=True)
+                        return result
+                redis_client = get_async_client()
+                if redis_client is None:
+                    if stats is not None: stats.miss()
+                    return await async_flight.do(cache_key, lambda: acompute_and_store(None, cache_key, args, kwargs))
+                result = await afetch(redis_client, key, cache_key, args, kwargs)
+                if result is SENTINEL and negative:
+                    result = await afetch_negative(redis_client, cache_key)
+                    if result is not SENTINEL:
+                        return negative_cache.unwrap(result)
+                if stats is not None: stats.miss() if result is SENTINEL else stats.hit()
+                if result is not SENTINEL:
+                    return result
+                return await async_flight.do(cache_key, lambda: amiss(redis_client, key, cache_key, args, kwargs))
+
+        # While the client's circuit is open (or a call fails on a connection error / timeout), the Redis calls below
+        # are skipped: reads become misses, stores are dropped, and the function (and L1) keep serving
+        fetch, fetch_many, exists_many = breaker.guard(fetch, SENTINEL), breaker.guard(fetch_many, {}), breaker.guard(exists_many, {})
+        afetch, afetch_many = breaker.aguard(afetch, SENTINEL), breaker.aguard(afetch_many, {})
+        store_many, astore_many = breaker.guard(store_many), breaker.aguard(astore_many)
+        fetch_negative, afetch_negative = breaker.guard(fetch_negative, SENTINEL), breaker.aguard(afetch_negative, SENTINEL)
+        store_negative, astore_negative = breaker.guard(store_negative), breaker.aguard(astore_negative)
+        take_lock, release_lock = breaker.guard(take_lock, False), breaker.guard(release_lock)
+        atake_lock, arelease_lock = breaker.aguard(atake_lock, False), breaker.aguard(arelease_lock)
+
+        if stats is not None:
+            # Time each phase by swapping in timed versions of the functions the wrappers call
+            timed = stats.atimed if is_async else stats.timed
+            make_cache_key = stats.timed('key_build', make_cache_key)
+            l1_get = stats.timed('lookup', l1_get)
+            fetch, fetch_many = stats.timed('lookup', fetch), stats.timed('lookup', fetch_many)
+            afetch, afetch_many = stats.atimed('lookup', afetch), stats.atimed('lookup', afetch_many)
+            decode, adecode = stats.timed('deserialize', decode), stats.atimed('deserialize', adecode)
+            func = timed('compute', func)
+            write, awrite = stats.timed('store', write), stats.atimed('store', awrite)
+
         # Custom getstate to manage the pickling process
         def __getstate__():
             state = wrapper.__dict__.copy()
-            # Remove redis_client from the state before pickling
+            # Remove redis_client (and the process-local L1 tier) from the state before pickling
             state['redis_client'] = None
+            state['invalidation_bus'] = None
+            state['write_behind'] = None
+            state.pop('l1_lock', None)
             return state
 
         # Custom setstate to manage the unpickling process
         def __setstate__(state):
             # Restore the redis_client after unpickling
-            state['redis_client'] = RedisClientManager.get_redis_client(name=cache_id)
+            state['redis_client'] = RedisClientManager.get_redis_client(name=cache_id, shard_key=cache_key_prefix)
+            state['l1_lock'] = threading.Lock()
             wrapper.__dict__.update(state)
             
         def clear_cache(cache_key_prefix, quiet=True):
-            # Get all keys from the list
-            redis_client = RedisClientManager.get_redis_client(name=cache_id)
-            prefix = f"{cache_key_prefix}:keys"
-            if not quiet: print(f"Clearing cache with prefix {prefix} ...")
+            if writer is not None:
+                writer.flush()  # so no queued write lands after the clear
+            if l1 is not None:
+                with wrapper.l1_lock:
+                    l1.clear()
+                if wrapper.invalidation_bus is not None:
+                    wrapper.invalidation_bus.invalidate_prefix(cache_key_prefix)
+            # Drain the recency index (and the list used by older versions) in chunks of pipelined UNLINKs
+            redis_client = RedisClientManager.get_redis_client(name=cache_id, shard_key=cache_key_prefix)
+            if not quiet: print(f"Clearing cache with prefix {cache_key_prefix} ...")
             if redis_client is not None:
-                keys = redis_client.lrange(prefix, 0, -1)
-                # Delete each key
-                for key in keys:
-                    if not quiet: print(f"Deleting key: {key}")
-                    redis_client.delete(key)
-                # Now delete the list itself
-                redis_client.delete(f"{cache_key_prefix}:keys")
+                deleted = clear_redis(redis_client, cache_key_prefix)
+                if not quiet: print(f"Deleted {deleted} keys" if deleted is not None else "Redis is not available, skipped")
+
+        def clear_redis(redis_client, cache_key_prefix):
+            deleted = tag_index.clear_prefix(redis_client, cache_key_prefix)
+            if negative:
+                deleted += tag_index.clear_prefix(redis_client, f"{cache_key_prefix}:neg")
+            return deleted
+
+        def delete_entry(redis_client, cache_key):
+            lru_key, exp_key, _ = redis_scripts.index_keys(wrapper.cache_key_prefix)
+            pipe = redis_client.pipeline()
+            pipe.delete(cache_key, f"{cache_key}:chunks")
+            pipe.zrem(lru_key, cache_key)
+            pipe.zrem(exp_key, cache_key)
+            if negative:
+                (negative_lru_key, negative_exp_key, _), negative_key = negative_index(cache_key)
+                pipe.delete(negative_key)
+                pipe.zrem(negative_lru_key, negative_key)
+                pipe.zrem(negative_exp_key, negative_key)
+            pipe.execute()
+            return True
+
+        def count(redis_client, prefix):
+            return redis_scripts.COUNT(redis_client, keys=redis_scripts.index_keys(prefix)[:2], args=(redis_scripts.now_ms(),))
+
+        # Maintenance calls go through the breaker too: while the circuit is open they're skipped instead of waiting
+        # out a socket timeout
+        clear_redis, delete_entry, count = breaker.guard(clear_redis), breaker.guard(delete_entry), breaker.guard(count)
+
+        def invalidate(*args, **kwargs):
+            # Drop the entry for these arguments from both tiers (and from other processes' L1 via the bus)
+            _, cache_key = make_cache_key(args, kwargs)
+            if writer is not None:
+                writer.flush()
+            if l1 is not None:
+                with wrapper.l1_lock:
+                    l1.pop(cache_key, None)
+                if wrapper.invalidation_bus is not None:
+                    wrapper.invalidation_bus.invalidate_key(wrapper.cache_key_prefix, cache_key)
+            if wrapper.redis_client is not None and not delete_entry(wrapper.redis_client, cache_key):
+                logging.warning(f"Redis is not available: {cache_key} was only invalidated locally")
         # Attach cache control methods and state to the wrapper
         # wrapper.cache = cache
         wrapper.__getstate__ = __getstate__
@@ -118,17 +855,51 @@ def redis_lru_cache(maxsize=1000, enabled=True, quiet=True, ttl=None, arg_transf
         
         wrapper.allow_disable = allow_disable
         wrapper.enabled = enabled
-        wrapper.redis_client = RedisClientManager.get_redis_client(name=cache_id)
+        wrapper.redis_client = RedisClientManager.get_redis_client(name=cache_id, shard_key=cache_key_prefix)
+        wrapper.l1_cache = l1
+        wrapper.serializer = codec
+        wrapper.write_behind = writer
+        wrapper.circuit_breaker = breaker
+        wrapper.stats = stats
+        wrapper.cache_stats = lambda: stats.snapshot() if stats is not None else None
+        wrapper.admission = admission
+        wrapper.admission_stats = lambda: admission.snapshot() if admission is not None else None
+        wrapper.negative_cache_info = (lambda: None) if not negative or wrapper.redis_client is None else lambda: {
+            'size': count(wrapper.redis_client, f"{wrapper.cache_key_prefix}:neg"),
+            **negative_counts,
+        }
+        wrapper.l1_lock = threading.Lock()
+        if budget is not None:
+            budget.register(l1, name=func.__qualname__, tags=tags, lock=wrapper.l1_lock)
+        wrapper.memory_usage = lambda: l1.currsize if budget is not None or l1_max_bytes is not None else None
+        wrapper.invalidation_bus = None
+        if l1 is not None and invalidation_bus:
+            wrapper.invalidation_bus = RedisClientManager.get_invalidation_bus(name="default" if invalidation_bus is True else invalidation_bus)
+            if wrapper.invalidation_bus is not None:
+                wrapper.invalidation_bus.register(wrapper)
         wrapper.cache_key_prefix = cache_key_prefix
         wrapper.compress_keys = compress_keys
         wrapper.hash_keys = hash_keys
         wrapper.quiet = quiet
         wrapper.quiet_cache = lambda quiet=True: setattr(wrapper, 'quiet', quiet)
-        wrapper.cache_info = (lambda: None) if wrapper.redis_client is None else lambda: wrapper.redis_client.llen(f"{cache_key_prefix}:keys")
-        if wrapper.redis_client is not None:
+        wrapper.cache_info = (lambda: None) if wrapper.redis_client is None else \
+            lambda: count(wrapper.redis_client, wrapper.cache_key_prefix)
+        if wrapper.redis_client is not None or l1 is not None:
             wrapper.cache_clear = lambda **kwargs: clear_cache(wrapper.cache_key_prefix, **kwargs)
         else:
             wrapper.cache_clear = lambda **kwargs: None
+        wrapper.cache_invalidate = invalidate
+        wrapper.get_many = get_many
+        wrapper.set_many = set_many
+        wrapper.contains_many = contains_many
+        wrapper.prefetch = aprefetch if is_async else prefetch
+        flight = async_flight or local_flight
+        wrapper.single_flight_info = lambda: {
+            'local_deduplicated': flight.deduplicated if flight else 0,
+            'remote_deduplicated': remote_flight.deduplicated if remote_flight else 0,
+            'remote_timeouts': remote_flight.timeouts if remote_flight else 0,
+            'in_flight': flight.in_flight() if flight else 0,
+        }
         wrapper.enable_cache = lambda: setattr(wrapper, 'enabled', True)
         if allow_disable:
             wrapper.disable_cache = lambda quiet=True: setattr(wrapper, 'enabled', False) or (not quiet and print(f"Disabled caching for {func.__name__}"))
@@ -143,40 +914,302 @@ def redis_lru_cache(maxsize=1000, enabled=True, quiet=True, ttl=None, arg_transf
 
 
 def conditional_lru_cache(enabled=True, maxsize=128, arg_transforms={}, tags=[], quiet=True, allow_disable=True, thread_safe=False,
-                          cache_id:str=None, use_self_id:bool=False, **kwargs):
-    # from threading import RLock
-
+                          cache_id:str=None, use_self_id:bool=False, single_flight:bool=False,
+                          ttl:float=None, soft_ttl:float=None, refresh_ahead:float=None, refresher=None, batch_arg:str=None,
+                          stats=None, max_bytes:int=None, getsizeof=None, memory_budget=None, policy='lru', admission=None,
+                          cache_exceptions=None, cache_empty=None, negative_ttl:float=60, negative_maxsize:int=1000, **kwargs):
+    """
+    A decorator to cache the result of a function in an in-process cachetools LRUCache.
+    Args:
+    - maxsize: the maximum number of items to cache. default: 128. None for no item limit (max_bytes or memory_budget
+        still bound the cache by size; the 'tinylfu' and 'arc' policies need a limit)
+    - thread_safe: guard cache reads and writes with a lock (wrapper.lock). The wrapped function itself runs outside the lock.
+    - single_flight: concurrent misses on the same key compute once; the other threads wait and share the result.
+        Implies thread_safe. single_flight_info() reports how many duplicate computations were avoided. default False
+    - ttl: the time-to-live for each cache entry (in seconds). Uses a cachetools TTLCache. default None (no expiry)
+    - policy: the eviction policy. 'lru' (default), 'lfu', 'ttl' (LRU plus expiry, needs ttl), or a scan-resistant one:
+        'tinylfu' (W-TinyLFU: a small LRU window plus a frequency-gated main area) or 'arc' (Adaptive Replacement Cache).
+        Use a scan-resistant policy when sweeps through cold keys (batch jobs) share a cache with a hot working set.
+        A cachetools.Cache subclass can be passed instead of a name. Only 'lru' and 'ttl' can be combined with ttl.
+    - soft_ttl, refresh_ahead, refresher: stale-while-revalidate and refresh-ahead, as in redis_lru_cache.
+        soft_ttl works without ttl (entries are then refreshed but never expire). With either set, wrapper.cache
+        holds (value, stored_at) pairs, stored_at being time.monotonic().
+    - batch_arg: name of a list argument the function returns one result per element for, in order. Each element is cached
+        separately (its key is built as if the element were passed in place of the list, so arg_transforms for batch_arg
+        apply to each element). All elements are looked up in one locked scan, the function is called once with only
+        the missing (deduplicated) elements, and the results are returned in the original order. Can't be combined with
+        single_flight, soft_ttl or refresh_ahead. default None
+    - stats: hit/miss counters and latency histograms (key_build, lookup, compute, store phases), as in redis_lru_cache
+    - max_bytes: bound the cache by the estimated size of its values instead of by item count (maxsize is then ignored).
+        cache_info() and memory_usage() report the bytes in use. default None
+    - getsizeof: the size estimator for max_bytes and memory budgets, value -> bytes. default memory.estimate_size
+    - memory_budget: a memory.MemoryBudget this cache counts against, shared with other caches: storing past it evicts
+        from whichever cache uses the most memory for its tags' weight. default None = the process-wide budget if one
+        was set with memory.set_memory_budget (the cache is then byte-bounded, by max_bytes or the whole budget); False = none
+    - admission: which computed results get cached, as in redis_lru_cache; sizes are getsizeof estimates. default None
+    - cache_exceptions, cache_empty, negative_ttl, negative_maxsize: negative caching, as in redis_lru_cache. Negative
+        entries live in their own in-process TTLCache (wrapper.negative_cache).
+    - enabled, quiet, allow_disable, arg_transforms, tags, cache_id, use_self_id: as in redis_lru_cache
+    The wrapper also has the bulk methods get_many, set_many, contains_many and prefetch described in redis_lru_cache.
+    Coroutine functions get an async wrapper that awaits results before caching them; concurrent awaits of the same key
+    share one computation, and stale entries are refreshed in a background task on the running loop.
+    """
     if maxsize is None:
-        maxsize = 1000000
-    cache = LRUCache(maxsize)
+        maxsize = math.inf
+    if refresh_ahead and not ttl:
+        raise ValueError("refresh_ahead needs a ttl")
+    # an entry is refreshed in the background once it is older than this (seconds)
+    refresh_after = min(soft_ttl or ttl, ttl - refresh_ahead if refresh_ahead else ttl) if ttl else soft_ttl
+    timestamped = bool(soft_ttl or refresh_ahead)
+    budget = resolve_budget(memory_budget)
+    cache = make_memory_cache(maxsize, ttl, max_bytes, getsizeof, budget, timestamped, policy)
+    if batch_arg and (single_flight or timestamped):
+        raise ValueError("batch_arg can't be combined with single_flight, soft_ttl or refresh_ahead")
+    negative_exceptions, negative_empty = negative_cache.exception_types(cache_exceptions), negative_cache.empty_test(cache_empty)
+    if batch_arg and (negative_exceptions or negative_empty):
+        raise ValueError("batch_arg can't be combined with cache_exceptions or cache_empty")
+    stats_option, admission_option = stats, admission
+    sizer = getsizeof or estimate_size
     
     def decorator(func):
         nonlocal enabled, quiet, allow_disable, thread_safe, cache, arg_transforms, tags, use_self_id, cache_id
+        make_key = compile_key_builder(func, arg_transforms=arg_transforms, prefix=cache_id, use_id=use_self_id)
+        stats = get_stats(stats_option, func.__qualname__)
+        admission = get_admission(admission_option)
+        negative = negative_cache.NegativeCache(negative_maxsize, negative_ttl) if negative_exceptions or negative_empty else None
+        is_async = inspect.iscoroutinefunction(func)
+        flight = AsyncSingleFlight() if is_async else SingleFlight() if single_flight else None
+        batch = BatchArgument(func, batch_arg) if batch_arg else None
+
+        def lookup(key):
+            lock = wrapper.lock
+            try:
+                if lock is None:
+                    return cache[key]
+                with lock:
+                    return cache[key]
+            except KeyError:
+                return SENTINEL
+
+        def negative_lookup(key):
+            # a failure or empty result cached in the negative tier: SENTINEL, the empty result, or raises the exception
+            entry = negative.get(key)
+            if entry is SENTINEL:
+                return SENTINEL
+            if stats is not None: stats.hit()
+            return negative_cache.unwrap(entry)
+
+        def compute_and_store(key, args, kwargs):
+            st = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except negative_exceptions as e:  # () unless cache_exceptions is set: catches nothing
+                negative.put(key, negative_cache.CachedException(e))
+                raise
+            if negative_empty is not None and negative_empty(result):
+                negative.put(key, result)
+                return result
+            store_many([(key, result)], time.perf_counter() - st)
+            return result
+
+        async def acompute_and_store(key, args, kwargs):
+            st = time.perf_counter()
+            try:
+                result = await func(*args, **kwargs)
+            except negative_exceptions as e:
+                negative.put(key, negative_cache.CachedException(e))
+                raise
+            if negative_empty is not None and negative_empty(result):
+                negative.put(key, result)
+                return result
+            store_many([(key, result)], time.perf_counter() - st)
+            return result
+
+        def batch_call(args, kwargs):
+            # One cache entry per element; only the missing elements are computed, in a single call
+            keys, found, missing = batch_start(args, kwargs)
+            if missing:
+                st = time.perf_counter()
+                results = batch.compute(func, args, kwargs, list(missing.values()))
+                found.update(zip(missing, results))
+                store_many(zip(missing, results), (time.perf_counter() - st) / len(missing))
+            return [found[key] for key in keys]
+
+        async def abatch_call(args, kwargs):
+            keys, found, missing = batch_start(args, kwargs)
+            if missing:
+                st = time.perf_counter()
+                results = await batch.acompute(func, args, kwargs, list(missing.values()))
+                found.update(zip(missing, results))
+                store_many(zip(missing, results), (time.perf_counter() - st) / len(missing))
+            return [found[key] for key in keys]
+
+        def batch_start(args, kwargs):
+            # (keys, found, missing): a key per element, the cached values, and the unique keys to compute
+            items = list(batch.get(args, kwargs))
+            keys = [make_key(*batch.replace(args, kwargs, item)) for item in items]
+            found, missing = {}, {}
+            with wrapper.lock or nullcontext():
+                for key, item in zip(keys, items):
+                    if key not in found and key not in missing:
+                        try:
+                            found[key] = cache[key]
+                        except KeyError:
+                            missing[key] = item
+            if not wrapper.quiet: print(f" -> Batch of {len(items)}: {len(found)} cached, {len(missing)} to compute")
+            if stats is not None: stats.hit(len(found)); stats.miss(len(missing))
+            return keys, found, missing
+
+        def store_many(entries, seconds=None):
+            # seconds: each entry's compute time, for the admission policy (None for set_many)
+            if admission is not None:
+                entries = [(key, result) for key, result in entries if admission.admit(
+                    key, result, seconds, sizer(result) if admission.max_size is not None else None, stats)]
+            now = time.monotonic()
+            with wrapper.lock or nullcontext():
+                for key, result in entries:
+                    try:
+                        cache[key] = (result, now) if timestamped else result
+                    except ValueError:
+                        pass  # value too large for the cache
+            if budget is not None:
+                budget.enforce()
+
+        # Bulk methods: each call is a tuple of positional arguments or a dict of keyword arguments
+        def get_many(calls):
+            # (hits, misses): [(call, value), ...] for the cached calls and [call, ...] for the rest. Never calls func.
+            hits, misses = [], []
+            keys = [make_key(*split_call(call)) for call in calls]
+            with wrapper.lock or nullcontext():
+                for call, key in zip(calls, keys):
+                    try:
+                        entry = cache[key]
+                    except KeyError:
+                        misses.append(call)
+                        continue
+                    hits.append((call, entry[0] if timestamped else entry))
+            return hits, misses
+
+        def contains_many(calls):
+            keys = [make_key(*split_call(call)) for call in calls]
+            with wrapper.lock or nullcontext():
+                return [key in cache for key in keys]
+
+        def set_many(items):
+            # Store (call, value) pairs without calling func
+            items = list(items)
+            store_many((make_key(*split_call(call)), value) for call, value in items)
+            return len(items)
+
+        def prefetch(calls):
+            # Compute and store the calls that aren't cached yet; returns how many were computed
+            _, misses = get_many(calls)
+            return set_many(zip(misses, compute_calls([split_call(call) for call in misses])))
+
+        async def aprefetch(calls):
+            # prefetch() for coroutine functions: the misses are computed concurrently
+            _, misses = get_many(calls)
+            return set_many(zip(misses, await acompute_calls([split_call(call) for call in misses])))
+
+        def compute_calls(calls):
+            # Call func for each (args, kwargs); in batch_arg mode calls differing only in their element share one call
+            if batch is not None:
+                return batch.compute_calls(func, calls, make_key)
+            return [func(*args, **kwargs) for args, kwargs in calls]
+
+        async def acompute_calls(calls):
+            if batch is not None:
+                return await batch.acompute_calls(func, calls, make_key)
+            return await asyncio.gather(*(func(*args, **kwargs) for args, kwargs in calls))
         
         @wraps(func)
         def wrapper(*args, **kwargs):
             if wrapper.enabled:
-                custom_key = lambda *a, **kw: make_hashable_key(func, a, kw, arg_transforms=arg_transforms, prefix=cache_id, use_id=use_self_id) 
-                # print(f"Using custom key: {custom_key(*args, **kwargs)} in {func.__name__} ...")
-                # if thread_safe and wrapper.lock:
-                #     with wrapper.lock:
-                #         return cached(cache, key=custom_key)(func)(*args, **kwargs)
-                # else:
-                return cached(cache, key=custom_key)(func)(*args, **kwargs)
+                if batch is not None:
+                    return batch_call(args, kwargs)
+                key = make_key(args, kwargs)
+                # print(f"Using custom key: {key} in {func.__name__} ...")
+                result = lookup(key)
+                if result is SENTINEL and negative is not None:
+                    result = negative_lookup(key)
+                    if result is not SENTINEL:
+                        return result
+                if stats is not None: stats.miss() if result is SENTINEL else stats.hit()
+                if result is not SENTINEL:
+                    if not timestamped:
+                        return result
+                    result, stored_at = result
+                    if time.monotonic() - stored_at >= refresh_after:
+                        if not wrapper.quiet: print(f" -> Stale cache hit, refreshing {func.__name__} in the background")
+                        (refresher or get_refresher()).submit((id(cache), key), lambda: compute_and_store(key, args, kwargs))
+                    return result
+                if flight is None:
+                    return compute_and_store(key, args, kwargs)
+                return flight.do(key, lambda: compute_and_store(key, args, kwargs))
             else:
                 return func(*args, **kwargs)
+
+        if is_async:
+            # Coroutine functions: results are awaited before caching, and concurrent awaits of a key share one task
+            @wraps(func)
+            async def wrapper(*args, **kwargs):
+                if not wrapper.enabled:
+                    return await func(*args, **kwargs)
+                if batch is not None:
+                    return await abatch_call(args, kwargs)
+                key = make_key(args, kwargs)
+                result = lookup(key)
+                if result is SENTINEL and negative is not None:
+                    result = negative_lookup(key)
+                    if result is not SENTINEL:
+                        return result
+                if stats is not None: stats.miss() if result is SENTINEL else stats.hit()
+                if result is SENTINEL:
+                    return await flight.do(key, lambda: acompute_and_store(key, args, kwargs))
+                if not timestamped:
+                    return result
+                result, stored_at = result
+                if time.monotonic() - stored_at >= refresh_after:
+                    if not wrapper.quiet: print(f" -> Stale cache hit, refreshing {func.__name__} in the background")
+                    flight.spawn(key, lambda: acompute_and_store(key, args, kwargs))
+                return result
+
+        if stats is not None:
+            # Time each phase by swapping in timed versions of the functions the wrappers call
+            make_key = stats.timed('key_build', make_key)
+            lookup = stats.timed('lookup', lookup)
+            func = (stats.atimed if is_async else stats.timed)('compute', func)
+            store_many = stats.timed('store', store_many)
             
         # Attach cache control methods and state to the wrapper
         wrapper.cache = cache
         wrapper.allow_disable = allow_disable
         wrapper.enabled = enabled
         wrapper.quiet = quiet
-        # wrapper.lock = RLock() if thread_safe else None
+        # a memory budget evicts from other threads, so its caches need a lock too
+        wrapper.lock = threading.RLock() if thread_safe or single_flight or timestamped or budget else None
+        if budget is not None:
+            budget.register(cache, name=func.__qualname__, tags=tags, lock=wrapper.lock)
         # wrapper.__getstate__ = __getstate__
         # wrapper.__setstate__ = __setstate__
         wrapper.thread_safe = thread_safe
         wrapper.cache_info = lambda: cache.currsize
-        wrapper.cache_clear = lambda **kwargs: cache.clear()
+        wrapper.memory_usage = lambda: cache.currsize if max_bytes is not None or budget is not None else None
+        wrapper.stats = stats
+        wrapper.cache_stats = lambda: stats.snapshot() if stats is not None else None
+        wrapper.admission = admission
+        wrapper.admission_stats = lambda: admission.snapshot() if admission is not None else None
+        wrapper.negative_cache = negative
+        wrapper.negative_cache_info = lambda: negative.info() if negative is not None else None
+        wrapper.cache_clear = lambda **kwargs: cache.clear() or (negative is not None and negative.clear())
+        wrapper.get_many = get_many
+        wrapper.set_many = set_many
+        wrapper.contains_many = contains_many
+        wrapper.prefetch = aprefetch if is_async else prefetch
+        wrapper.single_flight_info = lambda: {
+            'local_deduplicated': flight.deduplicated if flight else 0,
+            'in_flight': flight.in_flight() if flight else 0,
+        }
         wrapper.quiet_cache = lambda quiet=True: setattr(wrapper, 'quiet', quiet)
         wrapper.enable_cache = lambda: setattr(wrapper, 'enabled', True)
         if allow_disable:
@@ -189,3 +1222,237 @@ def conditional_lru_cache(enabled=True, maxsize=128, arg_transforms={}, tags=[],
         return wrapper
 
     return decorator
+
+
+def disk_lru_cache(maxsize=1000, enabled=True, quiet=True, ttl=None, arg_transforms={}, tags=[], use_self_id:bool=False,
+                   cache_id:str=None, allow_disable=True, hash_keys:bool=True, path:str=None, store=None, serializer=None,
+                   single_flight:bool=False, stats=None, **kwargs):
+    """
+    A decorator to cache the result of a function in a local SQLite database (see disk.DiskStore), which survives
+    restarts: a restarted worker starts warm instead of recomputing everything, and no Redis is needed.
+    Processes on the same host using the same path (and cache_id) share the cache; SQLite in WAL mode handles the
+    locking. Entries are evicted least recently used past maxsize and expire after ttl, as in redis_lru_cache.
+    Args:
+    - path: the database file. default: $HANK_CACHE_PATH, else ~/.cache/HANK_Caching/cache.sqlite3
+    - store: a disk.DiskStore to use instead of the process-wide one for path
+    - maxsize: the maximum number of entries. default 1000. None for unlimited
+    - ttl: time-to-live of each entry, in seconds. default None (no expiry)
+    - serializer: how values are encoded, as in redis_lru_cache (chunked serializers aren't supported). default 'legacy'
+    - single_flight: concurrent misses on the same key in this process compute once. default False
+    - stats: hit/miss counters and latency histograms, as in redis_lru_cache
+    - enabled, quiet, allow_disable, arg_transforms, tags, cache_id, use_self_id, hash_keys: as in redis_lru_cache.
+        Without a cache_id, entries are keyed by the function's file and qualified name, so they outlive the process.
+    The wrapper has the bulk methods get_many, set_many, contains_many and prefetch described in redis_lru_cache, plus
+    cache_invalidate(*args, **kwargs). If the database can't be read or written (e.g. a full disk), the error is logged
+    and the function is called uncached. Coroutine functions get an async wrapper; the (local, short) database calls
+    run inline on the event loop.
+    """
+    codec = get_serializer(serializer)
+    if codec.chunked:
+        raise ValueError("disk_lru_cache doesn't support chunked serializers")
+
+    def decorator(func):
+        prefix = cache_id or hash_key(get_function_identity(func))
+        db = store or get_disk_store(path)
+        wrapper = make_table_cache(func, DiskCache(db, prefix), (sqlite3.Error,), codec, maxsize=maxsize, ttl=ttl,
+                                   enabled=enabled, quiet=quiet, allow_disable=allow_disable, arg_transforms=arg_transforms,
+                                   tags=tags, use_self_id=use_self_id, hash_keys=hash_keys, single_flight=single_flight, stats=stats)
+        wrapper.store = db
+        wrapper.cache_key_prefix = prefix
+        return wrapper
+    return decorator
+
+
+def shared_lru_cache(maxsize=1024, enabled=True, quiet=True, ttl=None, arg_transforms={}, tags=[], use_self_id:bool=False,
+                     cache_id:str=None, allow_disable=True, slot_size:int=4096, ways:int=8, directory:str=None,
+                     serializer=None, single_flight:bool=False, stats=None, **kwargs):
+    """
+    A decorator to cache the result of a function in host-local shared memory (see shm.SharedMemoryCache), so the
+    worker processes on a machine share one copy of each value (and each other's hits) instead of holding one cache each.
+    Any process decorating with the same cache_id attaches to the same table. Hits read the shared table without taking
+    a lock; stores lock one stripe of it.
+    Args:
+    - maxsize: number of entries (slots in the table). default 1024
+    - slot_size: bytes per slot; serialized values longer than slot_size - 40 aren't cached (the function's result is
+        still returned; wrapper.table.too_large counts them). Memory used is about maxsize * slot_size. default 4096
+    - ways: slots per hash set. Storing into a full set evicts its least recently used entry, so eviction approximates
+        LRU (more ways: closer to LRU, slower stores). default 8
+    - directory: where the table's file lives. default /dev/shm
+    - cache_id: the table's name. Processes with the same cache_id share it (so it must be given the same maxsize,
+        slot_size and ways). default: derived from the function's file and qualified name
+    - ttl, serializer, single_flight, stats, enabled, quiet, allow_disable, arg_transforms, tags, use_self_id:
+        as in disk_lru_cache
+    The table outlives the processes using it; wrapper.table.unlink() deletes it (cache_clear only empties it).
+    """
+    codec = get_serializer(serializer)
+    if codec.chunked:
+        raise ValueError("shared_lru_cache doesn't support chunked serializers")
+
+    def decorator(func):
+        name = hash_key(cache_id or get_function_identity(func))
+        table = get_shared_cache(name, slots=maxsize, slot_size=slot_size, ways=ways, directory=directory)
+        wrapper = make_table_cache(func, table, (OSError,), codec, maxsize=maxsize, ttl=ttl,
+                                   enabled=enabled, quiet=quiet, allow_disable=allow_disable, arg_transforms=arg_transforms,
+                                   tags=tags, use_self_id=use_self_id, hash_keys=False, single_flight=single_flight, stats=stats)
+        wrapper.table = table
+        return wrapper
+    return decorator
+
+
+def make_table_cache(func, table, errors, codec, maxsize, ttl, enabled, quiet, allow_disable, arg_transforms, tags,
+                     use_self_id, hash_keys, single_flight, stats):
+    """
+    The wrapper behind disk_lru_cache and shared_lru_cache: caches func in a table keyed by strings holding serialized
+    values (get, get_many, contains_many, set_many, delete_many, clear and count, as disk.DiskCache). Errors of the
+    given types from the table are logged and treated as misses (reads) or skipped (writes, invalidations, clears).
+    """
+    make_key = compile_key_builder(func, arg_transforms=arg_transforms, use_id=use_self_id)
+    stats = get_stats(stats, func.__qualname__)
+    is_async = inspect.iscoroutinefunction(func)
+    flight = AsyncSingleFlight() if is_async else SingleFlight() if single_flight else None
+
+    def make_cache_key(args, kwargs):
+        key = make_key(args, kwargs)
+        return hash_key(key) if hash_keys else str(key)
+
+    def lookup(cache_key):
+        try:
+            payload = table.get(cache_key)
+        except errors as e:
+            logging.warning(f"Cache read failed for {func.__qualname__}: {e}")
+            return SENTINEL
+        return SENTINEL if payload is None else codec.loads(payload)
+
+    def store_many(entries):
+        try:
+            table.set_many([(cache_key, codec.dumps(value)) for cache_key, value in entries], ttl=ttl, maxsize=maxsize)
+        except errors as e:
+            logging.warning(f"Cache write failed for {func.__qualname__}: {e}")
+
+    def compute_and_store(cache_key, args, kwargs):
+        result = func(*args, **kwargs)
+        store_many([(cache_key, result)])
+        return result
+
+    async def acompute_and_store(cache_key, args, kwargs):
+        result = await func(*args, **kwargs)
+        store_many([(cache_key, result)])
+        return result
+
+    # Bulk methods: each call is a tuple of positional arguments or a dict of keyword arguments
+    def get_many(calls):
+        cache_keys = [make_cache_key(*split_call(call)) for call in calls]
+        try:
+            found = table.get_many(cache_keys)
+        except errors as e:
+            logging.warning(f"Cache read failed for {func.__qualname__}: {e}")
+            found = {}
+        hits, misses = [], []
+        for call, cache_key in zip(calls, cache_keys):
+            if cache_key in found:
+                hits.append((call, codec.loads(found[cache_key])))
+            else:
+                misses.append(call)
+        return hits, misses
+
+    def contains_many(calls):
+        try:
+            return table.contains_many([make_cache_key(*split_call(call)) for call in calls])
+        except errors as e:
+            logging.warning(f"Cache read failed for {func.__qualname__}: {e}")
+            return [False] * len(calls)
+
+    def set_many(items):
+        entries = list({make_cache_key(*split_call(call)): value for call, value in items}.items())
+        if entries:
+            store_many(entries)
+        return len(entries)
+
+    def prefetch(calls):
+        _, misses = get_many(calls)
+        return set_many(zip(misses, [func(*args, **kwargs) for args, kwargs in map(split_call, misses)]))
+
+    async def aprefetch(calls):
+        _, misses = get_many(calls)
+        return set_many(zip(misses, await asyncio.gather(*(func(*args, **kwargs) for args, kwargs in map(split_call, misses)))))
+
+    def invalidate(*args, **kwargs):
+        try:
+            table.delete_many([make_cache_key(args, kwargs)])
+        except errors as e:
+            logging.warning(f"Cache invalidation failed for {func.__qualname__}: {e}")
+
+    def clear():
+        try:
+            table.clear()
+        except errors as e:
+            logging.warning(f"Cache clear failed for {func.__qualname__}: {e}")
+
+    def count():
+        try:
+            return table.count()
+        except errors as e:
+            logging.warning(f"Cache count failed for {func.__qualname__}: {e}")
+            return None
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not wrapper.enabled:
+            return func(*args, **kwargs)
+        cache_key = make_cache_key(args, kwargs)
+        result = lookup(cache_key)
+        if stats is not None: stats.miss() if result is SENTINEL else stats.hit()
+        if result is not SENTINEL:
+            if not wrapper.quiet: print(f" -> Cache hit!")
+            return result
+        if flight is None:
+            return compute_and_store(cache_key, args, kwargs)
+        return flight.do(cache_key, lambda: compute_and_store(cache_key, args, kwargs))
+
+    if is_async:
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            if not wrapper.enabled:
+                return await func(*args, **kwargs)
+            cache_key = make_cache_key(args, kwargs)
+            result = lookup(cache_key)
+            if stats is not None: stats.miss() if result is SENTINEL else stats.hit()
+            if result is not SENTINEL:
+                if not wrapper.quiet: print(f" -> Cache hit!")
+                return result
+            return await flight.do(cache_key, lambda: acompute_and_store(cache_key, args, kwargs))
+
+    if stats is not None:
+        make_cache_key = stats.timed('key_build', make_cache_key)
+        lookup = stats.timed('lookup', lookup)
+        func = (stats.atimed if is_async else stats.timed)('compute', func)
+        store_many = stats.timed('store', store_many)
+
+    # Attach cache control methods and state to the wrapper
+    wrapper.serializer = codec
+    wrapper.allow_disable = allow_disable
+    wrapper.enabled = enabled
+    wrapper.quiet = quiet
+    wrapper.stats = stats
+    wrapper.cache_stats = lambda: stats.snapshot() if stats is not None else None
+    wrapper.cache_info = count
+    wrapper.cache_clear = lambda **kwargs: clear()
+    wrapper.cache_invalidate = invalidate
+    wrapper.get_many = get_many
+    wrapper.set_many = set_many
+    wrapper.contains_many = contains_many
+    wrapper.prefetch = aprefetch if is_async else prefetch
+    wrapper.single_flight_info = lambda: {
+        'local_deduplicated': flight.deduplicated if flight else 0,
+        'in_flight': flight.in_flight() if flight else 0,
+    }
+    wrapper.quiet_cache = lambda quiet=True: setattr(wrapper, 'quiet', quiet)
+    wrapper.enable_cache = lambda: setattr(wrapper, 'enabled', True)
+    if allow_disable:
+        wrapper.disable_cache = lambda quiet=True: setattr(wrapper, 'enabled', False) or (not quiet and print(f"Disabled caching for {func.__name__}"))
+    else:
+        wrapper.disable_cache = lambda quiet=True: None
+    wrapper.disable_cache_and_clear = lambda quiet=True: wrapper.cache_clear(quiet=quiet) or wrapper.disable_cache(quiet=quiet)
+    wrapper.tags = set(tags)
+
+    return wrapper
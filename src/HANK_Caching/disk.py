@@ -0,0 +1,261 @@
+"""
+Persistent on-disk cache storage (disk_lru_cache's backend): one SQLite database in WAL mode per path, shared by every
+cache (prefix) that uses it and safe for concurrent threads and processes on one host.
+Entries survive restarts, so a restarted worker starts warm. Expiry and recency use wall-clock time (time.time()),
+which is shared between processes and across restarts.
+"""
+from collections import OrderedDict
+import atexit, os, sqlite3, threading, time
+
+DEFAULT_PATH = os.path.join('~', '.cache', 'HANK_Caching', 'cache.sqlite3')
+SQL_VARIABLES = 500  # keys per IN (...) query, well under SQLite's variable limit
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    prefix TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL,
+    PRIMARY KEY (prefix, key)
+);
+CREATE INDEX IF NOT EXISTS entries_lru ON entries (prefix, accessed);
+CREATE INDEX IF NOT EXISTS entries_exp ON entries (prefix, expires) WHERE expires IS NOT NULL;
+CREATE TABLE IF NOT EXISTS counts (prefix TEXT PRIMARY KEY, n INTEGER NOT NULL);
+"""
+
+class DiskStore:
+    """
+    A SQLite database of cache entries, keyed by (prefix, key), each a serialized value with an optional expiry time
+    and a last-access time for LRU eviction. Entry counts per prefix are kept in a side table, so bounding a cache to
+    maxsize entries doesn't scan it.
+    Every thread gets its own connection (and a forked child opens new ones). Writes are short IMMEDIATE transactions;
+    other processes wait up to timeout seconds for them. Recency updates from hits are buffered in memory and written
+    with the next store (or every touch_interval seconds / touch_batch hits). A hit never waits for the write lock: if
+    another connection holds it, the updates stay buffered for the next try, so a hit is a point query plus at most
+    one non-blocking write attempt.
+    Args:
+      - path: str. The database file, created (with its directory) if missing. default ~/.cache/HANK_Caching/cache.sqlite3
+      - timeout: float. Seconds to wait for another connection's write lock. default 30
+      - synchronous: str. SQLite's synchronous pragma. 'NORMAL' (default) can lose the last commits on power loss, but
+        never corrupts the database; that's fine for a cache.
+    """
+    def __init__(self, path:str=None, timeout:float=30.0, synchronous:str='NORMAL', touch_interval:float=1.0, touch_batch:int=256):
+        self.path = os.path.abspath(os.path.expanduser(path or DEFAULT_PATH))
+        self.timeout = timeout
+        self.synchronous = synchronous
+        self.touch_interval = touch_interval
+        self.touch_batch = touch_batch
+        self._local = threading.local()
+        self._touches = OrderedDict()  # (prefix, key) -> last access not yet written
+        self._touches_since = None
+        self._touch_lock = threading.Lock()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection().executescript(SCHEMA)
+
+    def connection(self) -> sqlite3.Connection:
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(f'PRAGMA synchronous={self.synchronous}')
+            local.conn, local.pid = conn, os.getpid()
+        return local.conn
+
+    def _write(self, conn):
+        # BEGIN IMMEDIATE takes the write lock up front, so concurrent writers wait (busy timeout) instead of deadlocking
+        return _Transaction(conn)
+
+    def get(self, prefix:str, key:str, touch:bool=True):
+        """The stored bytes for key, or None if missing or expired."""
+        now = time.time()
+        row = self.connection().execute(
+            'SELECT value, expires FROM entries WHERE prefix = ? AND key = ?', (prefix, key)).fetchone()
+        if row is None or (row[1] is not None and row[1] <= now):
+            return None
+        if touch:
+            self._touch([(prefix, key)], now)
+        return row[0]
+
+    def get_many(self, prefix:str, keys, touch:bool=True) -> dict:
+        """{key: bytes} for the keys that are stored and not expired."""
+        now, found, conn = time.time(), {}, self.connection()
+        keys = list(dict.fromkeys(keys))
+        for i in range(0, len(keys), SQL_VARIABLES):
+            part = keys[i:i + SQL_VARIABLES]
+            rows = conn.execute(
+                f'SELECT key, value FROM entries WHERE prefix = ? AND key IN ({",".join("?" * len(part))})'
+                ' AND (expires IS NULL OR expires > ?)', (prefix, *part, now))
+            found.update(rows)
+        if touch and found:
+            self._touch([(prefix, key) for key in found], now)
+        return found
+
+    def contains_many(self, prefix:str, keys) -> list:
+        now, present, conn = time.time(), set(), self.connection()
+        keys = list(keys)
+        unique = list(dict.fromkeys(keys))
+        for i in range(0, len(unique), SQL_VARIABLES):
+            part = unique[i:i + SQL_VARIABLES]
+            rows = conn.execute(
+                f'SELECT key FROM entries WHERE prefix = ? AND key IN ({",".join("?" * len(part))})'
+                ' AND (expires IS NULL OR expires > ?)', (prefix, *part, now))
+            present.update(row[0] for row in rows)
+        return [key in present for key in keys]
+
+    def set_many(self, prefix:str, items, ttl:float=None, maxsize:int=None):
+        """
+        Store (key, bytes) pairs in one transaction, expiring in ttl seconds (None: never). Expired entries of the prefix
+        are purged, then least recently used ones are evicted down to maxsize (None or 0: unbounded).
+        """
+        now = time.time()
+        expires = now + ttl if ttl else None
+        conn = self.connection()
+        with self._write(conn):
+            self._flush_touches(conn)
+            removed = conn.execute('DELETE FROM entries WHERE prefix = ? AND expires <= ?', (prefix, now)).rowcount
+            added = 0
+            for key, value in items:
+                if conn.execute('SELECT 1 FROM entries WHERE prefix = ? AND key = ?', (prefix, key)).fetchone() is None:
+                    added += 1
+                conn.execute('INSERT OR REPLACE INTO entries (prefix, key, value, expires, accessed) VALUES (?, ?, ?, ?, ?)',
+                             (prefix, key, value, expires, now))
+            n = self._add_count(conn, prefix, added - removed)
+            if maxsize and n > maxsize:
+                evicted = conn.execute(
+                    'DELETE FROM entries WHERE rowid IN '
+                    '(SELECT rowid FROM entries WHERE prefix = ? ORDER BY accessed LIMIT ?)', (prefix, n - maxsize)).rowcount
+                self._add_count(conn, prefix, -evicted)
+
+    def delete_many(self, prefix:str, keys):
+        conn = self.connection()
+        keys = list(dict.fromkeys(keys))
+        with self._write(conn):
+            removed = 0
+            for i in range(0, len(keys), SQL_VARIABLES):
+                part = keys[i:i + SQL_VARIABLES]
+                removed += conn.execute(f'DELETE FROM entries WHERE prefix = ? AND key IN ({",".join("?" * len(part))})',
+                                        (prefix, *part)).rowcount
+            self._add_count(conn, prefix, -removed)
+
+    def clear(self, prefix:str):
+        conn = self.connection()
+        with self._write(conn):
+            conn.execute('DELETE FROM entries WHERE prefix = ?', (prefix,))
+            conn.execute('DELETE FROM counts WHERE prefix = ?', (prefix,))
+        with self._touch_lock:
+            for entry in [entry for entry in self._touches if entry[0] == prefix]:
+                del self._touches[entry]
+
+    def count(self, prefix:str) -> int:
+        """Number of unexpired entries for prefix."""
+        return self.connection().execute('SELECT COUNT(*) FROM entries WHERE prefix = ? AND (expires IS NULL OR expires > ?)',
+                                         (prefix, time.time())).fetchone()[0]
+
+    def _add_count(self, conn, prefix, delta) -> int:
+        conn.execute('INSERT INTO counts (prefix, n) VALUES (?, ?) ON CONFLICT (prefix) DO UPDATE SET n = n + excluded.n',
+                     (prefix, delta))
+        return conn.execute('SELECT n FROM counts WHERE prefix = ?', (prefix,)).fetchone()[0]
+
+    def _touch(self, entries, now):
+        with self._touch_lock:
+            for entry in entries:
+                self._touches[entry] = now
+            if self._touches_since is None:
+                self._touches_since = now
+            due = len(self._touches) >= self.touch_batch or now - self._touches_since >= self.touch_interval
+        if due:
+            self.flush(wait=False)
+
+    def flush(self, wait:bool=True):
+        """
+        Write buffered recency updates. With wait=False, give up right away if another connection holds the write lock
+        (the updates stay buffered); returns whether they were written.
+        """
+        if not self._touches:
+            return True
+        conn = self.connection()
+        if not wait:
+            conn.execute('PRAGMA busy_timeout = 0')
+        try:
+            with self._write(conn):
+                self._flush_touches(conn)
+            return True
+        except sqlite3.OperationalError:
+            # only BEGIN IMMEDIATE can fail here (once it holds the lock, the updates don't wait on anyone)
+            if wait:
+                raise
+            with self._touch_lock:
+                self._touches_since = time.time()  # next try after touch_interval, or with the next store
+            return False
+        finally:
+            if not wait:
+                conn.execute(f'PRAGMA busy_timeout = {int(self.timeout * 1000)}')
+
+    def _flush_touches(self, conn):
+        with self._touch_lock:
+            touches, self._touches, self._touches_since = self._touches, OrderedDict(), None
+        if touches:
+            conn.executemany('UPDATE entries SET accessed = ? WHERE prefix = ? AND key = ?',
+                             [(accessed, prefix, key) for (prefix, key), accessed in touches.items()])
+
+class DiskCache:
+    """One cache (prefix) of a DiskStore, with the keyed interface disk_lru_cache wraps (as shm.SharedMemoryCache)."""
+    def __init__(self, store:DiskStore, prefix:str):
+        self.store = store
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.store.get(self.prefix, key)
+
+    def get_many(self, keys) -> dict:
+        return self.store.get_many(self.prefix, keys)
+
+    def contains_many(self, keys) -> list:
+        return self.store.contains_many(self.prefix, keys)
+
+    def set_many(self, items, ttl:float=None, maxsize:int=None):
+        self.store.set_many(self.prefix, items, ttl, maxsize)
+
+    def delete_many(self, keys):
+        self.store.delete_many(self.prefix, keys)
+
+    def clear(self):
+        self.store.clear(self.prefix)
+
+    def count(self) -> int:
+        return self.store.count(self.prefix)
+
+class _Transaction:
+    __slots__ = ('conn',)
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute('ROLLBACK' if exc_type else 'COMMIT')
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_disk_store(path:str=None) -> DiskStore:
+    """The process-wide DiskStore for path (default: $HANK_CACHE_PATH, else ~/.cache/HANK_Caching/cache.sqlite3)."""
+    path = os.path.abspath(os.path.expanduser(path or os.getenv('HANK_CACHE_PATH') or DEFAULT_PATH))
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = DiskStore(path)
+        return store
+
+@atexit.register
+def _flush_stores():
+    for store in list(_stores.values()):
+        try:
+            store.flush()
+        except sqlite3.Error:
+            pass
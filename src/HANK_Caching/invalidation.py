@@ -0,0 +1,132 @@
+"""
+Cross-process invalidation of in-process (L1) cache tiers over Redis pub/sub.
+"""
+import json, logging, os, threading, time, uuid, weakref
+
+class InvalidationBus:
+    """
+    Broadcasts key, prefix and tag invalidations to every process subscribed to the same Redis channel and applies
+    the ones it receives to the L1 tiers of locally registered redis_lru_cache wrappers.
+    Normally created and shared through RedisClientManager.get_invalidation_bus(), not directly.
+
+    Publishing only queues the invalidation. A background thread sends everything queued within batch_interval
+    seconds as one message, so clearing many keys costs one PUBLISH per batch instead of one per key.
+    Received messages are applied on redis-py's pub/sub worker thread, off the caller's path.
+
+    Args:
+      - redis_client: the Redis client to publish and subscribe with.
+      - channel: str. The pub/sub channel shared by all nodes. Default: 'HANK_Caching:invalidate'
+      - batch_interval: float. Seconds to collect invalidations before publishing them together. Default: 0.05
+      - max_batch: int. Maximum number of invalidations per published message. Default: 1000
+    """
+    CHANNEL = "HANK_Caching:invalidate"
+
+    def __init__(self, redis_client, channel:str=CHANNEL, batch_interval:float=0.05, max_batch:int=1000):
+        self.redis_client = redis_client
+        self.channel = channel
+        self.batch_interval = batch_interval
+        self.max_batch = max_batch
+        self.node_id = uuid.uuid4().hex
+        self.pid = os.getpid()
+        self.published = 0
+        self.received = 0
+        self._wrappers = weakref.WeakSet()
+        self._pending = {}  # ordered set of queued (kind, *values) ops
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(**{channel: self._on_message})
+        self._listener = self._pubsub.run_in_thread(sleep_time=0.01, daemon=True, exception_handler=self._on_listener_error)
+        self._publisher = threading.Thread(target=self._publish_loop, name="HANK_Caching-invalidation", daemon=True)
+        self._publisher.start()
+
+    def register(self, wrapper):
+        """Apply received invalidations to wrapper's L1 tier (wrapper.l1_cache, matched by wrapper.cache_key_prefix)."""
+        self._wrappers.add(wrapper)
+
+    def unregister(self, wrapper):
+        self._wrappers.discard(wrapper)
+
+    def invalidate_key(self, cache_key_prefix:str, cache_key:str):
+        """Tell other nodes to drop one entry from their L1 tiers for cache_key_prefix."""
+        self._queue(("key", cache_key_prefix, cache_key))
+
+    def invalidate_prefix(self, cache_key_prefix:str):
+        """Tell other nodes to clear their L1 tiers for cache_key_prefix."""
+        self._queue(("prefix", cache_key_prefix))
+
+    def invalidate_tags(self, tags):
+        """Clear the L1 tiers of every registered wrapper with any of tags, on this node and on all other nodes."""
+        for tag in tags:
+            self._queue(("tag", tag))
+        self.apply([("tag", tag) for tag in tags])
+
+    def flush(self):
+        """Publish everything queued so far, now."""
+        with self._lock:
+            ops, self._pending = list(self._pending), {}
+        for i in range(0, len(ops), self.max_batch):
+            message = json.dumps({"node": self.node_id, "ops": ops[i:i + self.max_batch]})
+            try:
+                self.redis_client.publish(self.channel, message)
+                self.published += 1
+            except Exception as e:
+                logging.error(f"Error publishing cache invalidations: {e}")
+
+    def close(self):
+        """Flush pending invalidations and stop the background threads."""
+        self._closed = True
+        self._wakeup.set()
+        self.flush()
+        self._listener.stop()
+        self._pubsub.close()
+
+    def apply(self, ops):
+        """Apply invalidation ops to the L1 tiers of the registered wrappers."""
+        for op in ops:
+            kind = op[0]
+            for wrapper in list(self._wrappers):
+                l1 = getattr(wrapper, 'l1_cache', None)
+                if l1 is None:
+                    continue
+                if kind == "tag":
+                    if op[1] not in wrapper.tags:
+                        continue
+                elif op[1] != wrapper.cache_key_prefix:
+                    continue
+                with wrapper.l1_lock:
+                    if kind == "key":
+                        l1.pop(op[2], None)
+                    else:
+                        l1.clear()
+
+    def _queue(self, op):
+        with self._lock:
+            self._pending[op] = None
+        self._wakeup.set()
+
+    def _publish_loop(self):
+        while not self._closed:
+            self._wakeup.wait()
+            if self._closed:
+                break
+            time.sleep(self.batch_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def _on_message(self, message):
+        try:
+            payload = json.loads(message['data'])
+        except (TypeError, ValueError):
+            logging.error(f"Ignoring malformed cache invalidation message: {message['data']!r}")
+            return
+        if payload.get("node") == self.node_id:
+            return
+        self.received += 1
+        self.apply([tuple(op) for op in payload.get("ops", [])])
+
+    def _on_listener_error(self, e, pubsub, thread):
+        # Keep listening; redis-py reconnects and resubscribes on the next read
+        logging.error(f"Error reading cache invalidations: {e}")
+        time.sleep(1)
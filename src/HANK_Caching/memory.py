@@ -0,0 +1,143 @@
+"""
+Byte-size accounting for the in-process caches: a size estimator for cached values and a process-wide memory budget
+shared by every conditional_lru_cache (and redis_lru_cache L1 tier) that opts in.
+"""
+from contextlib import nullcontext
+import sys, threading, weakref
+
+SAMPLE = 100  # containers longer than this are estimated from their first SAMPLE items
+
+def estimate_size(value, _depth:int=0) -> int:
+    """
+    Estimate the memory held by value, in bytes. The default getsizeof for byte-bounded caches.
+    sys.getsizeof (which numpy arrays and pandas objects implement to include their data), plus the contents of
+    lists, tuples, sets, dicts and instance __dict__s, a few levels deep. Long containers are estimated from a sample
+    and shared objects are counted each time they appear, so treat the result as an estimate, not an exact count.
+    """
+    size = sys.getsizeof(value)
+    if _depth >= 4 or isinstance(value, (str, bytes, bytearray, int, float, bool, type(None))):
+        return size
+    if isinstance(value, dict):
+        items = value.items()
+        n = len(value)
+        sampled = sum(estimate_size(k, _depth + 1) + estimate_size(v, _depth + 1) for k, v in _head(items))
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        n = len(value)
+        sampled = sum(estimate_size(item, _depth + 1) for item in _head(value))
+    elif hasattr(value, '__dict__') and not isinstance(value, type):
+        return size + estimate_size(vars(value), _depth + 1)
+    else:
+        return size
+    return size + (sampled * n // SAMPLE if n > SAMPLE else sampled)
+
+def _head(items):
+    for i, item in enumerate(items):
+        if i >= SAMPLE:
+            return
+        yield item
+
+class _Entry:
+    __slots__ = ('cache', 'name', 'tags', 'weight', 'lock')
+
+    def __init__(self, cache, name, tags, weight, lock):
+        self.cache = cache
+        self.name = name
+        self.tags = tags
+        self.weight = weight
+        self.lock = lock
+
+class MemoryBudget:
+    """
+    A memory budget (in estimated bytes) shared by many byte-bounded caches.
+    After a cache stores a value, enforce() evicts until the registered caches together fit in max_bytes. Each eviction
+    takes the least recently used entry of the cache using the most memory relative to its weight, so heavier-weighted
+    caches keep proportionally more. A cache's weight is the largest of its tags' weights in tag_weights (default 1).
+
+    Args:
+      - max_bytes: int. The budget for all registered caches together.
+      - tag_weights: dict. Tag -> weight. Default: every tag weighs 1
+    """
+    def __init__(self, max_bytes:int, tag_weights:dict=None):
+        self.max_bytes = max_bytes
+        self.tag_weights = dict(tag_weights or {})
+        self.evictions = 0
+        self._entries = []
+        self._lock = threading.RLock()  # reentrant: a cache can be collected (and unregistered) during enforce()
+
+    def weight(self, tags) -> float:
+        return max((self.tag_weights.get(tag, 1) for tag in tags), default=1)
+
+    def register(self, cache, name:str=None, tags=(), lock=None):
+        """
+        Count a cachetools cache sized in bytes (getsizeof) against the budget. lock is the lock that guards the cache
+        (or None). The cache is held weakly and drops out once it's garbage collected; don't let lock refer back to it.
+        """
+        tags = set(tags)
+        entry = _Entry(None, name, tags, self.weight(tags), lock)
+        def forget(_, entry=entry):
+            with self._lock:
+                if entry in self._entries:
+                    self._entries.remove(entry)
+        entry.cache = weakref.ref(cache, forget)
+        with self._lock:
+            self._entries.append(entry)
+
+    def total(self) -> int:
+        return sum(cache.currsize for cache in self._caches())
+
+    def enforce(self):
+        """Evict until the registered caches fit in max_bytes. Never call it while holding a registered cache's lock."""
+        with self._lock:
+            live = [(entry, entry.cache()) for entry in self._entries]
+            live = [(entry, cache) for entry, cache in live if cache is not None]
+            total = sum(cache.currsize for _, cache in live)
+            while total > self.max_bytes:
+                entry, cache = max(live, key=lambda pair: pair[1].currsize / pair[0].weight)
+                with entry.lock or nullcontext():
+                    before = cache.currsize
+                    try:
+                        cache.popitem()
+                    except KeyError:
+                        pass
+                    freed = before - cache.currsize
+                if freed <= 0:
+                    break  # nothing left to evict (or sizes changed under us); try again on the next store
+                total -= freed
+                self.evictions += 1
+
+    def usage(self) -> dict:
+        """Estimated bytes used per registered cache and in total."""
+        with self._lock:
+            caches = [
+                {'name': entry.name, 'tags': sorted(entry.tags), 'weight': entry.weight,
+                 'bytes': cache.currsize, 'items': len(cache)}
+                for entry, cache in ((entry, entry.cache()) for entry in self._entries) if cache is not None
+            ]
+        return {'max_bytes': self.max_bytes, 'total': sum(cache['bytes'] for cache in caches),
+                'evictions': self.evictions, 'caches': caches}
+
+    def _caches(self):
+        with self._lock:
+            return [cache for cache in (entry.cache() for entry in self._entries) if cache is not None]
+
+_budget = None
+
+def set_memory_budget(max_bytes:int, tag_weights:dict=None) -> MemoryBudget:
+    """
+    Set the process-wide memory budget. Caches created afterwards (decorators and CachingBase instances) are
+    byte-bounded and count against it unless they pass memory_budget=False. Call it at startup, before creating them.
+    Pass max_bytes=None to remove the budget.
+    """
+    global _budget
+    _budget = MemoryBudget(max_bytes, tag_weights) if max_bytes is not None else None
+    return _budget
+
+def get_memory_budget():
+    """The process-wide MemoryBudget, or None if none was set."""
+    return _budget
+
+def resolve_budget(memory_budget):
+    """Resolve a decorator's memory_budget argument: None (the process-wide budget, if set), False (none) or a MemoryBudget."""
+    if memory_budget is None:
+        return _budget
+    return memory_budget or None
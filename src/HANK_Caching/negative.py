@@ -0,0 +1,117 @@
+"""
+Negative caching for the cache decorators (their cache_exceptions and cache_empty options): remembering that a call
+failed, or came back empty, for a short while, so retries with the same bad input don't rerun the expensive path.
+Negative entries have their own ttl and capacity, so a storm of bad inputs can't evict the good entries.
+"""
+from cachetools import TTLCache
+import copy, logging, threading
+
+from HANK_Caching.utils import SENTINEL
+
+class CachedException:
+    """A cached failure: the exception (a traceback-free copy) that is raised again on every hit."""
+    __slots__ = ('exception',)
+
+    def __init__(self, exception:BaseException):
+        self.exception = copy_exception(exception)
+
+    def __reduce__(self):
+        return (CachedException, (self.exception,))
+
+def copy_exception(exception:BaseException) -> BaseException:
+    """
+    A copy of exception with the same type, args and attributes but no traceback, so each re-raise gets a fresh one and
+    the cache doesn't hold on to the failed call's frames. Exceptions that can't be copied are used as they are.
+    """
+    try:
+        clone = copy.copy(exception)
+    except Exception:
+        return exception
+    clone.__traceback__ = None
+    clone.__cause__, clone.__suppress_context__ = exception.__cause__, exception.__suppress_context__
+    return clone
+
+def unwrap(entry):
+    """The value of a negative entry: raises a cached exception, returns a cached empty result."""
+    if type(entry) is CachedException:
+        raise copy_exception(entry.exception)
+    return entry
+
+def is_empty(result) -> bool:
+    """The default cache_empty test: None, or a value with len() 0 (empty lists, dicts, strings, DataFrames ...)."""
+    if result is None:
+        return True
+    try:
+        return len(result) == 0
+    except TypeError:
+        return False
+
+def empty_test(cache_empty):
+    """Resolve a decorator's cache_empty argument: None/False (off), True (is_empty) or a predicate result -> bool."""
+    if cache_empty is True:
+        return is_empty
+    return cache_empty or None
+
+def exception_types(cache_exceptions) -> tuple:
+    """Resolve a decorator's cache_exceptions argument (None, an exception class, or several) to a tuple for except."""
+    if not cache_exceptions:
+        return ()
+    if isinstance(cache_exceptions, type):
+        return (cache_exceptions,)
+    return tuple(cache_exceptions)
+
+def dumps_entry(codec, entry):
+    """
+    Serialize a negative entry for Redis, or None if it wouldn't come back intact (e.g. an exception class whose
+    __init__ needs arguments its args don't hold can't be unpickled); such failures just aren't cached.
+    """
+    try:
+        payload = codec.dumps(entry)
+        if type(entry) is CachedException:
+            codec.loads(payload)
+        return payload
+    except Exception as e:
+        what = repr(entry.exception) if type(entry) is CachedException else type(entry).__name__
+        logging.warning(f"Not caching {what}: can't serialize it ({e!r})")
+        return None
+
+class NegativeCache:
+    """
+    The in-process negative tier: failures and empty results, in a TTLCache of their own (maxsize entries, ttl seconds).
+    Counters: hits (calls answered from here), exceptions and empty (entries stored of each kind).
+    """
+    def __init__(self, maxsize:int=1000, ttl:float=60):
+        self.cache = TTLCache(maxsize, ttl)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.exceptions = 0
+        self.empty = 0
+
+    def get(self, key):
+        """The entry for key (pass it to unwrap), or SENTINEL."""
+        with self.lock:
+            entry = self.cache.get(key, SENTINEL)
+        if entry is not SENTINEL:
+            self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        with self.lock:
+            self.cache[key] = entry
+        if type(entry) is CachedException:
+            self.exceptions += 1
+        else:
+            self.empty += 1
+
+    def pop(self, key):
+        with self.lock:
+            self.cache.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
+
+    def info(self):
+        with self.lock:
+            size = len(self.cache)
+        return {'size': size, 'hits': self.hits, 'exceptions': self.exceptions, 'empty': self.empty}
@@ -0,0 +1,315 @@
+"""
+Eviction policies for the in-process caches (conditional_lru_cache's policy option).
+Besides cachetools' LRU, LFU and TTL caches, two scan-resistant policies, both cachetools.Cache subclasses so they
+work wherever an LRUCache does (getsizeof, currsize, popitem for memory budgets):
+  - WTinyLFUCache: W-TinyLFU. New entries go to a small LRU window; an entry leaving the window only displaces an entry
+    of the main (segmented LRU) area if a count-min sketch says it has been requested more often.
+  - ARCCache: Adaptive Replacement Cache, balancing recency and frequency lists using ghost entries of evicted keys.
+A one-off sweep through cold keys (a batch job, a crawler) can't push the hot working set out of either.
+"""
+from collections import OrderedDict
+from cachetools import Cache, LFUCache, LRUCache, TTLCache
+import math, time
+
+class CountMinSketch:
+    """
+    Approximate request counts, as used by TinyLFU: DEPTH rows of 4-bit (saturating at 15) counters.
+    Every sample_size additions all counters are halved, so the counts reflect recent popularity.
+    """
+    DEPTH = 4
+    MAX_COUNT = 15
+    SEEDS = (0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0xD6E8FEB86659FD93)
+    HALVE = bytes(i >> 1 for i in range(256))
+
+    def __init__(self, width:int):
+        self.bits = max(4, (width - 1).bit_length())
+        self.width = 1 << self.bits
+        self.rows = [bytearray(self.width) for _ in range(self.DEPTH)]
+        self.sample_size = 10 * self.width
+        self.additions = 0
+
+    def add(self, key):
+        h, shift, max_count = hash(key) & 0xFFFFFFFFFFFFFFFF, 64 - self.bits, self.MAX_COUNT
+        for row, seed in zip(self.rows, self.SEEDS):
+            i = ((h * seed) & 0xFFFFFFFFFFFFFFFF) >> shift
+            if row[i] < max_count:
+                row[i] += 1
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self.rows = [row.translate(self.HALVE) for row in self.rows]
+            self.additions //= 2
+
+    def estimate(self, key) -> int:
+        h, shift = hash(key) & 0xFFFFFFFFFFFFFFFF, 64 - self.bits
+        return min([row[((h * seed) & 0xFFFFFFFFFFFFFFFF) >> shift] for row, seed in zip(self.rows, self.SEEDS)])
+
+class _SizedCache(Cache):
+    """
+    A Cache that tracks each entry's size (taken from currsize, so getsizeof runs once per store) and tells subclasses
+    about stores (_stored) and removals (_removed). popitem() evicts; _take() removes without touching the policy.
+    """
+    def __init__(self, maxsize, getsizeof=None):
+        Cache.__init__(self, maxsize, getsizeof)
+        self._sizes = {}
+        self._freed = 0
+
+    def __setitem__(self, key, value):
+        before, freed = self.currsize, self._freed
+        Cache.__setitem__(self, key, value)  # may evict through popitem(), even key itself
+        old = self._sizes.get(key)
+        size = self.currsize - before + self._freed - freed + (old or 0)
+        self._sizes[key] = size
+        self._stored(key, old, size)
+
+    def __delitem__(self, key):
+        Cache.__delitem__(self, key)
+        size = self._sizes.pop(key)
+        self._freed += size
+        self._removed(key, size)
+
+    def _take(self, key):
+        value = Cache.__getitem__(self, key)
+        del self[key]
+        return key, value
+
+    def clear(self):
+        for key in list(self._sizes):
+            Cache.__delitem__(self, key)
+        self._sizes.clear()
+
+    def _stored(self, key, old, size):
+        raise NotImplementedError
+
+    def _removed(self, key, size):
+        raise NotImplementedError
+
+class WTinyLFUCache(_SizedCache):
+    """
+    Window TinyLFU. Sizes are in getsizeof units (items by default, bytes for byte-bounded caches).
+      - window: fraction of maxsize for the admission window (LRU). default 0.01
+      - protected: fraction of the main area for entries requested again while in it. default 0.8
+      - sketch_width: counters per sketch row, rounded up to a power of 2. default maxsize, capped at 2**20
+    Every lookup (hit or miss) counts towards the key's frequency. admitted and rejected count the window entries that
+    did and didn't win their place in the main area.
+    """
+    def __init__(self, maxsize, getsizeof=None, window:float=0.01, protected:float=0.8, sketch_width:int=None):
+        _SizedCache.__init__(self, maxsize, getsizeof)
+        self.window_max = max(1, maxsize * window)
+        self.protected_max = (maxsize - self.window_max) * protected
+        self.sketch = CountMinSketch(sketch_width or min(max(maxsize, 64), 1 << 20))
+        self._window, self._probation, self._protected = OrderedDict(), OrderedDict(), OrderedDict()
+        self._window_size = self._protected_size = 0
+        self.admitted = self.rejected = 0
+
+    def __getitem__(self, key):
+        self.sketch.add(key)
+        value = Cache.__getitem__(self, key)
+        if key in self._window:
+            self._window.move_to_end(key)
+        elif key in self._protected:
+            self._protected.move_to_end(key)
+        elif key in self._probation:
+            del self._probation[key]
+            self._protected[key] = None
+            self._protected_size += self._sizes[key]
+            while self._protected_size > self.protected_max and len(self._protected) > 1:
+                demoted = next(iter(self._protected))
+                del self._protected[demoted]
+                self._protected_size -= self._sizes[demoted]
+                self._probation[demoted] = None
+        return value
+
+    def _stored(self, key, old, size):
+        if old is None:
+            self._window[key] = None
+            self._window_size += size
+        elif key in self._window:
+            self._window_size += size - old
+            self._window.move_to_end(key)
+        elif key in self._protected:
+            self._protected_size += size - old
+            self._protected.move_to_end(key)
+        else:
+            self._probation.move_to_end(key)
+
+    def _removed(self, key, size):
+        if key in self._window:
+            del self._window[key]
+            self._window_size -= size
+        elif key in self._protected:
+            del self._protected[key]
+            self._protected_size -= size
+        else:
+            del self._probation[key]
+
+    def _admit(self, key):
+        # move key from the window to the probation segment of the main area
+        del self._window[key]
+        self._window_size -= self._sizes[key]
+        self._probation[key] = None
+
+    def popitem(self):
+        window, main_max = self._window, self.maxsize - self.window_max
+        # window entries move to the main area while it has room; then the window's LRU entry (the candidate) and the
+        # main area's LRU entry (the victim) compete, and the one requested less often is evicted
+        while window and self.currsize - self._window_size + self._sizes[next(iter(window))] <= main_max:
+            self._admit(next(iter(window)))
+        victim = next(iter(self._probation or self._protected), None)
+        if not window:
+            if victim is None:
+                raise KeyError(f"{type(self).__name__} is empty")
+            return self._take(victim)
+        candidate = next(iter(window))
+        if victim is None:
+            return self._take(candidate)
+        if self.sketch.estimate(candidate) > self.sketch.estimate(victim):
+            self.admitted += 1
+            item = self._take(victim)
+            self._admit(candidate)
+            return item
+        self.rejected += 1
+        return self._take(candidate)
+
+    def clear(self):
+        _SizedCache.clear(self)
+        self._window.clear()
+        self._probation.clear()
+        self._protected.clear()
+        self._window_size = self._protected_size = 0
+
+class ARCCache(_SizedCache):
+    """
+    Adaptive Replacement Cache (Megiddo & Modha), generalized to sized entries.
+    t1 holds entries requested once recently, t2 entries requested at least twice. Evicted keys are remembered (without
+    their values) in the ghost lists b1 and b2; storing a key found in a ghost list shifts the target size p of t1
+    towards whichever list would have kept it.
+    """
+    def __init__(self, maxsize, getsizeof=None):
+        _SizedCache.__init__(self, maxsize, getsizeof)
+        self.p = 0
+        self._t1, self._t2 = OrderedDict(), OrderedDict()
+        self._b1, self._b2 = OrderedDict(), OrderedDict()  # ghost key -> size
+        self._t1_size = self._b1_size = self._b2_size = 0
+        self._incoming = None  # ghost list the key being stored was found in
+
+    def __getitem__(self, key):
+        value = Cache.__getitem__(self, key)
+        if key in self._t1:
+            del self._t1[key]
+            self._t1_size -= self._sizes[key]
+            self._t2[key] = None
+        elif key in self._t2:
+            self._t2.move_to_end(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if key in self or (key not in self._b1 and key not in self._b2):
+            return _SizedCache.__setitem__(self, key, value)
+        b1_size, b2_size = max(self._b1_size, 1), max(self._b2_size, 1)
+        if key in self._b1:
+            size = self._b1.pop(key)
+            self._b1_size -= size
+            self.p = min(self.maxsize, self.p + max(b2_size / b1_size, 1) * size)
+            self._incoming = self._b1
+        else:
+            size = self._b2.pop(key)
+            self._b2_size -= size
+            self.p = max(0, self.p - max(b1_size / b2_size, 1) * size)
+            self._incoming = self._b2
+        try:
+            _SizedCache.__setitem__(self, key, value)
+        finally:
+            self._incoming = None
+
+    def _stored(self, key, old, size):
+        if old is None and (key in self._b1 or key in self._b2):
+            # a growing entry evicted itself while being updated; it's resident again
+            ghosts = self._b1 if key in self._b1 else self._b2
+            ghost_size = ghosts.pop(key)
+            if ghosts is self._b1:
+                self._b1_size -= ghost_size
+            else:
+                self._b2_size -= ghost_size
+        if old is None and self._incoming is None:
+            self._t1[key] = None
+            self._t1_size += size
+        elif old is None:
+            self._t2[key] = None
+        elif key in self._t1:
+            self._t1_size += size - old
+            self._t1.move_to_end(key)
+        else:
+            self._t2.move_to_end(key)
+        self._trim_ghosts()
+
+    def _removed(self, key, size):
+        if key in self._t1:
+            del self._t1[key]
+            self._t1_size -= size
+        else:
+            del self._t2[key]
+
+    def popitem(self):
+        t1_size = self._t1_size
+        if self._t1 and (not self._t2 or t1_size > self.p or (self._incoming is self._b2 and t1_size >= self.p)):
+            key = next(iter(self._t1))
+            size = self._sizes[key]
+            item = self._take(key)
+            self._b1[key] = size
+            self._b1_size += size
+        elif self._t2:
+            key = next(iter(self._t2))
+            size = self._sizes[key]
+            item = self._take(key)
+            self._b2[key] = size
+            self._b2_size += size
+        else:
+            raise KeyError(f"{type(self).__name__} is empty")
+        self._trim_ghosts()
+        return item
+
+    def _trim_ghosts(self):
+        # |t1| + |b1| <= c and |t1| + |t2| + |b1| + |b2| <= 2c, in size units
+        while self._b1 and self._t1_size + self._b1_size > self.maxsize:
+            self._b1_size -= self._b1.popitem(last=False)[1]
+        while self._b2 and self.currsize + self._b1_size + self._b2_size > 2 * self.maxsize:
+            self._b2_size -= self._b2.popitem(last=False)[1]
+
+    def clear(self):
+        _SizedCache.clear(self)
+        for part in (self._t1, self._t2, self._b1, self._b2):
+            part.clear()
+        self._t1_size = self._b1_size = self._b2_size = 0
+        self.p = 0
+
+POLICIES = {
+    'lru': LRUCache,
+    'lfu': LFUCache,
+    'ttl': TTLCache,
+    'tinylfu': WTinyLFUCache,
+    'arc': ARCCache,
+}
+
+def make_policy_cache(policy, maxsize, ttl:float=None, getsizeof=None) -> Cache:
+    """
+    Build an empty cache for a policy argument: a name from POLICIES, or a callable (e.g. a cachetools.Cache subclass)
+    taking (maxsize, getsizeof=...). 'lru' with a ttl is a TTLCache (LRU order plus expiry), and 'ttl' needs a ttl;
+    the other policies don't expire entries, so they can't be combined with one.
+    """
+    if policy is None:
+        policy = 'lru'
+    if not isinstance(policy, str):
+        if ttl:
+            raise ValueError("ttl can't be combined with a custom policy")
+        return policy(maxsize, getsizeof=getsizeof)
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown policy {policy!r}. Choose from {list(POLICIES)} or pass a cachetools.Cache subclass")
+    if policy in ('lru', 'ttl') and ttl:
+        return TTLCache(maxsize, ttl, timer=time.monotonic, getsizeof=getsizeof)
+    if policy == 'ttl':
+        raise ValueError("policy 'ttl' needs a ttl")
+    if policy in ('tinylfu', 'arc') and maxsize == math.inf:
+        raise ValueError(f"policy {policy!r} sizes its segments from maxsize, so it needs one (or max_bytes)")
+    if ttl:
+        raise ValueError(f"policy {policy!r} doesn't expire entries; use policy 'lru' or 'ttl' with a ttl")
+    return POLICIES[policy](maxsize, getsizeof=getsizeof)
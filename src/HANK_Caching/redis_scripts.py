@@ -0,0 +1,201 @@
+"""
+Server-side Lua scripts used by redis_lru_cache.
+Each script runs atomically on the Redis server in a single network round trip.
+"""
+import hashlib, time
+
+class RedisScript:
+    """
+    A Lua script that is called by its sha (EVALSHA) and falls back to EVAL when the server hasn't seen it yet.
+    Unlike redis-py's register_script, it isn't bound to a client, so one module-level instance works
+    with whichever client a wrapper currently holds.
+    """
+    def __init__(self, source:str):
+        self.source = source
+        self.sha = hashlib.sha1(source.encode('utf-8')).hexdigest()
+
+    def __call__(self, client, keys=(), args=()):
+        try:
+            return client.evalsha(self.sha, len(keys), *keys, *args)
+        except Exception as e:
+            from redis.exceptions import NoScriptError
+            if not isinstance(e, NoScriptError):
+                raise
+            return client.eval(self.source, len(keys), *keys, *args)
+
+    async def acall(self, client, keys=(), args=()):
+        """The same, for a redis.asyncio client."""
+        try:
+            return await client.evalsha(self.sha, len(keys), *keys, *args)
+        except Exception as e:
+            from redis.exceptions import NoScriptError
+            if not isinstance(e, NoScriptError):
+                raise
+            return await client.eval(self.source, len(keys), *keys, *args)
+
+    def queue(self, pipeline, keys=(), args=()):
+        """Queue the script on a pipeline (as EVAL, since a MULTI block can't recover from a missing sha)."""
+        return pipeline.eval(self.source, len(keys), *keys, *args)
+
+# Key layout for a cache with prefix P:
+#   P:<key>  the pickled values
+#   P:lru    ZSET of cache keys scored by last access (ms). The recency index; eviction takes the lowest scores.
+#   P:exp    ZSET of cache keys scored by expiry time (ms), only for entries stored with a ttl.
+#            Lets the scripts drop entries Redis has already expired so counts reflect live entries.
+#   P:keys   the FIFO list used by older versions. Folded into P:lru on the next store.
+#   P:<key>:chunks  HASH of chunks (fields 0..n-1) when P:<key> holds the manifest of a chunked value
+#            (serializers.OutOfBandSerializer). Always deleted together with P:<key>.
+#
+# The scripts assume every key of a cache is on the node they run on. STORE and CLEAR_CHUNK touch keys they don't
+# declare in KEYS: the :chunks hash of each key they delete, and the eviction victims / entries they read out of the
+# index. That holds on a single node and under sharding.ShardedRedis, which places a whole cache (every key under P)
+# on one node, but not on Redis Cluster, which routes each key by its own hash slot and rejects undeclared keys on
+# another slot. redis_lru_cache doesn't support Redis Cluster.
+#
+# Shared by all caches on a server (see tag_index):
+#   HANK_Caching:caches     HASH of cache prefix -> JSON {cache_id, function, tags}
+#   HANK_Caching:tag:<tag>  SET of the prefixes of caches with that tag
+
+# Drop up to 1000 entries whose ttl has passed from both indexes. Expects now and the index keys in scope.
+_PRUNE_EXPIRED = """
+local expired = redis.call('ZRANGEBYSCORE', exp, '-inf', now, 'LIMIT', 0, 1000)
+for i = 1, #expired do
+  redis.call('ZREM', lru, expired[i])
+  redis.call('ZREM', exp, expired[i])
+end
+"""
+
+# Store values, mark them most recently used and evict the least recently used entries past maxsize.
+# KEYS[1] = P:lru, KEYS[2] = P:exp, KEYS[3] = legacy P:keys list, KEYS[4..] = cache keys
+# Also deletes, undeclared: <cache key>:chunks for each key, and the evicted entries (and their :chunks).
+# ARGV[1] = ttl in ms (0 = no ttl), ARGV[2] = maxsize (0 = unlimited), ARGV[3] = now in ms, ARGV[4..] = payloads
+# Returns the number of evicted entries.
+STORE = RedisScript("""
+local lru, exp = KEYS[1], KEYS[2]
+local ttl, maxsize, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+if redis.call('EXISTS', KEYS[3]) == 1 then
+  local legacy = redis.call('LRANGE', KEYS[3], 0, -1)
+  for i = 1, #legacy do
+    redis.call('ZADD', lru, 'NX', 0, legacy[i])
+  end
+  redis.call('DEL', KEYS[3])
+end
+for i = 4, #KEYS do
+  local key = KEYS[i]
+  redis.call('DEL', key .. ':chunks')
+  if ttl > 0 then
+    redis.call('SET', key, ARGV[i], 'PX', ttl)
+    redis.call('ZADD', exp, now + ttl, key)
+  else
+    redis.call('SET', key, ARGV[i])
+    redis.call('ZREM', exp, key)
+  end
+  redis.call('ZADD', lru, now, key)
+end
+""" + _PRUNE_EXPIRED + """
+local evicted = 0
+if maxsize > 0 then
+  local excess = redis.call('ZCARD', lru) - maxsize
+  if excess > 0 then
+    local victims = redis.call('ZRANGE', lru, 0, excess - 1)
+    for i = 1, #victims do
+      redis.call('DEL', victims[i], victims[i] .. ':chunks')
+      redis.call('ZREM', exp, victims[i])
+    end
+    redis.call('ZREMRANGEBYRANK', lru, 0, excess - 1)
+    evicted = #victims
+  end
+end
+return evicted
+""")
+
+# Get a value and, if present, refresh its recency. One round trip for a hit that keeps LRU order exact.
+# KEYS[1] = cache key, KEYS[2] = P:lru; ARGV[1] = now in ms
+GET_AND_TOUCH = RedisScript("""
+local value = redis.call('GET', KEYS[1])
+if value then
+  redis.call('ZADD', KEYS[2], 'XX', ARGV[1], KEYS[1])
+end
+return value
+""")
+
+# Like GET_AND_TOUCH, but also returns the remaining ttl so callers can tell stale or nearly expired entries.
+# KEYS[1] = cache key, KEYS[2] = P:lru; ARGV[1] = now in ms, ARGV[2] = 1 to refresh recency, 0 not to
+# Returns {value, pttl in ms} (pttl is -1 without a ttl), or nil on a miss.
+GET_WITH_TTL = RedisScript("""
+local value = redis.call('GET', KEYS[1])
+if not value then
+  return nil
+end
+if ARGV[2] == '1' then
+  redis.call('ZADD', KEYS[2], 'XX', ARGV[1], KEYS[1])
+end
+return {value, redis.call('PTTL', KEYS[1])}
+""")
+
+# Number of distinct live entries: prune expired entries, then count the recency index.
+# KEYS[1] = P:lru, KEYS[2] = P:exp; ARGV[1] = now in ms
+COUNT = RedisScript("""
+local lru, exp, now = KEYS[1], KEYS[2], tonumber(ARGV[1])
+""" + _PRUNE_EXPIRED + """
+return redis.call('ZCARD', lru)
+""")
+
+# Move a cache's indexes aside under new names, so clearing can drain them in chunks while new stores start fresh ones.
+# KEYS[1..3] = P:lru, P:exp, P:keys; KEYS[4..6] = the names to move them to
+# Returns the number of entries moved out of the recency index.
+DETACH_INDEX = RedisScript("""
+local moved = redis.call('ZCARD', KEYS[1])
+for i = 1, 3 do
+  if redis.call('EXISTS', KEYS[i]) == 1 then
+    redis.call('RENAME', KEYS[i], KEYS[i + 3])
+  end
+end
+return moved
+""")
+
+# UNLINK (delete, freeing memory in the background) up to ARGV[1] entries of a detached index, and drop them from it.
+# KEYS[1] = a detached P:lru, KEYS[2] = a detached legacy P:keys list; ARGV[1] = chunk size
+# Unlinks, undeclared: the entries read from the index, and their :chunks.
+# Returns the number of entries removed; 0 once both are empty.
+CLEAR_CHUNK = RedisScript("""
+local n = tonumber(ARGV[1])
+local keys = redis.call('ZRANGE', KEYS[1], 0, n - 1)
+if #keys > 0 then
+  redis.call('ZREMRANGEBYRANK', KEYS[1], 0, #keys - 1)
+else
+  keys = redis.call('LRANGE', KEYS[2], 0, n - 1)
+  if #keys == 0 then
+    return 0
+  end
+  redis.call('LTRIM', KEYS[2], #keys, -1)
+end
+for i = 1, #keys do
+  redis.call('UNLINK', keys[i], keys[i] .. ':chunks')
+end
+return #keys
+""")
+
+# Release a single-flight lock only if we still own it.
+# KEYS[1] = lock key; ARGV[1] = owner token
+RELEASE_LOCK = RedisScript("""
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+""")
+
+def index_keys(cache_key_prefix:str):
+    """The (lru, exp, legacy list) index keys for a cache prefix."""
+    return f"{cache_key_prefix}:lru", f"{cache_key_prefix}:exp", f"{cache_key_prefix}:keys"
+
+def now_ms():
+    return int(time.time() * 1000)
+
+def ttl_ms(ttl):
+    """Convert a ttl given in seconds (int, float or timedelta) to whole milliseconds. None/0 -> 0 (no ttl)."""
+    if not ttl:
+        return 0
+    if hasattr(ttl, 'total_seconds'):
+        ttl = ttl.total_seconds()
+    return max(1, int(ttl * 1000))
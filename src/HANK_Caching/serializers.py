@@ -0,0 +1,187 @@
+"""
+Serializers (codecs) for the values redis_lru_cache stores in Redis.
+Every payload written by a headered serializer starts with one byte naming its format, so any reader can decode
+any format and a cache can hold a mix of them (e.g. while a codec change rolls out).
+Payloads without a header are plain pickles as written by older versions (and LegacyPickleSerializer);
+they start with pickle's PROTO opcode (0x80), which is never used as a header.
+"""
+import pickle, zlib, lzma
+
+PICKLE_PROTOCOL = min(5, pickle.HIGHEST_PROTOCOL)
+
+HEADER_PICKLE = b'P'  # pickle, uncompressed
+HEADER_ZLIB = b'Z'    # zlib-compressed pickle
+HEADER_LZMA = b'X'    # lzma-compressed pickle
+HEADER_MANIFEST = b'M'  # manifest of a chunked value; the chunks live in the {cache_key}:chunks hash
+LEGACY_PICKLE = 0x80  # first byte of a headerless pickle (protocol >= 2)
+
+_DECOMPRESS = {
+    HEADER_ZLIB[0]: zlib.decompress,
+    HEADER_LZMA[0]: lzma.decompress,
+}
+
+def loads(data):
+    """Decode a payload written by any serializer in this module (chunked values go through loads_chunked)."""
+    view = memoryview(data)
+    header = view[0]
+    if header == HEADER_MANIFEST[0]:
+        raise ValueError("Chunked cache payload: read its chunks and use loads_chunked")
+    if header == LEGACY_PICKLE:
+        return pickle.loads(data)
+    if header == HEADER_PICKLE[0]:
+        return pickle.loads(view[1:])
+    decompress = _DECOMPRESS.get(header)
+    if decompress is None:
+        raise ValueError(f"Unknown cache payload header: {bytes(view[:1])!r}")
+    return pickle.loads(decompress(view[1:]))
+
+class Serializer:
+    """
+    Base class for redis_lru_cache serializers. Subclasses implement dumps(); loads() reads every format.
+    Serializers with chunked = True implement dumps_parts() instead, and may store a value as a manifest plus chunks.
+    """
+    name = None
+    chunked = False
+
+    def dumps(self, value) -> bytes:
+        raise NotImplementedError
+
+    def loads(self, data):
+        return loads(data)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.name})"
+
+class LegacyPickleSerializer(Serializer):
+    """Headerless pickle at the default protocol, readable by older versions of this package. The default."""
+    name = "legacy"
+
+    def dumps(self, value) -> bytes:
+        return pickle.dumps(value)
+
+class PickleSerializer(Serializer):
+    """
+    Pickle (protocol 5 by default) behind a one-byte header, optionally compressed.
+    Args:
+      - protocol: int. The pickle protocol. Default: 5 (or the highest available)
+      - compression: str. None, 'zlib' or 'lzma'. Default: None
+      - threshold: int. Only compress pickles of at least this many bytes. Default: 1024
+      - level: int. Compression level (zlib 0-9, lzma preset 0-9). Default: the codec's default
+    Compressed output is kept only when it is actually smaller.
+    """
+    def __init__(self, protocol:int=PICKLE_PROTOCOL, compression:str=None, threshold:int=1024, level:int=None):
+        if compression not in (None, 'zlib', 'lzma'):
+            raise ValueError(f"Unknown compression {compression!r}. Use None, 'zlib' or 'lzma'")
+        self.protocol = protocol
+        self.compression = compression
+        self.threshold = threshold
+        self.level = level
+        self.name = compression or "pickle"
+
+    def compress(self, data):
+        if self.compression == 'zlib':
+            return HEADER_ZLIB + zlib.compress(data, -1 if self.level is None else self.level)
+        return HEADER_LZMA + lzma.compress(data, preset=self.level)
+
+    def dumps(self, value) -> bytes:
+        data = pickle.dumps(value, protocol=self.protocol)
+        if self.compression and len(data) >= self.threshold:
+            compressed = self.compress(data)
+            if len(compressed) < len(data) + 1:
+                return compressed
+        return HEADER_PICKLE + data
+
+def is_manifest(data) -> bool:
+    """Whether a stored payload is the manifest of a chunked value."""
+    return data[:1] == HEADER_MANIFEST
+
+def _manifest(head):
+    part_lengths, chunk_size = pickle.loads(memoryview(head)[1:])
+    return part_lengths, chunk_size, [-(-length // chunk_size) for length in part_lengths]
+
+def manifest_chunk_count(head) -> int:
+    """Number of chunks a manifest refers to."""
+    return sum(_manifest(head)[2])
+
+def loads_chunked(head, chunks):
+    """
+    Rebuild a value from its manifest and chunks (in order, as bytes-like objects).
+    A part that fits in one chunk is handed to pickle as a memoryview of that chunk, without copying.
+    A part split over several chunks is copied once into a preallocated buffer (never concatenated piecewise).
+    """
+    part_lengths, _, counts = _manifest(head)
+    parts, i = [], 0
+    for length, n in zip(part_lengths, counts):
+        if n <= 1:
+            parts.append(memoryview(chunks[i] if n else b''))
+        else:
+            buf, pos = bytearray(length), 0
+            for chunk in chunks[i:i + n]:
+                buf[pos:pos + len(chunk)] = chunk
+                pos += len(chunk)
+            parts.append(memoryview(buf))
+        i += n
+    return pickle.loads(parts[0], buffers=parts[1:])
+
+class OutOfBandSerializer(Serializer):
+    """
+    Pickle protocol 5 with out-of-band buffers, for large array-like or bytes-like results.
+    Buffer-backed objects that support it (bytearray, numpy arrays, pickle.PickleBuffer, ...) are not copied into the
+    pickle stream: the stream and each buffer become separate parts, and parts are split into chunks of at most
+    chunk_size bytes, stored next to a small manifest. This keeps every stored value well under Redis' 512MB limit,
+    and on a hit single-chunk parts are rebuilt straight from the received buffers (see loads_chunked).
+    Values whose parts add up to less than inline_threshold bytes are stored inline as a regular 'P' payload.
+    Args:
+      - chunk_size: int. Maximum bytes per chunk. Default: 16MB
+      - inline_threshold: int. Smaller values aren't chunked. Default: 1MB
+    """
+    name = "oob"
+    chunked = True
+
+    def __init__(self, chunk_size:int=16 * 1024 * 1024, inline_threshold:int=1024 * 1024):
+        self.chunk_size = chunk_size
+        self.inline_threshold = inline_threshold
+
+    def dumps_parts(self, value):
+        """Return (head, chunks). chunks is empty for inline values, else head is the manifest."""
+        buffers = []
+        def buffer_callback(buf):
+            try:
+                buffers.append(buf.raw())
+            except BufferError:
+                return True  # not contiguous, keep it in-band
+            return False
+        stream = pickle.dumps(value, protocol=5, buffer_callback=buffer_callback)
+        parts = [memoryview(stream)] + buffers
+        if sum(part.nbytes for part in parts) < self.inline_threshold:
+            if buffers:
+                stream = pickle.dumps(value, protocol=5)
+            return HEADER_PICKLE + stream, []
+        size = self.chunk_size
+        chunks = [part[i:i + size] for part in parts for i in range(0, part.nbytes, size)]
+        head = HEADER_MANIFEST + pickle.dumps(([part.nbytes for part in parts], size), protocol=PICKLE_PROTOCOL)
+        return head, chunks
+
+    def dumps(self, value) -> bytes:
+        head, chunks = self.dumps_parts(value)
+        if chunks:
+            raise ValueError("Value is too large to store inline; use dumps_parts")
+        return head
+
+SERIALIZERS = {
+    'legacy': LegacyPickleSerializer,
+    'pickle': PickleSerializer,
+    'zlib': lambda: PickleSerializer(compression='zlib'),
+    'lzma': lambda: PickleSerializer(compression='lzma'),
+    'oob': OutOfBandSerializer,
+}
+
+def get_serializer(serializer=None) -> Serializer:
+    """Resolve a serializer argument: None (legacy pickle), a name from SERIALIZERS, or a Serializer instance."""
+    if serializer is None:
+        serializer = 'legacy'
+    if isinstance(serializer, str):
+        if serializer not in SERIALIZERS:
+            raise ValueError(f"Unknown serializer {serializer!r}. Choose from {list(SERIALIZERS)} or pass a Serializer")
+        return SERIALIZERS[serializer]()
+    return serializer
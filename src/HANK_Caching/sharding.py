@@ -0,0 +1,207 @@
+"""
+Client-side sharding over several Redis nodes (RedisClientManager.get_redis_client(nodes=...)). Keys are placed with
+consistent hashing on a ring of virtual nodes, so adding or removing a node only moves about 1/N of them.
+redis_lru_cache routes by its cache_key_prefix: a cache's entries, recency index and locks all live on one node, so its
+Lua scripts and transactions stay atomic, while different caches spread over the nodes.
+"""
+from bisect import bisect
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import blake2b
+import asyncio, threading
+
+def ring_hash(key) -> int:
+    return int.from_bytes(blake2b(key if isinstance(key, bytes) else str(key).encode('utf-8'), digest_size=8).digest(), 'big')
+
+def routing_key(key):
+    """The part of key that picks its node: the contents of a {hash tag} if there is one (as in Redis Cluster), else key."""
+    if isinstance(key, bytes):
+        key = key.decode('utf-8', 'replace')
+    start = key.find('{')
+    if start >= 0:
+        end = key.find('}', start + 1)
+        if end > start + 1:
+            return key[start + 1:end]
+    return key
+
+class HashRing:
+    """
+    A consistent hash ring. Each node is placed at `vnodes` points (hashes of "{node}#{i}"); a key belongs to the
+    first point at or after its hash. Placement depends only on the node names, not on the order they're added in.
+    """
+    def __init__(self, nodes=(), vnodes:int=160):
+        self.vnodes = vnodes
+        self.nodes = []
+        self._points = []
+        self._owners = []
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node:str):
+        if node in self.nodes:
+            return
+        self.nodes.append(node)
+        self._rebuild()
+
+    def remove(self, node:str):
+        self.nodes.remove(node)
+        self._rebuild()
+
+    def _rebuild(self):
+        points = sorted((ring_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(self.vnodes))
+        self._points = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def node_for(self, key) -> str:
+        if not self._points:
+            raise LookupError("The hash ring has no nodes")
+        i = bisect(self._points, ring_hash(key))
+        return self._owners[i if i < len(self._owners) else 0]
+
+def parse_node(node) -> dict:
+    """'host:port[/db]' (or 'redis://host:port/db'), or a dict of redis.Redis arguments, as a dict with host, port, db."""
+    if isinstance(node, dict):
+        return {'host': 'localhost', 'port': 6379, 'db': 0, **node}
+    node = node.split('://', 1)[-1]
+    address, _, db = node.partition('/')
+    host, _, port = address.rpartition(':') if ':' in address else (address, '', '')
+    return {'host': host or 'localhost', 'port': int(port or 6379), 'db': int(db or 0)}
+
+def node_name(settings:dict) -> str:
+    return f"{settings['host']}:{settings['port']}/{settings['db']}"
+
+class ShardedRedis:
+    """
+    One redis.Redis client per node, behind a HashRing. shard_for(key) is the node client for a key (by routing_key);
+    the multi-key commands below split their keys by node and run one call per node, in parallel on a thread pool.
+    Pub/sub goes through the first node, so every process sees the same channels.
+    Args:
+      - nodes: list of 'host:port[/db]' strings or dicts of redis.Redis arguments
+      - vnodes: int. Virtual nodes per node. default 160
+      - kwargs: passed to every node's redis.Redis (e.g. password, socket_timeout)
+    """
+    def __init__(self, nodes, vnodes:int=160, **kwargs):
+        import redis
+        self.settings = [parse_node(node) for node in nodes]
+        if not self.settings:
+            raise ValueError("ShardedRedis needs at least one node")
+        self.kwargs = kwargs
+        self.ring = HashRing([node_name(s) for s in self.settings], vnodes=vnodes)
+        self.clients = {node_name(s): self._client(redis.Redis, s) for s in self.settings}
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def _client(self, client_class, settings):
+        return client_class(**{**self.kwargs, **settings})
+
+    def node_for(self, key) -> str:
+        return self.ring.node_for(routing_key(key))
+
+    def shard_for(self, key):
+        return self.clients[self.node_for(key)]
+
+    def _group(self, keys) -> dict:
+        # node -> indexes into keys
+        groups = {}
+        for i, key in enumerate(keys):
+            groups.setdefault(self.node_for(key), []).append(i)
+        return groups
+
+    def _fan_out(self, calls:dict, combine):
+        # calls: node -> fn(client); runs them (in parallel when there are several) and returns combine({node: result})
+        if len(calls) <= 1:
+            return combine({node: call(self.clients[node]) for node, call in calls.items()})
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=len(self.clients), thread_name_prefix='HANK_Caching-shards')
+        futures = {node: self._executor.submit(call, self.clients[node]) for node, call in calls.items()}
+        return combine({node: future.result() for node, future in futures.items()})
+
+    def map(self, fn) -> dict:
+        """{node: fn(client)} for every node, in parallel."""
+        return self._fan_out({node: fn for node in self.clients}, lambda results: results)
+
+    def ping(self) -> bool:
+        return self._fan_out({node: lambda client: client.ping() for node in self.clients}, lambda results: all(results.values()))
+
+    def get(self, key):
+        return self.shard_for(key).get(key)
+
+    def set(self, key, value, **kwargs):
+        return self.shard_for(key).set(key, value, **kwargs)
+
+    def mget(self, keys) -> list:
+        keys = list(keys)
+        groups = self._group(keys)
+        def combine(results):
+            values = [None] * len(keys)
+            for node, indexes in groups.items():
+                for i, value in zip(indexes, results[node]):
+                    values[i] = value
+            return values
+        return self._fan_out({node: lambda client, ks=[keys[i] for i in indexes]: client.mget(ks)
+                              for node, indexes in groups.items()}, combine)
+
+    def mset(self, mapping:dict) -> bool:
+        groups = self._group(list(mapping))
+        keys = list(mapping)
+        return self._fan_out({node: lambda client, items={keys[i]: mapping[keys[i]] for i in indexes}: client.mset(items)
+                              for node, indexes in groups.items()}, lambda results: all(results.values()))
+
+    def _count(self, command, keys) -> int:
+        keys = list(keys)
+        return self._fan_out({node: lambda client, ks=[keys[i] for i in indexes]: getattr(client, command)(*ks)
+                              for node, indexes in self._group(keys).items()}, lambda results: sum(results.values()))
+
+    def delete(self, *keys) -> int:
+        return self._count('delete', keys)
+
+    def unlink(self, *keys) -> int:
+        return self._count('unlink', keys)
+
+    def exists(self, *keys) -> int:
+        return self._count('exists', keys)
+
+    def scan_iter(self, match=None, count=None):
+        for client in self.clients.values():
+            yield from client.scan_iter(match=match, count=count)
+
+    def dbsize(self) -> int:
+        return self._fan_out({node: lambda client: client.dbsize() for node in self.clients}, lambda results: sum(results.values()))
+
+    def pubsub(self, **kwargs):
+        return next(iter(self.clients.values())).pubsub(**kwargs)
+
+    def publish(self, channel, message):
+        return next(iter(self.clients.values())).publish(channel, message)
+
+    def as_async(self, **kwargs) -> 'AsyncShardedRedis':
+        """The same ring over redis.asyncio clients (kwargs override the node clients' settings)."""
+        return AsyncShardedRedis(self, **kwargs)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        for client in self.clients.values():
+            client.close()
+
+class AsyncShardedRedis(ShardedRedis):
+    """ShardedRedis over redis.asyncio clients: shard_for routes the same way, and the multi-key commands are awaitable."""
+    def __init__(self, sharded:ShardedRedis, **kwargs):
+        import redis.asyncio
+        self.settings = sharded.settings
+        self.kwargs = {**sharded.kwargs, **kwargs}
+        self.ring = sharded.ring
+        self.clients = {node_name(s): self._client(redis.asyncio.Redis, s) for s in self.settings}
+
+    async def _fan_out(self, calls:dict, combine):
+        results = await asyncio.gather(*(call(self.clients[node]) for node, call in calls.items()))
+        return combine(dict(zip(calls, results)))
+
+    async def scan_iter(self, match=None, count=None):
+        for client in self.clients.values():
+            async for key in client.scan_iter(match=match, count=count):
+                yield key
+
+    async def close(self):
+        for client in self.clients.values():
+            await client.aclose()
@@ -0,0 +1,257 @@
+"""
+A host-local cache shared by every process on the machine (shared_lru_cache's backend): a fixed-size hash table in a
+memory-mapped file under /dev/shm, which any process attaches to by name. One copy of each value serves all workers.
+Reads take no lock (each slot carries a sequence number, seqlock style); writes take one of a few striped locks
+(fcntl record locks on the file, plus a thread lock). POSIX only.
+"""
+from hashlib import blake2b
+import mmap, os, struct, tempfile, threading, time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+MAGIC = b'HANKSHM1'
+HEADER = struct.Struct('<8sIII')  # magic, slots, slot size, ways
+HEADER_SIZE = 64
+SLOT = struct.Struct('<16sIIdd')  # key digest, sequence (odd while being written), value length, expires, last access
+SEQ = struct.Struct('<I')
+SEQ_OFFSET = 16
+ACCESSED = struct.Struct('<d')
+ACCESSED_OFFSET = 32
+EMPTY = bytes(16)
+READ_RETRIES = 10
+
+def default_directory():
+    return '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+def key_digest(key) -> bytes:
+    return blake2b(key if isinstance(key, bytes) else str(key).encode('utf-8'), digest_size=16).digest()
+
+class SharedMemoryCache:
+    """
+    A set-associative table of fixed-size slots in a shared memory-mapped file. A key's digest picks a set of `ways`
+    slots; storing into a full set evicts its least recently used (or an expired) entry, so eviction is approximate LRU
+    and never scans the table. Values (bytes) longer than slot_size minus a 40-byte slot header aren't stored.
+    Every process that opens the same name (in the same directory) shares the table; the first one creates it. Opening
+    an existing table with a different geometry raises ValueError (unlink() it first).
+    Args:
+      - name: str. The table's name; its file is {directory}/HANK_Caching-{name}
+      - slots: int. Number of slots (entries), rounded up to a multiple of ways. default 1024
+      - slot_size: int. Bytes per slot, header included. default 4096
+      - ways: int. Slots per set. default 8
+      - stripes: int. Write locks; sets share them round robin. default 64
+      - directory: str. default /dev/shm (the temp directory where there's no /dev/shm)
+    """
+    def __init__(self, name:str, slots:int=1024, slot_size:int=4096, ways:int=8, stripes:int=64, directory:str=None):
+        if fcntl is None:
+            raise RuntimeError("SharedMemoryCache needs fcntl (POSIX)")
+        if slot_size <= SLOT.size:
+            raise ValueError(f"slot_size must be larger than the {SLOT.size}-byte slot header")
+        self.name = name
+        self.ways = ways
+        self.sets = -(-slots // ways)
+        self.slots = self.sets * ways
+        self.slot_size = slot_size
+        self.max_value = slot_size - SLOT.size
+        self.stripes = min(stripes, self.sets)
+        self.path = os.path.join(directory or default_directory(), f"HANK_Caching-{name}")
+        self.too_large = 0
+        self._thread_locks = [threading.Lock() for _ in range(self.stripes)]
+        self._open()
+
+    def _open(self):
+        size = HEADER_SIZE + self.slots * self.slot_size
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.lockf(fd, fcntl.LOCK_EX, 1, 0)  # byte 0 guards initialization
+            try:
+                if os.fstat(fd).st_size == 0:
+                    os.ftruncate(fd, size)
+                    os.pwrite(fd, HEADER.pack(MAGIC, self.slots, self.slot_size, self.ways), 0)
+                magic, slots, slot_size, ways = HEADER.unpack(os.pread(fd, HEADER.size, 0))
+                if (magic, slots, slot_size, ways) != (MAGIC, self.slots, self.slot_size, self.ways):
+                    raise ValueError(f"Shared cache {self.name!r} exists with slots={slots}, slot_size={slot_size}, ways={ways}; "
+                                     f"unlink it to change its geometry")
+            finally:
+                fcntl.lockf(fd, fcntl.LOCK_UN, 1, 0)
+            self._mm = mmap.mmap(fd, size)
+        except BaseException:
+            os.close(fd)
+            raise
+        self._fd = fd
+
+    def close(self):
+        self._mm.close()
+        os.close(self._fd)
+
+    def unlink(self):
+        """Delete the table's file. Processes still attached keep their mapping until they close it."""
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def _locate(self, digest):
+        set_index = int.from_bytes(digest[:8], 'little') % self.sets
+        return HEADER_SIZE + set_index * self.ways * self.slot_size, set_index % self.stripes
+
+    def _lock(self, stripe):
+        return _StripeLock(self, stripe)
+
+    def get(self, key):
+        """The stored bytes for key, or None if missing or expired. Takes no lock."""
+        digest = key_digest(key)
+        base, _ = self._locate(digest)
+        mm, slot_size = self._mm, self.slot_size
+        for offset in range(base, base + self.ways * slot_size, slot_size):
+            if mm[offset:offset + 16] != digest:
+                continue
+            for _ in range(READ_RETRIES):
+                found, seq, length, expires, _ = SLOT.unpack_from(mm, offset)
+                if seq & 1:
+                    continue  # being written
+                data = mm[offset + SLOT.size:offset + SLOT.size + length]
+                if SEQ.unpack_from(mm, offset + SEQ_OFFSET)[0] != seq:
+                    continue  # changed while we read it
+                if found != digest:
+                    return None
+                now = time.time()
+                if expires and expires <= now:
+                    return None
+                ACCESSED.pack_into(mm, offset + ACCESSED_OFFSET, now)  # unlocked; a lost update only blurs recency
+                return data
+            return None
+        return None
+
+    def get_many(self, keys) -> dict:
+        found = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                found[key] = value
+        return found
+
+    def contains_many(self, keys) -> list:
+        now, mm = time.time(), self._mm
+        present = []
+        for key in keys:
+            digest = key_digest(key)
+            base, _ = self._locate(digest)
+            present.append(any(
+                mm[offset:offset + 16] == digest and not 0 < SLOT.unpack_from(mm, offset)[3] <= now
+                for offset in range(base, base + self.ways * self.slot_size, self.slot_size)))
+        return present
+
+    def set(self, key, value:bytes, ttl:float=None) -> bool:
+        """Store value for key, evicting from its set if needed. False if the value doesn't fit in a slot."""
+        if len(value) > self.max_value:
+            self.too_large += 1
+            return False
+        digest = key_digest(key)
+        base, stripe = self._locate(digest)
+        mm, slot_size = self._mm, self.slot_size
+        now = time.time()
+        with self._lock(stripe):
+            target, oldest = None, None
+            for offset in range(base, base + self.ways * slot_size, slot_size):
+                found, seq, _, expires, accessed = SLOT.unpack_from(mm, offset)
+                if found == digest:
+                    target = offset
+                    break
+                if found == EMPTY or (expires and expires <= now):
+                    accessed = -1.0
+                if oldest is None or accessed < oldest[0]:
+                    oldest = (accessed, offset)
+            if target is None:
+                target = oldest[1]
+            seq = self._begin_write(target)
+            mm[target + SLOT.size:target + SLOT.size + len(value)] = value
+            SLOT.pack_into(mm, target, digest, seq, len(value), now + ttl if ttl else 0.0, now)
+            self._end_write(target, seq)
+        return True
+
+    def set_many(self, items, ttl:float=None, maxsize:int=None):
+        # maxsize is fixed by the table's geometry; accepted for the interface shared with disk.DiskCache
+        for key, value in items:
+            self.set(key, value, ttl)
+
+    def delete_many(self, keys):
+        mm, slot_size = self._mm, self.slot_size
+        for key in keys:
+            digest = key_digest(key)
+            base, stripe = self._locate(digest)
+            with self._lock(stripe):
+                for offset in range(base, base + self.ways * slot_size, slot_size):
+                    if mm[offset:offset + 16] == digest:
+                        self._erase(offset)
+
+    def _begin_write(self, offset) -> int:
+        # mark the slot as being written (odd sequence number); readers retry until _end_write makes it even again
+        seq = ((SEQ.unpack_from(self._mm, offset + SEQ_OFFSET)[0] + 1) | 1) & 0xFFFFFFFF
+        SEQ.pack_into(self._mm, offset + SEQ_OFFSET, seq)
+        return seq
+
+    def _end_write(self, offset, seq):
+        SEQ.pack_into(self._mm, offset + SEQ_OFFSET, (seq + 1) & 0xFFFFFFFF)
+
+    def _erase(self, offset):
+        seq = self._begin_write(offset)
+        SLOT.pack_into(self._mm, offset, EMPTY, seq, 0, 0.0, 0.0)
+        self._end_write(offset, seq)
+
+    def clear(self):
+        mm, slot_size, set_size = self._mm, self.slot_size, self.ways * self.slot_size
+        for set_index in range(self.sets):
+            base = HEADER_SIZE + set_index * set_size
+            with self._lock(set_index % self.stripes):
+                for offset in range(base, base + set_size, slot_size):
+                    if mm[offset:offset + 16] != EMPTY:
+                        self._erase(offset)
+
+    def count(self) -> int:
+        """Number of unexpired entries."""
+        now, mm, n = time.time(), self._mm, 0
+        for offset in range(HEADER_SIZE, HEADER_SIZE + self.slots * self.slot_size, self.slot_size):
+            found, _, _, expires, _ = SLOT.unpack_from(mm, offset)
+            if found != EMPTY and not 0 < expires <= now:
+                n += 1
+        return n
+
+class _StripeLock:
+    # A thread lock (fcntl locks are per process) plus an fcntl lock on byte 1 + stripe of the table's file
+    __slots__ = ('cache', 'stripe')
+
+    def __init__(self, cache, stripe):
+        self.cache = cache
+        self.stripe = stripe
+
+    def __enter__(self):
+        self.cache._thread_locks[self.stripe].acquire()
+        try:
+            fcntl.lockf(self.cache._fd, fcntl.LOCK_EX, 1, 1 + self.stripe)
+        except BaseException:
+            self.cache._thread_locks[self.stripe].release()
+            raise
+
+    def __exit__(self, *exc):
+        try:
+            fcntl.lockf(self.cache._fd, fcntl.LOCK_UN, 1, 1 + self.stripe)
+        finally:
+            self.cache._thread_locks[self.stripe].release()
+
+_tables = {}
+_tables_lock = threading.Lock()
+
+def get_shared_cache(name:str, **kwargs) -> SharedMemoryCache:
+    """
+    The process's SharedMemoryCache for name, attaching to (or creating) the table on first use. The mapping stays
+    valid in forked children (fcntl locks are taken per process, so they work there too).
+    """
+    key = (name, kwargs.get('directory'))
+    with _tables_lock:
+        table = _tables.get(key)
+        if table is None:
+            table = _tables[key] = SharedMemoryCache(name, **kwargs)
+        return table
@@ -0,0 +1,199 @@
+"""
+Hit/miss counters and per-phase latency histograms for cached methods (the decorators' stats option).
+Recording is lock-free: counts can be slightly off under heavy thread contention, which is fine for monitoring.
+"""
+from functools import wraps
+import time
+
+PHASES = ('key_build', 'lookup', 'deserialize', 'compute', 'store')
+N_BUCKETS = 32  # bucket i holds durations in [2**(i-1), 2**i) microseconds; the last one is open-ended
+
+class LatencyHistogram:
+    """Log2-bucketed latency histogram (microsecond resolution) with count, total, min and max."""
+    __slots__ = ('buckets', 'count', 'total', 'min', 'max')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.buckets = [0] * N_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def record(self, seconds:float):
+        self.buckets[min(int(seconds * 1e6).bit_length(), N_BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, p:float):
+        """Upper bound (seconds) of the bucket holding the p-th percentile (0-100), or None if empty."""
+        return _percentile(self.buckets, self.count, p)
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'total': self.total,
+            'mean': self.total / self.count if self.count else None,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p99': self.percentile(99),
+            'buckets': list(self.buckets),
+        }
+
+def _percentile(buckets, count, p):
+    if not count:
+        return None
+    rank, seen = p / 100 * count, 0
+    for i, n in enumerate(buckets):
+        seen += n
+        if seen >= rank and n:
+            return (1 << i) / 1e6
+    return None
+
+class CacheStats:
+    """
+    Counters and per-phase latency histograms for one cached method (or several, if shared).
+    Counters: hits (from any tier), l1_hits (the part of hits served by redis_lru_cache's L1), misses, and rejected:
+    computed results the admission policy kept out of the cache, by reason (see admission.AdmissionPolicy).
+    Phases:
+      - key_build: building the cache key from the arguments
+      - lookup: reading the cache, one sample per tier read (for Redis, the round trip plus deserialize)
+      - deserialize: decoding a value read from Redis
+      - compute: running the wrapped function
+      - store: writing a computed value to the cache (for write-behind, just queueing it)
+    Sinks registered with add_sink (on this object, or appended to CacheStats.sinks for every CacheStats) are called
+    for every recorded duration as sink(name, phase, seconds) and every count as sink(name, event, n), event being
+    'hits', 'l1_hits' (an L1 hit, also a hit), 'misses' or 'rejected:<reason>'; use them to forward to statsd,
+    Prometheus and the like.
+    """
+    sinks = []  # process-wide sinks; add_sink on an instance adds per-instance ones
+
+    def __init__(self, name:str=None):
+        self.name = name
+        self.histograms = {phase: LatencyHistogram() for phase in PHASES}
+        self.reset()
+
+    def reset(self):
+        self.hits = 0
+        self.l1_hits = 0
+        self.misses = 0
+        self.rejected = {}
+        for histogram in self.histograms.values():
+            histogram.reset()
+
+    def add_sink(self, sink):
+        if 'sinks' not in self.__dict__:
+            self.sinks = list(CacheStats.sinks)
+        self.sinks.append(sink)
+
+    def hit(self, n:int=1, l1:bool=False):
+        self.hits += n
+        if l1:
+            self.l1_hits += n
+        for sink in self.sinks:
+            sink(self.name, 'l1_hits' if l1 else 'hits', n)
+
+    def miss(self, n:int=1):
+        self.misses += n
+        for sink in self.sinks:
+            sink(self.name, 'misses', n)
+
+    def reject(self, reason:str, n:int=1):
+        self.rejected[reason] = self.rejected.get(reason, 0) + n
+        for sink in self.sinks:
+            sink(self.name, f"rejected:{reason}", n)
+
+    def record(self, phase:str, seconds:float):
+        self.histograms[phase].record(seconds)
+        for sink in self.sinks:
+            sink(self.name, phase, seconds)
+
+    def timed(self, phase:str, fn):
+        """fn, recording the duration of every call under phase."""
+        histogram, perf_counter = self.histograms[phase], time.perf_counter
+        @wraps(fn)
+        def timed_fn(*args, **kwargs):
+            st = perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                seconds = perf_counter() - st
+                histogram.record(seconds)
+                for sink in self.sinks:
+                    sink(self.name, phase, seconds)
+        return timed_fn
+
+    def atimed(self, phase:str, fn):
+        """timed() for a coroutine function."""
+        histogram, perf_counter = self.histograms[phase], time.perf_counter
+        @wraps(fn)
+        async def timed_fn(*args, **kwargs):
+            st = perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                seconds = perf_counter() - st
+                histogram.record(seconds)
+                for sink in self.sinks:
+                    sink(self.name, phase, seconds)
+        return timed_fn
+
+    def snapshot(self):
+        """A JSON-serializable dict of the counters, hit rate, estimated time saved and per-phase histograms."""
+        lookups = self.hits + self.misses
+        compute = self.histograms['compute']
+        return {
+            'name': self.name,
+            'hits': self.hits,
+            'l1_hits': self.l1_hits,
+            'misses': self.misses,
+            'rejected': dict(self.rejected),
+            'hit_rate': self.hits / lookups if lookups else None,
+            # each hit saved a compute of average duration, minus what the hit itself cost
+            'time_saved': self.hits * compute.total / compute.count - self.histograms['lookup'].total * self.hits / lookups
+                if compute.count and lookups else None,
+            'phases': {phase: histogram.snapshot() for phase, histogram in self.histograms.items()},
+        }
+
+def merge_snapshots(snapshots, name:str=None):
+    """Combine CacheStats snapshots (e.g. every cached method with a tag) into one."""
+    snapshots = [snapshot for snapshot in snapshots if snapshot]
+    merged = {'name': name, 'hits': 0, 'l1_hits': 0, 'misses': 0, 'rejected': {}, 'time_saved': None, 'phases': {}}
+    for snapshot in snapshots:
+        for counter in ('hits', 'l1_hits', 'misses'):
+            merged[counter] += snapshot[counter]
+        for reason, n in snapshot.get('rejected', {}).items():
+            merged['rejected'][reason] = merged['rejected'].get(reason, 0) + n
+        if snapshot['time_saved'] is not None:
+            merged['time_saved'] = (merged['time_saved'] or 0) + snapshot['time_saved']
+    lookups = merged['hits'] + merged['misses']
+    merged['hit_rate'] = merged['hits'] / lookups if lookups else None
+    for phase in PHASES:
+        parts = [snapshot['phases'][phase] for snapshot in snapshots if snapshot['phases'][phase]['count']]
+        count = sum(part['count'] for part in parts)
+        total = sum(part['total'] for part in parts)
+        buckets = [sum(column) for column in zip(*(part['buckets'] for part in parts))] or [0] * N_BUCKETS
+        merged['phases'][phase] = {
+            'count': count,
+            'total': total,
+            'mean': total / count if count else None,
+            'min': min((part['min'] for part in parts), default=None),
+            'max': max((part['max'] for part in parts), default=None),
+            'p50': _percentile(buckets, count, 50),
+            'p99': _percentile(buckets, count, 99),
+            'buckets': buckets,
+        }
+    return merged
+
+def get_stats(stats, name:str=None):
+    """Resolve a decorator's stats argument: None/False (off), True (a new CacheStats) or a CacheStats to share."""
+    if stats is True:
+        return CacheStats(name)
+    return stats or None
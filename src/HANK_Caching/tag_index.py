@@ -0,0 +1,94 @@
+"""
+A registry of redis_lru_cache caches kept in Redis itself, so any process can find and clear caches by tag, not only
+the wrappers that live in it. Each cache registers its prefix, cache_id and tags with its first store; clearing
+detaches the cache's index and drains it in chunks with UNLINK, so even a huge cache never holds the server for long.
+With a sharded client every node keeps the registry of the caches it holds, and the nodes are cleared in parallel.
+"""
+from HANK_Caching import redis_scripts
+import json, logging, uuid
+
+CACHES_KEY = "HANK_Caching:caches"
+TAG_KEY = "HANK_Caching:tag:{}"
+CHUNK_SIZE = 1000
+
+def tag_key(tag) -> str:
+    return TAG_KEY.format(tag)
+
+def queue_register(pipe, cache_key_prefix:str, tags=(), cache_id:str=None, function:str=None):
+    """Queue the commands registering a cache on a pipeline (idempotent)."""
+    pipe.hset(CACHES_KEY, cache_key_prefix, json.dumps({'cache_id': cache_id, 'function': function, 'tags': sorted(tags)}))
+    for tag in tags:
+        pipe.sadd(tag_key(tag), cache_key_prefix)
+
+def clear_prefix(redis_client, cache_key_prefix:str, chunk_size:int=CHUNK_SIZE) -> int:
+    """
+    Delete every entry of the cache with this prefix. The index is first renamed aside in one atomic step, then
+    drained chunk_size entries per round trip; stores made meanwhile go to a fresh index and are kept.
+    Returns the number of entries deleted.
+    """
+    index = redis_scripts.index_keys(cache_key_prefix)
+    token = uuid.uuid4().hex
+    detached = tuple(f"{key}:clearing:{token}" for key in index)
+    redis_scripts.DETACH_INDEX(redis_client, keys=(*index, *detached))
+    deleted = 0
+    try:
+        while True:
+            n = redis_scripts.CLEAR_CHUNK(redis_client, keys=(detached[0], detached[2]), args=(chunk_size,))
+            if not n:
+                break
+            deleted += n
+    finally:
+        redis_client.unlink(*detached)
+    return deleted
+
+def prefixes_for_tags(redis_client, tags) -> set:
+    """Prefixes of the caches registered with any of tags (on this node)."""
+    members = redis_client.sunion([tag_key(tag) for tag in tags]) if tags else set()
+    return {m.decode('utf-8') if isinstance(m, bytes) else m for m in members}
+
+def on_each_node(redis_client, fn) -> list:
+    # fn(node client) on every node of a sharded client (in parallel), or on the single client
+    if hasattr(redis_client, 'map'):
+        return list(redis_client.map(fn).values())
+    return [fn(redis_client)]
+
+def registered_caches(name:str="default") -> dict:
+    """{prefix: {'cache_id', 'function', 'tags'}} for every cache registered on the client's server(s)."""
+    from HANK_Caching.utils import RedisClientManager
+    redis_client = RedisClientManager.get_redis_client(name=name)
+    if redis_client is None:
+        return {}
+    caches = {}
+    for found in on_each_node(redis_client, lambda client: client.hgetall(CACHES_KEY)):
+        for prefix, info in found.items():
+            caches[prefix.decode('utf-8') if isinstance(prefix, bytes) else prefix] = json.loads(info)
+    return caches
+
+def invalidate_tags(tags, name:str="default", chunk_size:int=CHUNK_SIZE, broadcast:bool=True) -> int:
+    """
+    Clear, in Redis, every cache registered with any of tags, whichever process or class created it.
+    With broadcast, the L1 tiers of methods with those tags are cleared too, in every process, through the client's
+    invalidation bus (if this process has one, see RedisClientManager.get_invalidation_bus).
+    Returns the number of entries deleted, or 0 if Redis isn't available.
+    Args:
+      - tags: iterable of tags
+      - name: str. The RedisClientManager client to use. default "default"
+      - chunk_size: int. Entries deleted per round trip. default 1000
+      - broadcast: bool. default True
+    """
+    from HANK_Caching.utils import RedisClientManager
+    tags = list(tags)
+    redis_client = RedisClientManager.get_redis_client(name=name)
+    if redis_client is None or not tags:
+        return 0
+    def clear_node(client):
+        deleted = 0
+        for prefix in sorted(prefixes_for_tags(client, tags)):
+            deleted += clear_prefix(client, prefix, chunk_size)
+        return deleted
+    deleted = sum(on_each_node(redis_client, clear_node))
+    bus = RedisClientManager.invalidation_buses.get(name)
+    if broadcast and bus is not None:
+        bus.invalidate_tags(tags)
+    logging.info(f"Invalidated tags {tags}: {deleted} entries deleted")
+    return deleted
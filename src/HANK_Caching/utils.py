@@ -1,18 +1,27 @@
 from collections.abc import Mapping, Iterable
 from cachetools.keys import hashkey
+from functools import lru_cache
+from types import MethodType
 
-import inspect, pickle, logging, time
+import inspect, pickle, logging
 
 SENTINEL = object()
 class RedisClientManager:
     clients = {}
-    redis_is_available = True
-    last_retry_time = 0
-    RETRY_INTERVAL_SEC = 300  # 5 minutes
+    async_clients = {}
+    invalidation_buses = {}
+    breakers = {}
+    # Per-operation time budget: no command (or connection attempt) waits on Redis longer than this,
+    # unless socket_timeout / socket_connect_timeout are passed when creating the client
+    SOCKET_TIMEOUT_SEC = 1.0
+    CONNECT_TIMEOUT_SEC = 0.5
+    # Circuit breaker settings for clients' breakers (see get_breaker)
+    BREAKER_FAILURE_THRESHOLD = 5
+    BREAKER_RESET_TIMEOUT_SEC = 5.0
 
     @staticmethod
     def get_redis_client(name="default", host=SENTINEL, port=SENTINEL, db=SENTINEL, raise_on_error=False, 
-                         check_connection=True, **kwargs):
+                         check_connection=True, nodes=None, shard_key=None, **kwargs):
         """
         Create a Redis client instance. 
         If host, port, or db are not provided, use environment variables. 
@@ -24,20 +33,32 @@ class RedisClientManager:
           - port: int. The Redis port. Default: 6379
           - db: int. The Redis database. Default: 0
           - raise_on_error: bool. Whether to raise an error if the client cannot connect.
-          - check_connection: bool. Whether to ping Redis before returning the client.
+          - check_connection: bool. Whether to ping Redis before returning a new client. A failed ping counts against
+            the name's circuit breaker (see get_breaker); while it is open, no new client is created for that name and
+            None is returned right away. Other names, and clients that already exist, are unaffected.
+          - nodes: list of 'host:port[/db]' (or dicts of redis.Redis arguments). Creates a sharding.ShardedRedis over
+            these nodes instead of a single-node client (vnodes=... sets its virtual nodes per node). If host isn't
+            given, the comma-separated REDIS_NODES environment variable is used the same way.
+          - shard_key: str. For a sharded client, return the node client that owns this key (redis_lru_cache passes
+            its cache_key_prefix) instead of the ShardedRedis.
+          - kwargs: passed to redis.Redis. socket_timeout and socket_connect_timeout default to SOCKET_TIMEOUT_SEC and
+            CONNECT_TIMEOUT_SEC, so a stalled Redis can't hold a caller for longer than that per operation.
         """
 
-        # If we have previously marked Redis unavailable:
-        if not RedisClientManager.redis_is_available:
-            now = time.time()
-            # Check if it's time to attempt reconnect
-            if now - RedisClientManager.last_retry_time < RedisClientManager.RETRY_INTERVAL_SEC:
-                # Not time yet; skip trying again and just return None
-                logging.info("Redis is not available, skipping retry until interval has passed...")
-                return None
-            else:
-                # Enough time has passed, let's attempt a reconnect below.
-                logging.info("Retrying Redis connection...")
+        # If we have a client already, just return it (settings are only used when creating one); whether to use it
+        # right now is up to the name's circuit breaker
+        client = RedisClientManager.clients.get(name)
+        if client is not None:
+            return RedisClientManager.route(client, shard_key)
+
+        # Pings for this name have been failing: don't try again until the breaker lets a probe through
+        breaker = RedisClientManager.get_breaker(name)
+        if check_connection and not breaker.allow():
+            logging.info(f"Redis is not available for {name!r}, skipping the connection attempt")
+            if raise_on_error:
+                import redis
+                raise redis.exceptions.ConnectionError(f"Redis circuit {name!r} is open (last error: {breaker.last_error})")
+            return None
 
         import os
         try:
@@ -49,6 +70,8 @@ class RedisClientManager:
             else:
                 return None
 
+        if nodes is None and host is SENTINEL and os.getenv('REDIS_NODES'):
+            nodes = [node.strip() for node in os.getenv('REDIS_NODES').split(',') if node.strip()]
         if host is SENTINEL:
             host = os.getenv('REDIS_HOST', 'localhost')
         if port is SENTINEL:
@@ -58,41 +81,125 @@ class RedisClientManager:
         # Honor REDIS_PASSWORD env var when caller didn't pass one explicitly.
         # Managed Redis (Railway, Upstash, etc.) requires AUTH; without this,
         # the ping below fails with "Authentication required" and the client
-        # gets marked unavailable for RETRY_INTERVAL_SEC.
+        # counts against the circuit breaker for this name.
         password = kwargs.pop('password', None)
         if password is None:
             password = os.getenv('REDIS_PASSWORD')
 
-        # If we have a client already and haven't changed any settings, just return it
-        if name in RedisClientManager.clients and RedisClientManager.redis_is_available:
-            return RedisClientManager.clients[name]
-
         # Otherwise, we create (or recreate) a client and optionally ping it
-        r = redis.Redis(host=host, port=port, db=db, password=password, **kwargs)
+        kwargs.setdefault('socket_timeout', RedisClientManager.SOCKET_TIMEOUT_SEC)
+        kwargs.setdefault('socket_connect_timeout', RedisClientManager.CONNECT_TIMEOUT_SEC)
+        if nodes:
+            from HANK_Caching.sharding import ShardedRedis
+            r = ShardedRedis(nodes, password=password, **kwargs)
+        else:
+            r = redis.Redis(host=host, port=port, db=db, password=password, **kwargs)
         if check_connection:
             try:
-                # Attempt a quick connection check
-                redis.Redis(
-                    host=host,
-                    port=port,
-                    db=db,
-                    password=password,
-                    socket_connect_timeout=1
-                ).ping()
-                # If we succeed, mark available
-                RedisClientManager.redis_is_available = True
+                # Attempt a quick connection check, on the client's own pool so the connection is reused
+                r.ping()
+                breaker.success()
             except (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError) as e:
                 logging.error(f"Error connecting to Redis: {e}")
-                RedisClientManager.redis_is_available = False
-                # update last_retry_time to now
-                RedisClientManager.last_retry_time = time.time()
+                r.close()
+                breaker.failure(e)
                 if raise_on_error:
                     raise e
                 else:
                     return None
 
         RedisClientManager.clients[name] = r
-        return r
+        return RedisClientManager.route(r, shard_key)
+
+    @staticmethod
+    def route(client, shard_key=None):
+        # A sharded client's node client for shard_key; any other client as is
+        if shard_key is None or not hasattr(client, 'shard_for'):
+            return client
+        return client.shard_for(shard_key)
+
+    @staticmethod
+    def get_async_redis_client(name="default", host=SENTINEL, port=SENTINEL, db=SENTINEL, raise_on_error=False,
+                               check_connection=True, shard_key=None, **kwargs):
+        """
+        Get (or create) a redis.asyncio client, for the async paths of the cache decorators.
+        Settings and availability handling are the same as get_redis_client, whose (synchronous, one-off) connection
+        check this reuses, so it's safe to call from a coroutine. One client is kept per name and per event loop,
+        since a redis.asyncio connection pool can't be shared between loops.
+        Returns None if Redis is not available.
+        """
+        import asyncio
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        client = RedisClientManager.async_clients.get((name, loop))
+        if client is not None:
+            return RedisClientManager.route(client, shard_key)
+        if RedisClientManager.get_redis_client(name=name, host=host, port=port, db=db, raise_on_error=raise_on_error,
+                                               check_connection=check_connection, **kwargs) is None:
+            return None
+        import redis.asyncio
+        kwargs.pop('password', None)  # resolved (with REDIS_PASSWORD) in the sync client's settings
+        sync_client = RedisClientManager.clients[name]
+        if hasattr(sync_client, 'as_async'):
+            client = sync_client.as_async(**kwargs)
+        else:
+            settings = sync_client.connection_pool.connection_kwargs
+            for option in ('socket_timeout', 'socket_connect_timeout'):
+                kwargs.setdefault(option, settings.get(option))
+            client = redis.asyncio.Redis(host=settings.get('host', 'localhost'), port=settings.get('port', 6379),
+                                         db=settings.get('db', 0), password=settings.get('password'), **kwargs)
+        # drop clients of loops that have been closed
+        for key in [key for key in RedisClientManager.async_clients if key[1] is not None and key[1].is_closed()]:
+            del RedisClientManager.async_clients[key]
+        RedisClientManager.async_clients[(name, loop)] = client
+        return RedisClientManager.route(client, shard_key)
+
+    @staticmethod
+    def get_breaker(name="default"):
+        """
+        The breaker.CircuitBreaker for the client name, shared by every cache using that client (and by its sync and
+        async clients). It opens after BREAKER_FAILURE_THRESHOLD consecutive connection errors or timeouts, and probes
+        again after BREAKER_RESET_TIMEOUT_SEC.
+        """
+        breaker = RedisClientManager.breakers.get(name)
+        if breaker is None:
+            from HANK_Caching.breaker import CircuitBreaker
+            breaker = RedisClientManager.breakers.setdefault(name, CircuitBreaker(
+                name, failure_threshold=RedisClientManager.BREAKER_FAILURE_THRESHOLD,
+                reset_timeout=RedisClientManager.BREAKER_RESET_TIMEOUT_SEC))
+        return breaker
+
+    @staticmethod
+    def breaker_stats():
+        """Snapshots of every client's circuit breaker: state, successes, failures, rejected calls, times opened."""
+        return {name: breaker.snapshot() for name, breaker in RedisClientManager.breakers.items()}
+
+    @staticmethod
+    def get_invalidation_bus(name="default", channel:str=None, batch_interval:float=0.05, **kwargs):
+        """
+        Get (or create) the InvalidationBus that broadcasts L1 cache invalidations between processes.
+        One bus is kept per name and per process; a forked child gets its own bus on first use.
+        Returns None if Redis is not available.
+
+        Args:
+          - name: str. The bus name. It is also the name of the Redis client the bus uses (see get_redis_client).
+          - channel: str. The pub/sub channel. Default: InvalidationBus.CHANNEL
+          - batch_interval: float. Seconds to collect invalidations before publishing them together.
+          - kwargs: passed to get_redis_client when the client has to be created.
+        """
+        from HANK_Caching.invalidation import InvalidationBus
+        import os
+        bus = RedisClientManager.invalidation_buses.get(name)
+        if bus is not None and bus.pid == os.getpid():
+            return bus
+        redis_client = RedisClientManager.get_redis_client(name=name, **kwargs)
+        if redis_client is None:
+            return None
+        bus = InvalidationBus(redis_client, channel=channel or InvalidationBus.CHANNEL, batch_interval=batch_interval)
+        RedisClientManager.invalidation_buses[name] = bus
+        return bus
 
 def make_hashable(o):
     """ Use a non-recursive approach for common types for efficiency. """
@@ -143,9 +250,180 @@ def make_hashable_key(func, args, kwargs, prefix:str=None, arg_transforms=None,
     pf = f"{prefix}" if prefix else ""
     sid = f"{self_id}" if use_id else ""
     return hashkey(f"{sid}{pf}{args}")
-    
+
+def compile_key_builder(func, prefix:str=None, arg_transforms=None, use_id=True):
+    """
+    Compile a key function for func once, at decoration time.
+    Returns key(args, kwargs) which produces exactly the same keys as make_hashable_key(func, args, kwargs, ...)
+    but without binding the signature on every call. Parameter positions, defaults, excluded names (self, kwargs)
+    and the arg_transforms to apply are all worked out here.
+    Calls that don't fit the precomputed layout (too many positionals, missing or unexpected arguments,
+    positional-only or *args parameters) fall back to make_hashable_key so errors and keys stay identical.
+    Key functions are stateless, so they're memoized: decorating the same method of many instances compiles it once.
+    """
+    transforms = tuple((arg_transforms or {}).items())
+    bound = inspect.ismethod(func)
+    try:
+        return _memoized_key_builder(func.__func__ if bound else func, bound, prefix, transforms, use_id)
+    except TypeError:  # an unhashable transform
+        return _compile_key_builder(func, prefix, transforms, use_id)
+
+@lru_cache(maxsize=4096)
+def _memoized_key_builder(function, bound, prefix, transforms, use_id):
+    # a bound method's signature (without its first parameter), from a stand-in bound to a placeholder
+    return _compile_key_builder(MethodType(function, SENTINEL) if bound else function, prefix, transforms, use_id)
+
+def _compile_key_builder(func, prefix, transforms, use_id):
+    pf = f"{prefix}" if prefix else ""
+
+    def slow_key(args, kwargs):
+        return make_hashable_key(func, args, kwargs, prefix=prefix, arg_transforms=dict(transforms), use_id=use_id)
+
+    try:
+        params = list(inspect.signature(func).parameters.values())
+    except (TypeError, ValueError):
+        return slow_key
+    if any(p.kind in (p.POSITIONAL_ONLY, p.VAR_POSITIONAL) for p in params):
+        return slow_key
+
+    empty = inspect.Parameter.empty
+    #(name, default, included) in signature order; positional-or-keyword parameters come first
+    layout = tuple((p.name, p.default, p.name not in ("self", "kwargs"))
+                   for p in params if p.kind in (p.POSITIONAL_OR_KEYWORD, p.KEYWORD_ONLY))
+    n_positional = sum(1 for p in params if p.kind is p.POSITIONAL_OR_KEYWORD)
+    named = frozenset(name for name, _, _ in layout)
+    var_kw = next((p.name for p in params if p.kind is p.VAR_KEYWORD), None)
+    include_var_kw = var_kw is not None and var_kw not in ("self", "kwargs")
+
+    def key(args, kwargs):
+        nargs = len(args)
+        if nargs > n_positional:
+            return slow_key(args, kwargs)
+        arguments = {}
+        for i, (name, default, included) in enumerate(layout):
+            if i < nargs:
+                if name in kwargs:
+                    return slow_key(args, kwargs)
+                value = args[i]
+            elif name in kwargs:
+                value = kwargs[name]
+            elif default is empty:
+                return slow_key(args, kwargs)
+            else:
+                value = default
+            if included:
+                arguments[name] = value
+        if var_kw is None:
+            if kwargs and not named.issuperset(kwargs):
+                return slow_key(args, kwargs)
+        elif include_var_kw:
+            arguments[var_kw] = {k: v for k, v in kwargs.items() if k not in named}
+        arguments.update(kwargs)
+        for arg, transform in transforms:
+            if arg in arguments:
+                arguments[arg] = transform(arguments[arg])
+        sid = (f"{id(args[0])}" if args else "0") if use_id else ""
+        return hashkey(f"{sid}{pf}{arguments}")
+
+    key.slow_key = slow_key
+    return key
+
+def split_call(call):
+    """(args, kwargs) for one argument set of the bulk cache methods: a tuple of positional arguments or a dict of keyword arguments."""
+    if isinstance(call, Mapping):
+        return (), dict(call)
+    if isinstance(call, tuple):
+        return call, {}
+    raise TypeError(f"Expected a tuple of positional arguments or a dict of keyword arguments, got {type(call).__name__}")
+
+class BatchArgument:
+    """
+    The list argument of a batch function (one result per element, in order), located once at decoration time.
+    Used by the decorators' batch_arg mode to cache each element separately.
+    """
+    def __init__(self, func, name:str):
+        params = list(inspect.signature(func).parameters.values())
+        names = [p.name for p in params]
+        if name not in names:
+            raise ValueError(f"batch_arg {name!r} is not a parameter of {func.__qualname__}")
+        param = params[names.index(name)]
+        self.name = name
+        #keyword-only parameters can only be passed by name
+        self.index = names.index(name) if param.kind in (param.POSITIONAL_ONLY, param.POSITIONAL_OR_KEYWORD) else None
+
+    def get(self, args, kwargs):
+        """The batch passed in this call."""
+        if self.name in kwargs:
+            return kwargs[self.name]
+        if self.index is None or self.index >= len(args):
+            raise TypeError(f"missing batch argument {self.name!r}")
+        return args[self.index]
+
+    def replace(self, args, kwargs, value):
+        """(args, kwargs) with the batch argument replaced by value."""
+        if self.name in kwargs or self.index is None or self.index >= len(args):
+            return args, {**kwargs, self.name: value}
+        return args[:self.index] + (value,) + args[self.index + 1:], kwargs
+
+    def compute(self, func, args, kwargs, items):
+        """Call func with only items as the batch (keeping a tuple a tuple) and check it returned one result per item."""
+        args, kwargs = self._with_items(args, kwargs, items)
+        return self._check(func, func(*args, **kwargs), items)
+
+    async def acompute(self, func, args, kwargs, items):
+        """compute() for a coroutine function."""
+        args, kwargs = self._with_items(args, kwargs, items)
+        return self._check(func, await func(*args, **kwargs), items)
+
+    def compute_calls(self, func, calls, group_key):
+        """
+        Results for (args, kwargs) calls that each pass a single element as the batch argument (as the bulk cache methods
+        do). Calls whose other arguments have the same group_key(args, kwargs) are computed with one batch call.
+        """
+        results = [None] * len(calls)
+        for args, kwargs, indexes in self._groups(calls, group_key):
+            for i, result in zip(indexes, self.compute(func, args, kwargs, [self.get(*calls[i]) for i in indexes])):
+                results[i] = result
+        return results
+
+    async def acompute_calls(self, func, calls, group_key):
+        """compute_calls() for a coroutine function; the groups are computed concurrently."""
+        import asyncio
+        groups = self._groups(calls, group_key)
+        computed = await asyncio.gather(*(self.acompute(func, args, kwargs, [self.get(*calls[i]) for i in indexes])
+                                          for args, kwargs, indexes in groups))
+        results = [None] * len(calls)
+        for (_, _, indexes), group_results in zip(groups, computed):
+            for i, result in zip(indexes, group_results):
+                results[i] = result
+        return results
+
+    def _groups(self, calls, group_key):
+        groups = {}
+        for i, (args, kwargs) in enumerate(calls):
+            group = groups.setdefault(group_key(*self.replace(args, kwargs, None)), (args, kwargs, []))
+            group[2].append(i)
+        return list(groups.values())
+
+    def _with_items(self, args, kwargs, items):
+        return self.replace(args, kwargs, tuple(items) if isinstance(self.get(args, kwargs), tuple) else list(items))
+
+    @staticmethod
+    def _check(func, results, items):
+        results = list(results)
+        if len(results) != len(items):
+            raise ValueError(f"{func.__qualname__} returned {len(results)} results for a batch of {len(items)}")
+        return results
+
 def get_function_identity(func):
     """Get a unique identifier for the function including filename, class, and function name."""
+    try:
+        return _function_identity(getattr(func, '__func__', func))  # a bound method has its function's identity
+    except TypeError:  # unhashable callable
+        return _function_identity.__wrapped__(func)
+
+@lru_cache(maxsize=4096)
+def _function_identity(func):
     func_file = inspect.getfile(func)
     if hasattr(func, '__qualname__'):
         qualname = func.__qualname__
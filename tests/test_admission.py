@@ -0,0 +1,94 @@
+from HANK_Caching.admission import AdmissionPolicy
+from HANK_Caching.base import CachingBase
+from HANK_Caching.decorators import conditional_lru_cache, redis_lru_cache
+from HANK_Caching.utils import RedisClientManager
+import time
+import unittest
+
+class Reports(CachingBase):
+    func_cache_map = {
+        'report': {'decorator': conditional_lru_cache, 'stats': True,
+                   'admission': {'min_compute': 0.005, 'predicate': lambda rows: len(rows) > 0}},
+    }
+
+    def __init__(self):
+        self.calls = 0
+        super().__init__()
+
+    def report(self, delay, rows=1):
+        self.calls += 1
+        time.sleep(delay)
+        return ['row'] * rows
+
+class TestAdmission(unittest.TestCase):
+    def test_policy(self):
+        policy = AdmissionPolicy(min_compute=0.01, max_size=100, predicate=lambda value: value is not None)
+        self.assertFalse(policy.admit('a', 1, seconds=0.001))
+        self.assertFalse(policy.admit('b', 1, seconds=0.1, size=1000))
+        self.assertFalse(policy.admit('c', None, seconds=0.1))
+        self.assertTrue(policy.admit('d', 1, seconds=0.1, size=10))
+        self.assertTrue(policy.admit('e', 1))  # no compute time (set_many): only size and predicate apply
+        snapshot = policy.snapshot()
+        self.assertEqual((snapshot['admitted'], snapshot['rejected']), (2, 3))
+        self.assertEqual(snapshot['rejected_by_reason'], {'cheap': 1, 'too_large': 1, 'predicate': 1})
+        self.assertEqual([r['key'] for r in snapshot['recent_rejections']], ['a', 'b', 'c'])
+
+    def test_per_key_history(self):
+        policy = AdmissionPolicy(min_compute=0.008, per_key_alpha=0.5)
+        self.assertFalse(policy.admit('a', 1, seconds=0.002))
+        self.assertTrue(policy.admit('a', 1, seconds=0.03))  # average 0.016
+        self.assertTrue(policy.admit('a', 1, seconds=0.002))  # one fast run doesn't evict its history: 0.009 next
+        self.assertFalse(policy.admit('a', 1, seconds=0.002))
+        self.assertAlmostEqual(policy.cost('a'), 0.0055)
+
+    def test_adaptive_threshold(self):
+        policy = AdmissionPolicy(adaptive=0.5, window=100)
+        for i in range(100):
+            policy.admit(f"warm{i}", 1, seconds=i / 1000)
+        self.assertTrue(0.045 <= policy.threshold <= 0.05)  # the median of the recent costs
+        self.assertFalse(policy.admit('cheap', 1, seconds=0.01))
+        self.assertTrue(policy.admit('dear', 1, seconds=0.09))
+
+    def test_conditional_lru_cache(self):
+        reports = Reports()
+        for _ in range(2):
+            reports.report(0)          # too cheap
+            reports.report(0.01)       # cached
+            reports.report(0.01, rows=0)  # empty
+        self.assertEqual(reports.calls, 5)
+        self.assertEqual(reports.report.cache_info(), 1)
+        self.assertEqual(reports.report.admission_stats()['rejected_by_reason'], {'cheap': 2, 'too_large': 0, 'predicate': 2})
+        self.assertEqual(reports.cache_stats()['total']['rejected'], {'cheap': 2, 'predicate': 2})
+
+    def test_size_limit(self):
+        cached = conditional_lru_cache(admission={'max_size': 1000})(lambda n: 'x' * n)
+        cached(10)
+        cached(10000)
+        self.assertEqual(cached.cache_info(), 1)
+        self.assertEqual(cached.set_many([((20000,), 'x' * 20000), ((5,), 'xxxxx')]), 2)
+        self.assertEqual(cached.contains_many([(20000,), (5,)]), [False, True])
+
+    @unittest.skipIf(RedisClientManager.get_redis_client(name="default") is None, "Redis is not available")
+    def test_redis_lru_cache(self):
+        calls = []
+        def load(n, delay=0):
+            calls.append(n)
+            time.sleep(delay)
+            return b'x' * n
+        cached = redis_lru_cache(cache_id='test_admission', stats=True, l1_maxsize=10,
+                                 admission={'min_compute': 0.005, 'max_size': 1000})(load)
+        self.addCleanup(cached.cache_clear)
+        for _ in range(2):
+            cached(1)                 # too cheap
+            cached(10, 0.01)          # cached
+            cached(5000, 0.01)        # payload too large for Redis
+        self.assertEqual(cached.contains_many([(1,), (10, 0.01), (5000, 0.01)]), [False, True, True])  # 5000 in L1 only
+        cached.l1_cache.clear()
+        self.assertEqual(cached.contains_many([(10, 0.01), (5000, 0.01)]), [True, False])
+        snapshot = cached.admission_stats()
+        self.assertEqual(snapshot['rejected_by_reason'], {'cheap': 2, 'too_large': 1, 'predicate': 0})
+        self.assertEqual(snapshot['admitted'], 1)
+        self.assertEqual(cached.cache_stats()['rejected'], {'cheap': 2, 'too_large': 1})
+
+if __name__ == '__main__':
+    unittest.main()
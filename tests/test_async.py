@@ -0,0 +1,81 @@
+from HANK_Caching.base import CachingBase
+from HANK_Caching.decorators import conditional_lru_cache, redis_lru_cache
+from HANK_Caching.utils import RedisClientManager
+import asyncio
+import unittest
+
+class AsyncService(CachingBase):
+    def __init__(self, decorator, **kwargs):
+        self.calls = 0
+        self.func_cache_map = {'lookup': {'decorator': decorator, 'tags': ['async'], **kwargs}}
+        super().__init__()
+
+    async def lookup(self, code):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return {'code': code}
+
+class TestAsyncCaching(unittest.TestCase):
+    def check_service(self, service):
+        async def scenario():
+            results = await asyncio.gather(*(service.lookup(1) for _ in range(10)))
+            self.assertEqual(results, [{'code': 1}] * 10)
+            self.assertEqual(service.calls, 1)  # concurrent awaits shared one computation
+            self.assertEqual(await service.lookup(1), {'code': 1})
+            self.assertEqual(service.calls, 1)
+            service.clear_caches(tags=['async'])
+            await service.lookup(1)
+            self.assertEqual(service.calls, 2)
+            service.disable_caching()
+            await service.lookup(1)
+            self.assertEqual(service.calls, 3)
+            service.enable_caching()
+            await service.lookup(1)
+            self.assertEqual(service.calls, 3)
+        asyncio.run(scenario())
+
+    def test_memory(self):
+        self.check_service(AsyncService(conditional_lru_cache))
+
+    def test_memory_batch_and_prefetch(self):
+        calls = []
+        @conditional_lru_cache(batch_arg='codes')
+        async def lookup(codes):
+            calls.append(list(codes))
+            return [code * 2 for code in codes]
+        async def scenario():
+            self.assertEqual(await lookup([1, 2]), [2, 4])
+            self.assertEqual(await lookup([2, 3]), [4, 6])
+            self.assertEqual(calls, [[1, 2], [3]])
+        asyncio.run(scenario())
+
+    @unittest.skipIf(RedisClientManager.get_redis_client(name="default") is None, "Redis is not available")
+    def test_redis(self):
+        service = AsyncService(redis_lru_cache, cache_id='test_async', ttl=60, l1_maxsize=10)
+        service.clear_caches()
+        self.addCleanup(service.clear_caches)
+        self.check_service(service)
+        async def from_redis():
+            service.lookup.l1_cache.clear()
+            self.assertEqual(await service.lookup(1), {'code': 1})
+        asyncio.run(from_redis())
+        self.assertEqual(service.calls, 3)
+
+    @unittest.skipIf(RedisClientManager.get_redis_client(name="default") is None, "Redis is not available")
+    def test_redis_prefetch_and_batch(self):
+        calls = []
+        @redis_lru_cache(cache_id='test_async_batch', batch_arg='codes')
+        async def lookup(codes):
+            calls.append(list(codes))
+            return [code * 2 for code in codes]
+        lookup.cache_clear()
+        self.addCleanup(lookup.cache_clear)
+        async def scenario():
+            self.assertEqual(await lookup.prefetch([(1,), (2,)]), 2)  # one element in place of the list
+            self.assertEqual(await lookup([1, 2, 3]), [2, 4, 6])
+        asyncio.run(scenario())
+        self.assertEqual(calls, [[1, 2], [3]])
+        self.assertEqual(lookup.contains_many([(3,), (4,)]), [True, False])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+from HANK_Caching.decorators import conditional_lru_cache, redis_lru_cache
+from HANK_Caching.utils import RedisClientManager
+import unittest
+
+class TestBatchCaching(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+
+    def lookup(self, codes, scale=1):
+        self.calls.append(list(codes))
+        return [code * scale for code in codes]
+
+    def check_batches(self, cached):
+        self.assertEqual(cached([1, 2, 3]), [1, 2, 3])
+        self.assertEqual(cached([3, 4, 1, 4]), [3, 4, 1, 4])
+        self.assertEqual(self.calls, [[1, 2, 3], [4]])
+        self.assertEqual(cached(codes=[2, 4]), [2, 4])
+        self.assertEqual(cached([2], scale=10), [20])  # other arguments are part of each element's key
+        self.assertEqual(self.calls, [[1, 2, 3], [4], [2]])
+
+    def test_memory(self):
+        self.check_batches(conditional_lru_cache(batch_arg='codes', thread_safe=True)(self.lookup))
+
+    def test_memory_arg_transforms_apply_per_element(self):
+        cached = conditional_lru_cache(batch_arg='codes', arg_transforms={'codes': abs})(self.lookup)
+        self.assertEqual(cached([-1, 2]), [-1, 2])
+        self.assertEqual(cached([1, -2, 3]), [-1, 2, 3])
+        self.assertEqual(self.calls, [[-1, 2], [3]])
+
+    def test_wrong_result_length(self):
+        cached = conditional_lru_cache(batch_arg='codes')(lambda codes: codes[:1])
+        with self.assertRaises(ValueError):
+            cached([1, 2])
+
+    def test_invalid_configuration(self):
+        with self.assertRaises(ValueError):
+            conditional_lru_cache(batch_arg='nope')(self.lookup)
+        with self.assertRaises(ValueError):
+            conditional_lru_cache(batch_arg='codes', single_flight=True)
+
+    @unittest.skipIf(RedisClientManager.get_redis_client(name="default") is None, "Redis is not available")
+    def test_redis(self):
+        cached = redis_lru_cache(cache_id='test_batch', batch_arg='codes', ttl=60)(self.lookup)
+        cached.cache_clear()
+        self.addCleanup(cached.cache_clear)
+        self.check_batches(cached)
+        self.assertEqual(cached.cache_info(), 5)
+
+    @unittest.skipIf(RedisClientManager.get_redis_client(name="default") is None, "Redis is not available")
+    def test_redis_with_l1_and_chunked_values(self):
+        cached = redis_lru_cache(cache_id='test_batch_l1', batch_arg='codes', l1_maxsize=10,
+                                 serializer='oob')(lambda codes: [bytearray(code) for code in codes])
+        cached.cache_clear()
+        self.addCleanup(cached.cache_clear)
+        big = 2 * 1024 * 1024
+        self.assertEqual([len(v) for v in cached([big, 1])], [big, 1])
+        cached.l1_cache.clear()
+        self.assertEqual([len(v) for v in cached([1, big])], [1, big])
+        self.assertEqual(len(cached.l1_cache), 2)
+
+if __name__ == '__main__':
+    unittest.main()
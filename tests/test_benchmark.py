@@ -0,0 +1,32 @@
+from HANK_Caching import benchmark
+import json, os, tempfile
+import unittest
+
+class TestBenchmark(unittest.TestCase):
+    def test_run_and_json(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'results.json')
+            self.assertEqual(benchmark.main(['--quick', '--redis', 'none', '--only', 'key_build,memory_per_entry', '--json', path]), 0)
+            with open(path) as f:
+                report = json.load(f)
+            self.assertEqual(report['meta']['redis'], 'none')
+            self.assertEqual(set(report['results']), {'key_build', 'memory_per_entry'})
+            for metrics in report['results'].values():
+                for result in metrics.values():
+                    self.assertGreater(result['value'], 0)
+                    self.assertIn(result['better'], ('lower', 'higher'))
+            # compared with itself nothing regresses
+            self.assertEqual(benchmark.main(['--quick', '--redis', 'none', '--only', 'memory_per_entry', '--compare', path, '--threshold', '10']), 0)
+
+    def test_compare(self):
+        def report(latency, throughput):
+            return {'results': {'b': {'latency': {'value': latency, 'unit': 'us', 'better': 'lower'},
+                                      'throughput': {'value': throughput, 'unit': 'ops/s', 'better': 'higher'}}}}
+        rows = benchmark.compare(report(3.0, 500), report(2.0, 1000), threshold=1.25)
+        self.assertEqual([(metric, ratio, regressed) for _, metric, _, _, ratio, regressed in rows],
+                         [('latency', 1.5, True), ('throughput', 2.0, True)])
+        self.assertFalse(any(row[-1] for row in benchmark.compare(report(2.2, 900), report(2.0, 1000))))
+        self.assertEqual(benchmark.compare(report(1.0, 1), {'results': {}}), [])
+
+if __name__ == '__main__':
+    unittest.main()
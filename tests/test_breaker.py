@@ -0,0 +1,196 @@
+from HANK_Caching.breaker import CircuitBreaker
+from HANK_Caching.concurrency import RedisSingleFlight
+from HANK_Caching.decorators import redis_lru_cache
+from HANK_Caching.utils import RedisClientManager
+import os, redis, socket, threading, time
+import unittest
+
+class FaultyRedis:
+    """
+    A TCP stand-in for Redis that injects faults: 'refuse' drops every connection, 'blackhole' accepts and never
+    replies (a stalled server), 'proxy' forwards to the real Redis at REDIS_PORT. Changing the mode drops open connections.
+    """
+    def __init__(self, mode):
+        self.mode = mode
+        self.conns = []
+        self.server = socket.create_server(('127.0.0.1', 0))
+        self.port = self.server.getsockname()[1]
+        threading.Thread(target=self.accept, daemon=True).start()
+
+    def accept(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            if self.mode == 'refuse':
+                conn.close()
+                continue
+            self.conns.append(conn)
+            if self.mode == 'proxy':
+                upstream = socket.create_connection(('localhost', int(os.getenv('REDIS_PORT', 6379))))
+                self.conns.append(upstream)
+                threading.Thread(target=self.pipe, args=(conn, upstream), daemon=True).start()
+                threading.Thread(target=self.pipe, args=(upstream, conn), daemon=True).start()
+
+    def pipe(self, source, target):
+        try:
+            while data := source.recv(65536):
+                target.sendall(data)
+        except OSError:
+            pass
+
+    def set_mode(self, mode):
+        self.mode = mode
+        for conn in self.conns:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            conn.close()
+        self.conns = []
+
+    def close(self):
+        self.set_mode('refuse')
+        self.server.close()
+
+def redis_available():
+    return RedisClientManager.get_redis_client(name="default") is not None
+
+class TestCircuitBreaker(unittest.TestCase):
+    def test_transitions(self):
+        transitions = []
+        breaker = CircuitBreaker('test', failure_threshold=2, reset_timeout=0.1)
+        breaker.add_listener(lambda name, old, new: transitions.append((old, new)))
+        breaker.failure(ConnectionError())
+        self.assertTrue(breaker.allow())
+        breaker.failure(ConnectionError())
+        self.assertFalse(breaker.allow())
+        self.assertTrue(breaker.is_open())
+        time.sleep(0.15)
+        self.assertTrue(breaker.allow())  # the probe
+        self.assertFalse(breaker.allow())  # only one at a time
+        breaker.failure(ConnectionError())  # failed probe: open again
+        self.assertFalse(breaker.allow())
+        time.sleep(0.15)
+        self.assertTrue(breaker.allow())
+        breaker.success()
+        self.assertEqual(breaker.state, 'closed')
+        self.assertEqual(transitions, [('closed', 'open'), ('open', 'half_open'), ('half_open', 'open'),
+                                       ('open', 'half_open'), ('half_open', 'closed')])
+        snapshot = breaker.snapshot()
+        self.assertEqual((snapshot['opened'], snapshot['rejected'], snapshot['failures']), (2, 3, 3))
+
+    def test_guard(self):
+        breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=60)
+        def down():
+            raise TimeoutError("stalled")
+        guarded = breaker.guard(down, fallback='fallback', errors=(TimeoutError,))
+        self.assertEqual(guarded(), 'fallback')
+        self.assertEqual(breaker.state, 'open')
+        self.assertEqual(breaker.guard(lambda: 'called')(), None)  # rejected without calling
+        with self.assertRaises(ValueError):
+            CircuitBreaker('test').guard(lambda: int('x'), errors=(TimeoutError,))()
+        self.assertIs(guarded.__wrapped__, down)
+        self.assertEqual(guarded.__name__, 'down')
+
+class TestCachedWithFaults(unittest.TestCase):
+    def setUp(self):
+        self.calls = 0
+
+    def func(self, a):
+        self.calls += 1
+        return a * 2
+
+    def cached(self, server, name, **kwargs):
+        # the client is registered under the cache's cache_id, so the decorator picks it up (and its breaker)
+        RedisClientManager.clients[name] = redis.Redis(host='127.0.0.1', port=server.port, socket_timeout=0.2,
+                                                       socket_connect_timeout=0.2, retry=None)
+        self.addCleanup(RedisClientManager.clients.pop, name, None)
+        self.addCleanup(RedisClientManager.breakers.pop, name, None)
+        cached = redis_lru_cache(cache_id=name, **kwargs)(self.func)
+        cached.circuit_breaker.failure_threshold = 2
+        return cached
+
+    def test_stalled_redis_fails_fast(self):
+        server = FaultyRedis('blackhole')
+        self.addCleanup(server.close)
+        cached = self.cached(server, 'test_breaker_stalled')
+        st = time.perf_counter()
+        self.assertEqual(cached(1), 2)  # a timed out read, then a timed out store: the circuit opens
+        self.assertLess(time.perf_counter() - st, 2)
+        self.assertEqual(cached.circuit_breaker.state, 'open')
+        st = time.perf_counter()
+        self.assertEqual([cached(i) for i in range(100)], [i * 2 for i in range(100)])
+        self.assertLess(time.perf_counter() - st, 0.1)  # no socket waits while open
+        snapshot = RedisClientManager.breaker_stats()['test_breaker_stalled']
+        self.assertEqual((snapshot['opened'], snapshot['failures']), (1, 2))
+        self.assertGreaterEqual(snapshot['rejected'], 200)
+        self.assertIn('Timeout', snapshot['last_error'])
+
+    def test_maintenance_fails_fast(self):
+        server = FaultyRedis('blackhole')
+        self.addCleanup(server.close)
+        cached = self.cached(server, 'test_breaker_maintenance', l1_maxsize=10)
+        cached(1)  # the read and the store time out: the circuit opens
+        self.assertEqual(cached.circuit_breaker.state, 'open')
+        st = time.perf_counter()
+        for i in range(50):
+            cached.cache_invalidate(1)
+            cached.cache_clear()
+            self.assertIsNone(cached.cache_info())
+        self.assertLess(time.perf_counter() - st, 0.1)
+        cached(1)
+        self.assertEqual(self.calls, 2)  # the local tier was still cleared
+
+    def test_l1_keeps_serving(self):
+        server = FaultyRedis('refuse')
+        self.addCleanup(server.close)
+        cached = self.cached(server, 'test_breaker_l1', l1_maxsize=10)
+        self.assertEqual([cached(1) for _ in range(5)], [2] * 5)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(cached.get_many([(1,), (2,)]), ([((1,), 2)], [(2,)]))
+        self.assertEqual(cached.contains_many([(1,), (2,)]), [True, False])
+
+    def test_single_flight_lock_errors(self):
+        class StalledLock:
+            def set(self, *args, **kwargs):
+                raise redis.exceptions.TimeoutError("Timeout reading from socket")
+        breaker, calls = CircuitBreaker('test', failure_threshold=1), []
+        compute = lambda: calls.append(1) or 'computed'
+        with self.assertLogs(level='WARNING'):
+            value = RedisSingleFlight().do(StalledLock(), 'k', lambda: None, compute, on_error=breaker.failure)
+        self.assertEqual((value, calls, breaker.state), ('computed', [1], 'open'))  # computed once, without the lock
+
+    @unittest.skipIf(not redis_available(), "Redis is not available")
+    def test_function_redis_errors_arent_breaker_failures(self):
+        # the function's own Redis errors (it talks to some other Redis) are its result, not a cache failure
+        def query(a):
+            self.calls += 1
+            raise redis.exceptions.ConnectionError("the application's Redis is down")
+        cached = redis_lru_cache(cache_id='test_breaker_function_errors', single_flight=True)(query)
+        self.addCleanup(cached.cache_clear)
+        with self.assertRaises(redis.exceptions.ConnectionError):
+            cached(1)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual((cached.circuit_breaker.state, cached.circuit_breaker.consecutive_failures), ('closed', 0))
+
+    @unittest.skipIf(not redis_available(), "Redis is not available")
+    def test_recovery(self):
+        server = FaultyRedis('refuse')
+        self.addCleanup(server.close)
+        cached = self.cached(server, 'test_breaker_recovery', single_flight="local")
+        cached(1)
+        self.assertEqual(cached.circuit_breaker.state, 'open')
+        server.set_mode('proxy')
+        cached.circuit_breaker.reset_timeout = 0.1
+        time.sleep(0.15)
+        cached(1)  # the probe read succeeds (a miss) and closes the circuit; the store goes through
+        self.addCleanup(cached.cache_clear)
+        self.assertEqual(cached.circuit_breaker.state, 'closed')
+        self.assertEqual(cached.cache_info(), 1)
+        cached(1)
+        self.assertEqual(self.calls, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+from HANK_Caching.decorators import conditional_lru_cache, redis_lru_cache
+from HANK_Caching.utils import RedisClientManager
+import unittest
+
+class TestBulkMethods(unittest.TestCase):
+    def setUp(self):
+        self.calls = 0
+
+    def func(self, a, b=0):
+        self.calls += 1
+        return a + b
+
+    def check_bulk(self, cached):
+        cached(1)
+        hits, misses = cached.get_many([(1,), (2,), {'a': 1}, (1, 5)])
+        self.assertEqual(hits, [((1,), 1), ({'a': 1}, 1)])
+        self.assertEqual(misses, [(2,), (1, 5)])
+        self.assertEqual(cached.contains_many([(1,), (2,)]), [True, False])
+        self.assertEqual(cached.set_many([((2,), 'two'), ({'a': 3, 'b': 1}, 'four')]), 2)
+        self.assertEqual(cached(2), 'two')
+        self.assertEqual(cached(3, b=1), 'four')
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(cached.prefetch([(1,), (5,), (6,)]), 2)
+        self.assertEqual(self.calls, 3)
+        self.assertEqual(cached.contains_many([(5,), (6,), (7,)]), [True, True, False])
+        with self.assertRaises(TypeError):
+            cached.get_many([1])
+
+    def test_memory(self):
+        self.check_bulk(conditional_lru_cache(thread_safe=True)(self.func))
+
+    @unittest.skipIf(RedisClientManager.get_redis_client(name="default") is None, "Redis is not available")
+    def test_redis(self):
+        cached = redis_lru_cache(cache_id='test_bulk', ttl=60)(self.func)
+        cached.cache_clear()
+        self.addCleanup(cached.cache_clear)
+        self.check_bulk(cached)
+        self.assertEqual(cached.cache_info(), 5)
+
+    @unittest.skipIf(RedisClientManager.get_redis_client(name="default") is None, "Redis is not available")
+    def test_redis_get_many_fills_l1(self):
+        cached = redis_lru_cache(cache_id='test_bulk_l1', l1_maxsize=10)(self.func)
+        cached.cache_clear()
+        self.addCleanup(cached.cache_clear)
+        cached.set_many([((1,), 'one'), ((2,), 'two')])
+        cached.l1_cache.clear()
+        hits, _ = cached.get_many([(1,), (2,)])
+        self.assertEqual([value for _, value in hits], ['one', 'two'])
+        self.assertEqual(len(cached.l1_cache), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+from HANK_Caching.base import CachingBase, CachedMethod
+from HANK_Caching.decorators import conditional_lru_cache, redis_lru_cache
+from HANK_Caching.utils import RedisClientManager
+import unittest
+
+class Catalog(CachingBase):
+    lazy_caching = True
+    func_cache_map = {
+        'lookup': {'decorator': conditional_lru_cache, 'maxsize': 100, 'tags': ['lookup']},
+        'price': {'decorator': conditional_lru_cache, 'tags': ['price']},
+    }
+
+    def __init__(self, name='catalog', caches_enabled=True):
+        self.name = name
+        self.calls = 0
+        super().__init__(caches_enabled=caches_enabled)
+
+    def lookup(self, code):
+        """Look a code up."""
+        self.calls += 1
+        return f"{self.name}:{code}"
+
+    def price(self, code):
+        self.calls += 1
+        return len(code)
+
+class DiscountCatalog(Catalog):
+    def price(self, code):
+        self.calls += 1
+        return len(code) / 2
+
+class RemoteCatalog(Catalog):
+    func_cache_map = {
+        'lookup': {'decorator': redis_lru_cache, 'cache_id': lambda self: f"test_class_wiring_{self.name}", 'tags': ['lookup']},
+    }
+
+class EagerCatalog(Catalog):
+    lazy_caching = False
+
+class TestClassWiring(unittest.TestCase):
+    def test_wired_once_and_lazy(self):
+        self.assertIsInstance(Catalog.__dict__['lookup'], CachedMethod)
+        self.assertEqual(Catalog.lookup.__doc__, "Look a code up.")
+        catalog = Catalog()
+        self.assertNotIn('lookup', catalog.__dict__)  # nothing decorated by __init__
+        self.assertEqual([catalog.lookup('A'), catalog.lookup('A')], ['catalog:A'] * 2)
+        self.assertEqual(catalog.calls, 1)
+        self.assertIs(catalog.__dict__['lookup'], catalog.lookup)
+        self.assertNotIn('price', catalog.__dict__)
+
+    def test_instances_are_isolated(self):
+        first, second = Catalog('first'), Catalog('second')
+        self.assertEqual((first.lookup('A'), second.lookup('A')), ('first:A', 'second:A'))
+        first.clear_caches(tags=['lookup'])
+        first.lookup('A')
+        second.lookup('A')
+        self.assertEqual((first.calls, second.calls), (2, 1))
+
+    def test_controls(self):
+        catalog = Catalog(caches_enabled=False)
+        catalog.lookup('A')
+        catalog.lookup('A')
+        self.assertEqual(catalog.calls, 2)
+        catalog.enable_caching(tags=['lookup'])
+        catalog.lookup('A')
+        catalog.lookup('A')
+        self.assertEqual(catalog.calls, 3)
+        self.assertFalse(catalog.price.enabled)
+        catalog.remove_caching(tags=['lookup'], remove_originals=True)
+        catalog.lookup('A')
+        self.assertEqual(catalog.calls, 4)
+        self.assertEqual(catalog._cached_methods, ['price'])
+        self.assertIsInstance(Catalog.__dict__['lookup'], CachedMethod)  # other instances are unaffected
+
+    def test_subclass_override_is_wired(self):
+        catalog = DiscountCatalog()
+        self.assertEqual([catalog.price('AB'), catalog.price('AB')], [1.0, 1.0])
+        self.assertEqual(catalog.calls, 1)
+
+    def test_instance_map_still_decorates_in_init(self):
+        class Legacy(Catalog):
+            def __init__(self):
+                self.func_cache_map = {'price': {'decorator': conditional_lru_cache, 'tags': ['price']}}
+                super().__init__()
+        legacy = Legacy()
+        self.assertIn('price', legacy.__dict__)
+        self.assertEqual(legacy._cached_methods, ['price'])
+        legacy.price('A')
+        legacy.price('A')
+        self.assertEqual(legacy.calls, 1)
+
+    def test_eager_by_default(self):
+        class Plain(CachingBase):
+            func_cache_map = {'price': {'decorator': conditional_lru_cache}}
+            def price(self, code):
+                return len(code)
+        self.assertNotIsInstance(Plain.__dict__['price'], CachedMethod)
+        self.assertIn('price', Plain().__dict__)  # decorated by __init__, as before
+        catalog = EagerCatalog()
+        self.assertNotIsInstance(EagerCatalog.__dict__['lookup'], CachedMethod)
+        self.assertIn('lookup', catalog.__dict__)
+        self.assertEqual([catalog.lookup('A'), catalog.lookup('A')], ['catalog:A'] * 2)
+        self.assertEqual(catalog.calls, 1)
+
+    @unittest.skipIf(RedisClientManager.get_redis_client(name="default") is None, "Redis is not available")
+    def test_per_instance_cache_id(self):
+        first, second = RemoteCatalog('first'), RemoteCatalog('second')
+        for catalog in (first, second):
+            self.addCleanup(catalog.clear_caches)
+            catalog.lookup('A')
+        self.assertEqual(first.lookup.cache_key_prefix, 'test_class_wiring_first')
+        self.assertEqual(RemoteCatalog('first').lookup('A'), 'first:A')  # shared through Redis by cache_id
+        self.assertEqual(second.lookup.cache_info(), 1)
+        first.price('A')
+        first.price('A')
+        self.assertEqual(first.calls, 3)  # not in RemoteCatalog's func_cache_map, so not cached
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+from HANK_Caching.base import CachingBase
+from HANK_Caching.decorators import disk_lru_cache
+from HANK_Caching.disk import DiskStore
+import asyncio, multiprocessing, os, sqlite3, tempfile, time
+import unittest
+
+def square_many(path, start):
+    # a separate process writing to the same database
+    store = DiskStore(path)
+    cached = disk_lru_cache(cache_id='squares', store=store, maxsize=None)(lambda x: x * x)
+    return [cached(x) for x in range(start, start + 50)]
+
+class BrokenStore(DiskStore):
+    # a database that has gone bad under the cache (disk full, file deleted, corrupted ...)
+    def fail(self, *args, **kwargs):
+        raise sqlite3.OperationalError("disk I/O error")
+    get = get_many = contains_many = set_many = delete_many = clear = count = fail
+
+class Service(CachingBase):
+    def __init__(self, path):
+        self.func_cache_map = {
+            'lookup': {'decorator': disk_lru_cache, 'path': path, 'cache_id': 'service-lookup', 'tags': ['lookup']},
+        }
+        self.calls = 0
+        super().__init__()
+
+    def lookup(self, code):
+        self.calls += 1
+        return {'code': code}
+
+class TestDiskCache(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.path = os.path.join(self.dir.name, 'cache.sqlite3')
+        self.store = DiskStore(self.path)
+
+    def cached(self, func, **kwargs):
+        kwargs.setdefault('cache_id', 'test')
+        return disk_lru_cache(store=self.store, **kwargs)(func)
+
+    def test_hit_and_warm_start(self):
+        calls = []
+        def compute(x, y=1):
+            calls.append(x)
+            return [x, y]
+        cached = self.cached(compute)
+        self.assertEqual(cached(1, y=2), [1, 2])
+        self.assertEqual(cached(1, y=2), [1, 2])
+        self.assertEqual(calls, [1])
+        # a "restarted" process: new store and wrapper on the same file
+        restarted = disk_lru_cache(store=DiskStore(self.path), cache_id='test')(compute)
+        self.assertEqual(restarted(1, y=2), [1, 2])
+        self.assertEqual(calls, [1])
+        self.assertEqual(restarted.cache_info(), 1)
+        restarted.cache_invalidate(1, y=2)
+        cached(1, y=2)
+        self.assertEqual(calls, [1, 1])
+        cached.cache_clear()
+        self.assertEqual(cached.cache_info(), 0)
+
+    def test_ttl(self):
+        calls = []
+        cached = self.cached(lambda x: calls.append(x) or x, ttl=0.2)
+        cached(1)
+        cached(1)
+        time.sleep(0.3)
+        cached(1)
+        self.assertEqual(calls, [1, 1])
+
+    def test_lru_eviction(self):
+        calls = []
+        cached = self.cached(lambda x: calls.append(x) or x, maxsize=3)
+        for x in (1, 2, 3):
+            cached(x)
+            time.sleep(0.01)
+        cached(1)  # 2 is now the least recently used
+        time.sleep(0.01)
+        cached(4)
+        self.assertEqual(cached.cache_info(), 3)
+        self.assertEqual(cached.contains_many([(1,), (2,), (3,), (4,)]), [True, False, True, True])
+
+    def test_hit_doesnt_wait_for_writers(self):
+        store = DiskStore(self.path, touch_batch=1)
+        store.set_many('test', [('a', b'1')])
+        writer = sqlite3.connect(self.path, isolation_level=None)
+        self.addCleanup(writer.close)
+        writer.execute('BEGIN IMMEDIATE')  # another process in the middle of a write
+        st = time.perf_counter()
+        self.assertEqual(store.get('test', 'a'), b'1')
+        self.assertLess(time.perf_counter() - st, 1)
+        self.assertEqual(list(store._touches), [('test', 'a')])  # still buffered
+        writer.execute('COMMIT')
+        self.assertTrue(store.flush(wait=False))
+        self.assertEqual(list(store._touches), [])
+
+    def test_failing_store(self):
+        calls = []
+        cached = disk_lru_cache(store=BrokenStore(self.path), cache_id='test')(lambda x: calls.append(x) or x)
+        with self.assertLogs(level='WARNING') as logs:
+            self.assertEqual([cached(1), cached(1)], [1, 1])
+            self.assertEqual(cached.contains_many([(1,), (2,)]), [False, False])
+            cached.cache_invalidate(1)
+            cached.cache_clear()
+            self.assertIsNone(cached.cache_info())
+        self.assertEqual(calls, [1, 1])
+        self.assertTrue(any('invalidation failed' in line for line in logs.output))
+
+    def test_bulk(self):
+        cached = self.cached(lambda x: x * 10)
+        self.assertEqual(cached.set_many([((1,), 10), ({'x': 2}, 20)]), 2)
+        hits, misses = cached.get_many([(1,), (2,), (3,)])
+        self.assertEqual(hits, [((1,), 10), ((2,), 20)])
+        self.assertEqual(misses, [(3,)])
+        self.assertEqual(cached.prefetch([(3,), (4,)]), 2)
+        self.assertEqual(cached.cache_info(), 4)
+
+    def test_processes(self):
+        with multiprocessing.get_context('spawn').Pool(4) as pool:
+            results = pool.starmap(square_many, [(self.path, start) for start in (0, 25, 50, 75)])
+        self.assertEqual(results[1][:3], [625, 676, 729])
+        cached = self.cached(lambda x: -1, cache_id='squares')
+        self.assertEqual(cached.cache_info(), 125)
+        self.assertEqual(cached(30), 900)
+
+    def test_caching_base(self):
+        service = Service(self.path)
+        service.lookup('A')
+        service.lookup('A')
+        self.assertEqual(service.calls, 1)
+        self.assertEqual(Service(self.path).lookup('A'), {'code': 'A'})
+        service.clear_caches(tags=['lookup'])
+        service.lookup('A')
+        self.assertEqual(service.calls, 2)
+
+    def test_async(self):
+        calls = []
+        async def compute(x):
+            calls.append(x)
+            await asyncio.sleep(0.01)
+            return x + 1
+        cached = self.cached(compute)
+        async def main():
+            return await asyncio.gather(*(cached(1) for _ in range(5)))
+        self.assertEqual(asyncio.run(main()), [2] * 5)
+        self.assertEqual(asyncio.run(cached(1)), 2)
+        self.assertEqual(calls, [1])
+
+if __name__ == '__main__':
+    unittest.main()
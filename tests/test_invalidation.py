@@ -0,0 +1,68 @@
+from HANK_Caching.decorators import redis_lru_cache
+from HANK_Caching.invalidation import InvalidationBus
+from HANK_Caching.utils import RedisClientManager
+import multiprocessing
+import unittest
+import time
+
+def get_test_client():
+    return RedisClientManager.get_redis_client(name="default")
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+def remote_node(cache_id, ready, result):
+    # runs in a forked child: its own bus, its own L1 for the same cache_id
+    cached = redis_lru_cache(cache_id=cache_id, l1_maxsize=10, invalidation_bus=True)(lambda a: a * 2)
+    cached(1)
+    ready.set()
+    result.put(wait_for(lambda: len(cached.l1_cache) == 0))
+
+@unittest.skipIf(get_test_client() is None, "Redis is not available")
+class TestInvalidationBus(unittest.TestCase):
+    def setUp(self):
+        self.buses = [InvalidationBus(get_test_client(), batch_interval=0.01) for _ in range(2)]
+        for bus in self.buses:
+            self.addCleanup(bus.close)
+        time.sleep(0.1)  # let both subscriptions register
+
+    def make_node(self, bus, cache_id, tags=()):
+        cached = redis_lru_cache(cache_id=cache_id, l1_maxsize=10, tags=list(tags))(lambda a: a * 2)
+        cached.invalidation_bus = bus
+        bus.register(cached)
+        self.addCleanup(cached.cache_clear)
+        return cached
+
+    def test_key_prefix_and_tag_invalidations_reach_other_nodes(self):
+        local = self.make_node(self.buses[0], 'test_invalidation', tags=['codes'])
+        remote = self.make_node(self.buses[1], 'test_invalidation', tags=['codes'])
+        for a in (1, 2, 3):
+            remote(a)
+        local.cache_invalidate(1)
+        self.assertTrue(wait_for(lambda: len(remote.l1_cache) == 2))
+        local.cache_clear()
+        self.assertTrue(wait_for(lambda: len(remote.l1_cache) == 0))
+        remote(4)
+        self.buses[0].invalidate_tags(['codes'])
+        self.assertTrue(wait_for(lambda: len(remote.l1_cache) == 0))
+
+    @unittest.skipIf('fork' not in multiprocessing.get_all_start_methods(), "needs fork")
+    def test_clear_reaches_other_process(self):
+        ctx = multiprocessing.get_context('fork')
+        ready, result = ctx.Event(), ctx.Queue()
+        child = ctx.Process(target=remote_node, args=('test_invalidation_mp', ready, result))
+        child.start()
+        self.assertTrue(ready.wait(10))
+        time.sleep(0.1)
+        local = redis_lru_cache(cache_id='test_invalidation_mp', l1_maxsize=10, invalidation_bus=True)(lambda a: a * 2)
+        local.cache_clear()
+        self.assertTrue(result.get(timeout=10))
+        child.join(10)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+from HANK_Caching.utils import make_hashable_key, compile_key_builder
+from HANK_Caching.transforms import dos_transform_YYYYMM, zipcode_4
+import unittest
+import datetime
+
+class Sample:
+    def method(self, a, b, dos=None, quiet=None, **kwargs):
+        return a, b
+
+    def star(self, *args, flag=False):
+        return args
+
+def plain(a, b=2, *, c=3, **kw):
+    return a, b, c
+
+class TestCompiledKeyBuilder(unittest.TestCase):
+    transforms = {'dos': dos_transform_YYYYMM, 'zipcode': zipcode_4, 'quiet': lambda x: True}
+
+    def assertSameKeys(self, func, calls, **options):
+        make_key = compile_key_builder(func, **options)
+        for args, kwargs in calls:
+            self.assertEqual(make_key(args, kwargs), make_hashable_key(func, args, kwargs, **options))
+
+    def test_bound_method_matches(self):
+        dos = datetime.datetime(2024, 5, 17)
+        calls = [(({'x': 1}, ['y']), {}),
+                 (({'x': 1}, ['y']), {'dos': dos, 'zipcode': 29220}),
+                 (({'x': 1},), {'b': ['y'], 'quiet': False, 'other': 1}),
+                 ((), {'b': 2, 'a': 1})]
+        self.assertSameKeys(Sample().method, calls, arg_transforms=self.transforms, use_id=False)
+        self.assertSameKeys(Sample().method, calls, arg_transforms=self.transforms, prefix='test_func', use_id=True)
+
+    def test_unbound_and_keyword_only_match(self):
+        obj = Sample()
+        self.assertSameKeys(Sample.method, [((obj, 1, 2), {}), ((obj, 1), {'b': 2, 'zipcode': 123})],
+                            arg_transforms=self.transforms, use_id=True)
+        self.assertSameKeys(plain, [((1,), {}), ((1, 5), {'c': 4}), ((1,), {'z': 9, 'b': 1})], use_id=False)
+
+    def test_fallback_matches_and_raises(self):
+        self.assertSameKeys(Sample().star, [((1, 2, 3), {}), ((), {'flag': True})], use_id=False)
+        make_key = compile_key_builder(plain, use_id=False)
+        with self.assertRaises(TypeError):
+            make_key((1, 2, 3), {})
+        with self.assertRaises(TypeError):
+            make_key((1,), {'a': 1})
+        with self.assertRaises(TypeError):
+            make_key((), {})
+
+if __name__ == '__main__':
+    unittest.main()
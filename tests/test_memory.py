@@ -0,0 +1,91 @@
+from HANK_Caching.base import CachingBase
+from HANK_Caching.decorators import conditional_lru_cache, redis_lru_cache
+from HANK_Caching.memory import MemoryBudget, estimate_size, set_memory_budget, get_memory_budget
+import gc
+import unittest
+
+def blob(n):
+    return b'x' * n
+
+class Service(CachingBase):
+    def __init__(self):
+        self.func_cache_map = {
+            'small': {'tags': ['small']},
+            'large': {'tags': ['large']},
+        }
+        super().__init__()
+
+    def small(self, n):
+        return blob(n)
+
+    def large(self, n):
+        return blob(n * 10)
+
+class TestMemoryBounds(unittest.TestCase):
+    def test_estimate_size(self):
+        self.assertGreater(estimate_size([blob(1000)] * 3), 3000)
+        self.assertGreater(estimate_size({'a': blob(5000)}), 5000)
+        self.assertGreater(estimate_size(list(range(10000))), estimate_size(list(range(100))) * 50)
+
+    def test_max_bytes(self):
+        cached = conditional_lru_cache(max_bytes=10000, getsizeof=len)(blob)
+        for n in range(5):
+            cached(3000 + n)
+        self.assertLessEqual(cached.cache_info(), 10000)
+        self.assertEqual(len(cached.cache), 3)
+        self.assertEqual(cached.memory_usage(), cached.cache_info())
+        self.assertIsNone(conditional_lru_cache()(blob).memory_usage())
+        with self.assertRaises(ValueError):
+            conditional_lru_cache(getsizeof=len)
+
+    def test_maxsize_none(self):
+        cached = conditional_lru_cache(maxsize=None)(blob)
+        for n in range(2000):
+            cached(n)
+        self.assertEqual(cached.cache_info(), 2000)  # no item limit
+        cached = conditional_lru_cache(maxsize=None, max_bytes=10000, getsizeof=len)(blob)
+        for n in range(5):
+            cached(3000 + n)
+        self.assertEqual(len(cached.cache), 3)  # only the byte budget applies
+        with self.assertRaises(ValueError):
+            conditional_lru_cache(maxsize=None, policy='tinylfu')
+
+    def test_shared_budget_with_weights(self):
+        budget = MemoryBudget(20000, tag_weights={'heavy': 3})
+        light = conditional_lru_cache(memory_budget=budget, getsizeof=len, tags=['light'])(blob)
+        heavy = conditional_lru_cache(memory_budget=budget, getsizeof=len, tags=['heavy'])(lambda n: blob(n))
+        for n in range(10):
+            light(2000 + n)
+            heavy(2000 + n)
+        usage = budget.usage()
+        self.assertLessEqual(usage['total'], 20000)
+        self.assertGreater(usage['evictions'], 0)
+        by_tag = {cache['tags'][0]: cache['bytes'] for cache in usage['caches']}
+        self.assertGreater(by_tag['heavy'], by_tag['light'] * 2)
+
+    def test_process_budget_and_caching_base(self):
+        self.addCleanup(set_memory_budget, None)
+        set_memory_budget(50000, tag_weights={'large': 2})
+        service = Service()
+        for n in range(20):
+            service.small(1000 + n)
+            service.large(1000 + n)
+        usage = service.memory_usage()
+        self.assertEqual(set(usage['methods']), {'small', 'large'})
+        self.assertLessEqual(usage['total'], 50000 * 1.1)  # estimates include object overhead
+        self.assertEqual(get_memory_budget().usage()['total'], usage['total'])
+        del service
+        gc.collect()
+        self.assertEqual(get_memory_budget().usage()['caches'], [])
+
+    def test_redis_l1_counts_against_budget(self):
+        budget = MemoryBudget(10000)
+        cached = redis_lru_cache(cache_id='test_memory_l1', l1_maxsize=100, memory_budget=budget, getsizeof=len)(blob)
+        self.addCleanup(cached.cache_clear)
+        for n in range(5):
+            cached(3000 + n)
+        self.assertLessEqual(cached.memory_usage(), 10000)
+        self.assertEqual(budget.usage()['caches'][0]['bytes'], cached.memory_usage())
+
+if __name__ == '__main__':
+    unittest.main()
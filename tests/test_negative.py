@@ -0,0 +1,114 @@
+from HANK_Caching.decorators import conditional_lru_cache, redis_lru_cache
+from HANK_Caching.utils import RedisClientManager
+import asyncio, time
+import unittest
+
+class InvalidCode(ValueError):
+    def __init__(self, code, reason="unknown"):
+        super().__init__(code, reason)
+        self.code = code
+        self.reason = reason
+
+class Lookup:
+    """A lookup that fails for codes starting with 'X', times out for 'T' and finds nothing for 'E'."""
+    def __init__(self):
+        self.calls = 0
+
+    def find(self, code):
+        self.calls += 1
+        if code.startswith('X'):
+            raise InvalidCode(code, reason="bad prefix")
+        if code.startswith('T'):
+            raise TimeoutError(code)
+        return [] if code.startswith('E') else [code]
+
+class NegativeCachingTests:
+    def decorate(self, lookup, **kwargs):
+        raise NotImplementedError
+
+    def test_exceptions(self):
+        lookup = Lookup()
+        cached = self.decorate(lookup, cache_exceptions=InvalidCode)
+        for _ in range(3):
+            with self.assertRaises(InvalidCode) as raised:
+                cached('X1')
+        self.assertEqual(lookup.calls, 1)
+        self.assertEqual((raised.exception.args, raised.exception.code, raised.exception.reason), (('X1', 'bad prefix'), 'X1', 'bad prefix'))
+        for _ in range(2):
+            with self.assertRaises(TimeoutError):
+                cached('T1')  # not a cached type
+        self.assertEqual(lookup.calls, 3)
+        self.assertEqual(cached.negative_cache_info()['exceptions'], 1)
+
+    def test_empty_results(self):
+        lookup = Lookup()
+        cached = self.decorate(lookup, cache_empty=True)
+        self.assertEqual([cached('E1'), cached('E1'), cached('A1'), cached('A1')], [[], [], ['A1'], ['A1']])
+        self.assertEqual(lookup.calls, 2)
+        info = cached.negative_cache_info()
+        self.assertEqual((info['size'], info['hits'], info['empty']), (1, 1, 1))
+        self.assertEqual(cached.contains_many([('E1',), ('A1',)]), [False, True])  # kept apart from the positive entries
+
+    def test_ttl_and_clear(self):
+        lookup = Lookup()
+        cached = self.decorate(lookup, cache_exceptions=(InvalidCode,), cache_empty=True, negative_ttl=0.2)
+        for code in ('X1', 'X1'):
+            self.assertRaises(InvalidCode, cached, code)
+        time.sleep(0.3)
+        self.assertRaises(InvalidCode, cached, 'X1')
+        self.assertEqual(lookup.calls, 2)
+        cached('E1')
+        cached.cache_clear()
+        cached('E1')
+        self.assertEqual(lookup.calls, 4)
+
+    def test_capacity_is_separate(self):
+        lookup = Lookup()
+        cached = self.decorate(lookup, cache_empty=True, negative_maxsize=3)
+        cached('A1')
+        for i in range(10):
+            cached(f"E{i}")
+        self.assertEqual(cached.negative_cache_info()['size'], 3)
+        cached('A1')
+        self.assertEqual(lookup.calls, 11)
+
+class TestConditionalNegative(NegativeCachingTests, unittest.TestCase):
+    def decorate(self, lookup, **kwargs):
+        return conditional_lru_cache(maxsize=5, **kwargs)(lookup.find)
+
+    def test_async(self):
+        calls = []
+        @conditional_lru_cache(cache_exceptions=KeyError)
+        async def fetch(code):
+            calls.append(code)
+            raise KeyError(code)
+        async def main():
+            for _ in range(2):
+                with self.assertRaises(KeyError):
+                    await fetch('a')
+        asyncio.run(main())
+        self.assertEqual(calls, ['a'])
+
+@unittest.skipIf(RedisClientManager.get_redis_client(name="default") is None, "Redis is not available")
+class TestRedisNegative(NegativeCachingTests, unittest.TestCase):
+    def decorate(self, lookup, **kwargs):
+        cached = redis_lru_cache(cache_id=f"test_negative_{self._testMethodName}", maxsize=5, **kwargs)(lookup.find)
+        cached.cache_clear()
+        self.addCleanup(cached.cache_clear)
+        return cached
+
+    def test_shared_and_invalidated(self):
+        first, second = Lookup(), Lookup()
+        cached = self.decorate(first, cache_exceptions=InvalidCode)
+        other = redis_lru_cache(cache_id=cached.cache_key_prefix, maxsize=5, cache_exceptions=InvalidCode)(second.find)
+        self.assertRaises(InvalidCode, cached, 'X1')
+        with self.assertRaises(InvalidCode) as raised:
+            other('X1')  # another process (or wrapper) gets the failure from Redis
+        self.assertEqual(raised.exception.reason, 'bad prefix')
+        self.assertEqual((first.calls, second.calls), (1, 0))
+        cached.cache_invalidate('X1')
+        self.assertRaises(InvalidCode, other, 'X1')
+        self.assertEqual(second.calls, 1)
+
+if __name__ == '__main__':
+    unittest.main()
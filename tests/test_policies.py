@@ -0,0 +1,111 @@
+from HANK_Caching.decorators import conditional_lru_cache
+from HANK_Caching.memory import MemoryBudget
+from HANK_Caching.policies import ARCCache, CountMinSketch, WTinyLFUCache, make_policy_cache
+from cachetools import LFUCache, LRUCache, RRCache, TTLCache
+import random
+import unittest
+
+def hit_ratio(cache, keys):
+    hits = 0
+    for key in keys:
+        try:
+            cache[key]
+            hits += 1
+        except KeyError:
+            cache[key] = key
+    return hits / len(keys)
+
+def scan_trace(seed=0, n=20000):
+    # requests for a hot set of 80 keys, interleaved with a batch job sweeping through cold keys it never revisits
+    rng, trace, cold = random.Random(seed), [], 0
+    for _ in range(n):
+        if rng.random() < 0.5:
+            trace.append(rng.randrange(80))
+        else:
+            trace.append(f"cold-{cold}")
+            cold += 1
+    return trace
+
+class TestPolicies(unittest.TestCase):
+    def check_invariants(self, cache):
+        self.assertLessEqual(cache.currsize, cache.maxsize)
+        self.assertEqual(sorted(map(str, cache._sizes)), sorted(map(str, cache.keys())))
+        if isinstance(cache, WTinyLFUCache):
+            segments = (cache._window, cache._probation, cache._protected)
+        else:
+            segments = (cache._t1, cache._t2)
+            self.assertFalse(set(cache._b1).union(cache._b2).intersection(cache.keys()))
+        self.assertEqual(sum(map(len, segments)), len(cache))
+        self.assertEqual(set().union(*segments), set(cache.keys()))
+
+    def test_make_policy_cache(self):
+        self.assertIsInstance(make_policy_cache('lru', 10), LRUCache)
+        self.assertIsInstance(make_policy_cache('lru', 10, ttl=5), TTLCache)
+        self.assertIsInstance(make_policy_cache('ttl', 10, ttl=5), TTLCache)
+        self.assertIsInstance(make_policy_cache('lfu', 10), LFUCache)
+        self.assertIsInstance(make_policy_cache('tinylfu', 10), WTinyLFUCache)
+        self.assertIsInstance(make_policy_cache('arc', 10), ARCCache)
+        self.assertIsInstance(make_policy_cache(RRCache, 10), RRCache)
+        for policy, ttl in (('ttl', None), ('arc', 5), ('nope', None)):
+            with self.assertRaises(ValueError):
+                make_policy_cache(policy, 10, ttl=ttl)
+
+    def test_sketch(self):
+        sketch = CountMinSketch(64)
+        for _ in range(5):
+            sketch.add('hot')
+        sketch.add('warm')
+        self.assertEqual(sketch.estimate('hot'), 5)
+        self.assertGreaterEqual(sketch.estimate('warm'), 1)
+        for _ in range(sketch.sample_size):
+            sketch.add('other')
+        self.assertLessEqual(sketch.estimate('hot'), 2)  # aged
+
+    def test_scan_resistance(self):
+        trace = scan_trace()
+        lru = hit_ratio(LRUCache(100), trace)
+        for cache in (WTinyLFUCache(100), ARCCache(100)):
+            ratio = hit_ratio(cache, trace)
+            self.assertGreater(ratio, lru + 0.1, type(cache).__name__)
+            self.check_invariants(cache)
+
+    def test_consistency(self):
+        rng = random.Random(1)
+        for cache in (WTinyLFUCache(50, getsizeof=len), ARCCache(50, getsizeof=len)):
+            for _ in range(5000):
+                key, op = rng.randrange(80), rng.random()
+                if op < 0.6:
+                    cache.get(key) if op < 0.3 else key in cache and cache[key]
+                elif op < 0.95:
+                    cache[key] = 'x' * rng.randrange(1, 6)
+                elif key in cache:
+                    del cache[key]
+                self.check_invariants(cache)
+            cache.clear()
+            self.assertEqual((len(cache), cache.currsize), (0, 0))
+            cache['a'] = 'xyz'
+            self.assertEqual(cache['a'], 'xyz')
+
+    def test_decorator(self):
+        calls = []
+        @conditional_lru_cache(maxsize=100, policy='tinylfu')
+        def square(x):
+            calls.append(x)
+            return x * x
+        self.assertEqual(square(3), 9)
+        self.assertEqual(square(3), 9)
+        self.assertEqual(calls, [3])
+        self.assertIsInstance(square.cache, WTinyLFUCache)
+        with self.assertRaises(ValueError):
+            conditional_lru_cache(policy='arc', ttl=10)
+
+    def test_memory_budget(self):
+        budget = MemoryBudget(5000)
+        cached = conditional_lru_cache(policy='arc', memory_budget=budget, getsizeof=len)(lambda n: b'x' * n)
+        for n in range(20):
+            cached(1000 + n)
+        self.assertLessEqual(budget.total(), 5000)
+        self.assertIsInstance(cached.cache, ARCCache)
+
+if __name__ == '__main__':
+    unittest.main()
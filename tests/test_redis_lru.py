@@ -0,0 +1,63 @@
+from HANK_Caching.decorators import redis_lru_cache
+from HANK_Caching.utils import RedisClientManager
+import unittest
+import time
+
+def get_test_client():
+    return RedisClientManager.get_redis_client(name="default")
+
+@unittest.skipIf(get_test_client() is None, "Redis is not available")
+class TestRedisLRU(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        def func(a):
+            self.calls.append(a)
+            return a * 2
+        self.func = func
+
+    def decorate(self, cache_id, **kwargs):
+        cached = redis_lru_cache(cache_id=cache_id, **kwargs)(self.func)
+        cached.cache_clear()
+        self.addCleanup(cached.cache_clear)
+        return cached
+
+    def test_hits_refresh_recency(self):
+        cached = self.decorate('test_redis_lru_recency', maxsize=3)
+        for a in (1, 2, 3, 1, 4):  # 1 is touched before 4 arrives, so 2 is the least recently used
+            cached(a)
+        self.calls.clear()
+        for a in (1, 3, 4):
+            cached(a)
+        self.assertEqual(self.calls, [])
+        cached(2)
+        self.assertEqual(self.calls, [2])
+        self.assertEqual(cached.cache_info(), 3)
+
+    def test_cache_info_counts_distinct_live_entries(self):
+        cached = self.decorate('test_redis_lru_ttl', maxsize=10, ttl=0.2)
+        for _ in range(3):
+            cached(1)
+            cached(2)
+            time.sleep(0.25)
+        self.assertEqual(self.calls, [1, 2] * 3)
+        self.assertEqual(cached.cache_info(), 0)
+        cached(1)
+        self.assertEqual(cached.cache_info(), 1)
+
+    def test_l1_tier(self):
+        cached = self.decorate('test_redis_lru_l1', maxsize=10, l1_maxsize=2)
+        cached(1)
+        cached.redis_client.delete(*cached.redis_client.zrange('test_redis_lru_l1:lru', 0, -1))
+        self.assertEqual(cached(1), 2)
+        self.assertEqual(self.calls, [1])  # served from L1
+        cached.cache_clear()
+        self.assertEqual(len(cached.l1_cache), 0)
+        cached(1)
+        self.assertEqual(self.calls, [1, 1])
+        cached.l1_cache.clear()
+        cached(1)  # L2 hit fills L1
+        self.assertEqual(self.calls, [1, 1])
+        self.assertEqual(len(cached.l1_cache), 1)
+
+if __name__ == '__main__':
+    unittest.main()
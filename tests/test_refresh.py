@@ -0,0 +1,62 @@
+from HANK_Caching.decorators import conditional_lru_cache, redis_lru_cache
+from HANK_Caching.concurrency import BackgroundRefresher
+from HANK_Caching.utils import RedisClientManager
+import unittest
+import time
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+class TestStaleWhileRevalidate(unittest.TestCase):
+    def setUp(self):
+        self.version = 0
+        self.refresher = BackgroundRefresher(max_workers=2)
+
+    def func(self, a):
+        self.version += 1
+        return (a, self.version)
+
+    def test_memory_ttl(self):
+        cached = conditional_lru_cache(ttl=0.1)(self.func)
+        self.assertEqual(cached(1), cached(1))
+        time.sleep(0.15)
+        self.assertEqual(cached(1), (1, 2))
+
+    def test_memory_soft_ttl_serves_stale_then_refreshes(self):
+        cached = conditional_lru_cache(ttl=5, soft_ttl=0.1, refresher=self.refresher)(self.func)
+        self.assertEqual(cached(1), (1, 1))
+        time.sleep(0.15)
+        self.assertEqual(cached(1), (1, 1))  # stale, returned right away
+        self.assertTrue(wait_for(lambda: cached(1) == (1, 2)))
+        self.assertEqual(self.refresher.submitted, 1)
+
+    def test_memory_refresh_ahead(self):
+        cached = conditional_lru_cache(ttl=0.3, refresh_ahead=0.25, refresher=self.refresher)(self.func)
+        cached(1)
+        time.sleep(0.1)
+        self.assertEqual(cached(1), (1, 1))
+        self.assertTrue(wait_for(lambda: cached(1) == (1, 2), timeout=0.2))
+
+    def test_refresh_needs_ttl(self):
+        with self.assertRaises(ValueError):
+            conditional_lru_cache(refresh_ahead=1)
+        with self.assertRaises(ValueError):
+            redis_lru_cache(soft_ttl=1)(self.func)
+
+    @unittest.skipIf(RedisClientManager.get_redis_client(name="default") is None, "Redis is not available")
+    def test_redis_soft_ttl_serves_stale_then_refreshes(self):
+        cached = redis_lru_cache(cache_id='test_refresh', ttl=5, soft_ttl=0.1, refresher=self.refresher)(self.func)
+        cached.cache_clear()
+        self.addCleanup(cached.cache_clear)
+        self.assertEqual(cached(1), (1, 1))
+        time.sleep(0.15)
+        self.assertEqual(cached(1), (1, 1))
+        self.assertTrue(wait_for(lambda: cached(1) == (1, 2)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+from HANK_Caching.serializers import get_serializer, loads, loads_chunked, PickleSerializer, LegacyPickleSerializer, OutOfBandSerializer
+from HANK_Caching.decorators import redis_lru_cache
+from HANK_Caching.utils import RedisClientManager
+import pickle
+import unittest
+
+class TestSerializers(unittest.TestCase):
+    payloads = [None, 1, "text", {'codes': list(range(1000)), 'name': 'x' * 5000}, [b'\x00' * 4096]]
+
+    def test_round_trip_every_codec(self):
+        for name in ('legacy', 'pickle', 'zlib', 'lzma'):
+            codec = get_serializer(name)
+            for value in self.payloads:
+                self.assertEqual(codec.loads(codec.dumps(value)), value, name)
+
+    def test_mixed_formats_are_readable(self):
+        value = self.payloads[3]
+        encoded = {name: get_serializer(name).dumps(value) for name in ('legacy', 'pickle', 'zlib', 'lzma')}
+        self.assertEqual(encoded['legacy'], pickle.dumps(value))
+        self.assertEqual({bytes(data[:1]) for data in encoded.values()}, {b'\x80', b'P', b'Z', b'X'})
+        for data in encoded.values():
+            self.assertEqual(loads(data), value)
+
+    def test_compression_threshold(self):
+        codec = PickleSerializer(compression='zlib', threshold=10000)
+        self.assertEqual(codec.dumps('x' * 100)[:1], b'P')
+        self.assertEqual(codec.dumps('x' * 20000)[:1], b'Z')
+
+    def test_unknown(self):
+        with self.assertRaises(ValueError):
+            get_serializer('yaml')
+        with self.assertRaises(ValueError):
+            loads(b'?abc')
+        self.assertIsInstance(get_serializer(None), LegacyPickleSerializer)
+
+    def test_out_of_band_chunks(self):
+        codec = OutOfBandSerializer(chunk_size=1000, inline_threshold=2000)
+        value = {'array': bytearray(range(256)) * 20, 'meta': 'x'}
+        head, chunks = codec.dumps_parts(value)
+        self.assertEqual(head[:1], b'M')
+        self.assertTrue(all(len(chunk) <= 1000 for chunk in chunks))
+        self.assertEqual(loads_chunked(head, [bytes(chunk) for chunk in chunks]), value)
+        head, chunks = codec.dumps_parts(value['meta'])
+        self.assertEqual((head[:1], chunks), (b'P', []))
+        self.assertEqual(loads(head), 'x')
+
+    @unittest.skipIf(RedisClientManager.get_redis_client(name="default") is None, "Redis is not available")
+    def test_redis_chunked_values(self):
+        calls = []
+        def func(n):
+            calls.append(n)
+            return bytearray(b'abc') * n
+        cached = redis_lru_cache(cache_id='test_serializers_oob', maxsize=2, serializer=OutOfBandSerializer(chunk_size=1000, inline_threshold=100))(func)
+        cached.cache_clear()
+        self.addCleanup(cached.cache_clear)
+        for n in (1000, 1000, 10):
+            self.assertEqual(cached(n), bytearray(b'abc') * n)
+        self.assertEqual(calls, [1000, 10])
+        chunk_keys = cached.redis_client.keys('test_serializers_oob:*:chunks')
+        self.assertEqual(len(chunk_keys), 1)
+        self.assertEqual(cached.redis_client.hlen(chunk_keys[0]), 4)  # the pickle stream + 3 chunks of the buffer
+        cached(1)
+        cached(2)  # evicts the chunked entry together with its chunks
+        self.assertEqual(cached.redis_client.keys('test_serializers_oob:*:chunks'), [])
+
+if __name__ == '__main__':
+    unittest.main()
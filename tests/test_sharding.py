@@ -0,0 +1,99 @@
+from HANK_Caching.decorators import redis_lru_cache
+from HANK_Caching.sharding import HashRing, ShardedRedis, parse_node, routing_key
+from HANK_Caching.utils import RedisClientManager
+from HANK_Caching import redis_scripts
+import asyncio, os
+import unittest
+
+def node_list():
+    # REDIS_NODES if set (e.g. several local redis-server processes), else three databases of the test Redis
+    if os.getenv('REDIS_NODES'):
+        return [node.strip() for node in os.getenv('REDIS_NODES').split(',')]
+    address = f"{os.getenv('REDIS_HOST', 'localhost')}:{os.getenv('REDIS_PORT', 6379)}"
+    return [f"{address}/{db}" for db in (1, 2, 3)]
+
+def sharded_client(name):
+    return RedisClientManager.get_redis_client(name=name, nodes=node_list())
+
+class TestHashRing(unittest.TestCase):
+    def test_balance_and_movement(self):
+        keys = [f"cache-{i}" for i in range(20000)]
+        ring = HashRing([f"node{i}" for i in range(4)])
+        before = [ring.node_for(key) for key in keys]
+        for node in ring.nodes:
+            self.assertAlmostEqual(before.count(node) / len(keys), 0.25, delta=0.05)
+        ring.add('node4')
+        after = [ring.node_for(key) for key in keys]
+        moved = [(old, new) for old, new in zip(before, after) if old != new]
+        self.assertAlmostEqual(len(moved) / len(keys), 0.2, delta=0.05)
+        self.assertEqual({new for _, new in moved}, {'node4'})  # only keys taken over by the new node move
+        ring.remove('node4')
+        self.assertEqual([ring.node_for(key) for key in keys], before)
+        self.assertEqual(HashRing(reversed(ring.nodes)).node_for('x'), ring.node_for('x'))
+
+    def test_routing(self):
+        self.assertEqual(routing_key('user:{42}:profile'), '42')
+        self.assertEqual(routing_key(b'{a}b'), 'a')
+        self.assertEqual(routing_key('no{}tag'), 'no{}tag')
+        self.assertEqual(parse_node('redis://cache1:6380/2'), {'host': 'cache1', 'port': 6380, 'db': 2})
+        self.assertEqual(parse_node('cache1'), {'host': 'cache1', 'port': 6379, 'db': 0})
+        with self.assertRaises(LookupError):
+            HashRing().node_for('x')
+
+@unittest.skipIf(sharded_client('test_sharded') is None, "Redis nodes are not available")
+class TestShardedRedis(unittest.TestCase):
+    def setUp(self):
+        self.client = sharded_client('test_sharded')
+
+    def test_multi_key_commands(self):
+        self.assertIsInstance(self.client, ShardedRedis)  # nodes=... gives a client over all of them
+        self.assertEqual(len(self.client.clients), len(node_list()))
+        keys = [f"test_sharded:{i}" for i in range(100)]
+        self.addCleanup(self.client.delete, *keys)
+        self.assertTrue(self.client.mset({key: i for i, key in enumerate(keys)}))
+        self.assertEqual(self.client.mget(keys + ['test_sharded:missing']), [str(i).encode() for i in range(100)] + [None])
+        self.assertEqual(self.client.exists(*keys), 100)
+        per_node = self.client.map(lambda node_client: sum(node_client.exists(key) for key in keys))
+        self.assertEqual(sum(per_node.values()), 100)
+        self.assertGreater(min(per_node.values()), 0)
+        self.assertEqual(self.client.delete(*keys[:50]), 50)
+        self.assertEqual(self.client.exists(*keys), 50)
+
+    def test_cache_lives_on_one_node(self):
+        # redis_lru_cache uses the client named after its cache_id; each of these is sharded over the same nodes
+        caches = []
+        for i in range(12):
+            sharded_client(f"test_sharded_{i}")
+            caches.append(redis_lru_cache(cache_id=f"test_sharded_{i}", maxsize=5)(lambda x, i=i: x * i))
+        for cache in caches:
+            self.addCleanup(cache.cache_clear)
+            for x in range(8):
+                cache(x)
+            self.assertEqual(cache(3), 3 * caches.index(cache))
+            self.assertEqual(cache.cache_info(), 5)  # evicted within the cache's node
+        owners = set()
+        for cache in caches:
+            owner = self.client.node_for(cache.cache_key_prefix)
+            owners.add(owner)
+            lru_key = redis_scripts.index_keys(cache.cache_key_prefix)[0]
+            for node, node_client in self.client.clients.items():
+                self.assertEqual(node_client.zcard(lru_key), 5 if node == owner else 0)
+        self.assertGreater(len(owners), 1)
+
+    def test_async(self):
+        calls = []
+        async def compute(x):
+            calls.append(x)
+            return x + 1
+        sharded_client('test_sharded_async')
+        cached = redis_lru_cache(cache_id='test_sharded_async')(compute)
+        self.addCleanup(cached.cache_clear)
+        async def main():
+            return [await cached(1), await cached(1)]
+        self.assertEqual(asyncio.run(main()), [2, 2])
+        self.assertEqual(calls, [1])
+        node = self.client.node_for(cached.cache_key_prefix)
+        self.assertEqual(self.client.clients[node].exists(f"{cached.cache_key_prefix}:lru"), 1)
+
+if __name__ == '__main__':
+    unittest.main()
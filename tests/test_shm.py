@@ -0,0 +1,89 @@
+from HANK_Caching.decorators import shared_lru_cache
+from HANK_Caching.shm import SharedMemoryCache
+import multiprocessing, tempfile, threading, time
+import unittest
+
+def cube_many(directory, start):
+    # another worker process attaching to the same table by cache_id
+    cached = shared_lru_cache(cache_id='cubes', directory=directory, maxsize=512)(lambda x: x ** 3)
+    return [cached(x) for x in range(start, start + 25)]
+
+class TestSharedMemoryCache(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def table(self, name='t', **kwargs):
+        table = SharedMemoryCache(name, directory=self.dir.name, **kwargs)
+        self.addCleanup(table.close)
+        return table
+
+    def test_get_set_delete(self):
+        table = self.table()
+        self.assertIsNone(table.get('a'))
+        self.assertTrue(table.set('a', b'1'))
+        self.assertTrue(table.set('a', b'22'))
+        self.assertEqual(table.get('a'), b'22')
+        self.assertEqual(self.table().get('a'), b'22')  # a second attachment sees it
+        self.assertEqual(table.contains_many(['a', 'b']), [True, False])
+        table.delete_many(['a'])
+        self.assertIsNone(table.get('a'))
+        self.assertFalse(table.set('big', b'x' * 5000))
+        self.assertEqual(table.too_large, 1)
+        with self.assertRaises(ValueError):
+            self.table(slots=2048)
+
+    def test_eviction_and_ttl(self):
+        table = self.table(slots=8, ways=8)  # one set
+        for i in range(8):
+            table.set(i, b'v')
+            time.sleep(0.002)
+        table.get(0)  # 1 is now the least recently used
+        table.set(8, b'v')
+        self.assertEqual(table.contains_many(range(9)), [True, False] + [True] * 7)
+        table.set('short', b'v', ttl=0.05)
+        time.sleep(0.1)
+        self.assertIsNone(table.get('short'))
+        self.assertEqual(table.count(), 7)  # 'short' took the LRU entry's slot, then expired
+        table.clear()
+        self.assertEqual(table.count(), 0)
+
+    def test_concurrent_readers_see_whole_values(self):
+        table = self.table(slots=16, ways=4, slot_size=1024)
+        stop, torn = threading.Event(), []
+        def write():
+            i = 0
+            while not stop.is_set():
+                i += 1
+                table.set(i % 40, bytes([i % 256]) * 900)
+        def read():
+            while not stop.is_set():
+                for key in range(40):
+                    value = table.get(key)
+                    if value is not None and (len(value) != 900 or value.count(value[:1]) != 900):
+                        torn.append(key)
+        threads = [threading.Thread(target=write) for _ in range(2)] + [threading.Thread(target=read) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.5)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(torn, [])
+
+    def test_decorator_across_processes(self):
+        with multiprocessing.get_context('spawn').Pool(3) as pool:
+            results = pool.starmap(cube_many, [(self.dir.name, start) for start in (0, 25, 50)])
+        self.assertEqual(results[1][0], 25 ** 3)
+        cached = shared_lru_cache(cache_id='cubes', directory=self.dir.name, maxsize=512, stats=True)(lambda x: -1)
+        self.assertEqual(cached(30), 27000)
+        self.assertEqual(cached.cache_stats()['hits'], 1)
+        self.assertEqual(cached.cache_info(), 75)
+        cached.cache_invalidate(30)
+        self.assertEqual(cached(30), -1)
+        cached.cache_clear()
+        self.assertEqual(cached.cache_info(), 0)
+        cached.table.unlink()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+from HANK_Caching.concurrency import RedisSingleFlight
+from HANK_Caching.decorators import conditional_lru_cache, redis_lru_cache
+from HANK_Caching.utils import SENTINEL, RedisClientManager
+from concurrent.futures import ThreadPoolExecutor
+import asyncio, redis, threading
+import unittest
+import time
+
+class LockOnlyClient:
+    """Takes the single-flight lock, then loses the connection before it can be released."""
+    def set(self, *args, **kwargs):
+        return True
+
+    def evalsha(self, *args):
+        raise redis.exceptions.TimeoutError("Timeout reading from socket")
+
+class AsyncLockOnlyClient:
+    async def set(self, *args, **kwargs):
+        return True
+
+    async def evalsha(self, *args):
+        raise redis.exceptions.TimeoutError("Timeout reading from socket")
+
+class TestSingleFlight(unittest.TestCase):
+    def setUp(self):
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def slow(self, a):
+        with self.lock:
+            self.calls += 1
+        time.sleep(0.2)
+        return a * 2
+
+    def test_memory_concurrent_misses_compute_once(self):
+        cached = conditional_lru_cache(maxsize=10, single_flight=True)(self.slow)
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(cached, [1] * 8))
+        self.assertEqual(results, [2] * 8)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(cached.single_flight_info()['local_deduplicated'], 7)
+
+    def test_memory_waiters_share_exceptions(self):
+        def fail(a):
+            time.sleep(0.1)
+            raise ValueError(a)
+        cached = conditional_lru_cache(single_flight=True)(fail)
+        with ThreadPoolExecutor(4) as pool:
+            futures = [pool.submit(cached, 1) for _ in range(4)]
+        for future in futures:
+            self.assertIsInstance(future.exception(), ValueError)
+
+    def test_failed_release_keeps_result(self):
+        flight = RedisSingleFlight(lock_timeout=5)
+        with self.assertLogs(level='WARNING'):
+            self.assertEqual(flight.do(LockOnlyClient(), 'k', lambda: SENTINEL, lambda: 'computed'), 'computed')
+        async def fetch():
+            return SENTINEL
+        async def compute():
+            return 'computed'
+        with self.assertLogs(level='WARNING'):
+            self.assertEqual(asyncio.run(flight.ado(AsyncLockOnlyClient(), 'k', fetch, compute)), 'computed')
+
+    @unittest.skipIf(RedisClientManager.get_redis_client(name="default") is None, "Redis is not available")
+    def test_redis_lock_across_wrappers(self):
+        # two wrappers on one cache_id stand in for two worker processes: they don't share in-process state
+        workers = [redis_lru_cache(cache_id='test_single_flight', single_flight=True, lock_timeout=5)(self.slow) for _ in range(2)]
+        workers[0].cache_clear()
+        self.addCleanup(workers[0].cache_clear)
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(lambda i: workers[i % 2](3), range(8)))
+        self.assertEqual(results, [6] * 8)
+        self.assertEqual(self.calls, 1)
+        info = [w.single_flight_info() for w in workers]
+        self.assertEqual(sum(i['local_deduplicated'] for i in info), 6)
+        self.assertEqual(sum(i['remote_deduplicated'] for i in info), 1)
+
+if __name__ == '__main__':
+    unittest.main()
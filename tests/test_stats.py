@@ -0,0 +1,72 @@
+from HANK_Caching.base import CachingBase
+from HANK_Caching.decorators import conditional_lru_cache, redis_lru_cache
+from HANK_Caching.stats import CacheStats, LatencyHistogram
+from HANK_Caching.utils import RedisClientManager
+import json
+import unittest
+
+class Service(CachingBase):
+    def __init__(self, decorator, cache_id=None):
+        self.func_cache_map = {
+            'double': {'decorator': decorator, 'stats': True, 'tags': ['math'], 'cache_id': cache_id and f"{cache_id}_double"},
+            'negate': {'decorator': decorator, 'stats': True, 'tags': ['other'], 'cache_id': cache_id and f"{cache_id}_negate"},
+        }
+        super().__init__()
+
+    def double(self, a):
+        return a * 2
+
+    def negate(self, a):
+        return -a
+
+class TestStats(unittest.TestCase):
+    def test_histogram(self):
+        histogram = LatencyHistogram()
+        for seconds in (0.000001, 0.000002, 0.001, 0.5):
+            histogram.record(seconds)
+        snapshot = histogram.snapshot()
+        self.assertEqual((snapshot['count'], snapshot['min'], snapshot['max']), (4, 0.000001, 0.5))
+        self.assertLessEqual(0.000002, histogram.percentile(50))
+        self.assertLessEqual(0.5, histogram.percentile(100))
+
+    def check_service(self, service):
+        for a in (1, 2, 1, 1):
+            service.double(a)
+        service.negate(1)
+        stats = service.cache_stats(tags=['math'])
+        self.assertEqual(list(stats['methods']), ['double'])
+        double = stats['methods']['double']
+        self.assertEqual((double['hits'], double['misses'], double['hit_rate']), (2, 2, 0.5))
+        self.assertEqual(double['phases']['compute']['count'], 2)
+        self.assertEqual(double['phases']['key_build']['count'], 4)
+        total = service.cache_stats()['total']
+        self.assertEqual((total['hits'], total['misses']), (2, 3))
+        json.dumps(total)
+        service.reset_cache_stats()
+        self.assertEqual(service.cache_stats()['total']['misses'], 0)
+
+    def test_memory(self):
+        self.check_service(Service(conditional_lru_cache))
+
+    @unittest.skipIf(RedisClientManager.get_redis_client(name="default") is None, "Redis is not available")
+    def test_redis(self):
+        service = Service(redis_lru_cache, cache_id='test_stats')
+        service.clear_caches()
+        self.addCleanup(service.clear_caches)
+        self.check_service(service)
+
+    def test_disabled_and_sinks(self):
+        self.assertIsNone(conditional_lru_cache()(abs).cache_stats())
+        events = []
+        stats = CacheStats('shared')
+        stats.add_sink(lambda name, event, value: events.append((name, event)))
+        cached = conditional_lru_cache(stats=stats)(abs)
+        cached(-1)
+        cached(-1)
+        self.assertIn(('shared', 'misses'), events)
+        self.assertIn(('shared', 'hits'), events)
+        self.assertIn(('shared', 'compute'), events)
+        self.assertEqual(CacheStats.sinks, [])
+
+if __name__ == '__main__':
+    unittest.main()
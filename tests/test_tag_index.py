@@ -0,0 +1,80 @@
+from HANK_Caching.base import CachingBase
+from HANK_Caching.decorators import redis_lru_cache
+from HANK_Caching.utils import RedisClientManager
+from HANK_Caching import redis_scripts, tag_index
+import multiprocessing
+import unittest
+
+def invalidate_in_other_process(tags):
+    return tag_index.invalidate_tags(tags)
+
+class Reports(CachingBase):
+    def __init__(self, cache_id):
+        self.func_cache_map = {
+            'monthly': {'decorator': redis_lru_cache, 'cache_id': f"{cache_id}_monthly", 'tags': ['reports']},
+            'daily': {'decorator': redis_lru_cache, 'cache_id': f"{cache_id}_daily", 'tags': ['daily']},
+        }
+        self.calls = 0
+        super().__init__()
+
+    def monthly(self, month):
+        self.calls += 1
+        return {'month': month}
+
+    def daily(self, day):
+        self.calls += 1
+        return {'day': day}
+
+@unittest.skipIf(RedisClientManager.get_redis_client(name="default") is None, "Redis is not available")
+class TestTagIndex(unittest.TestCase):
+    def test_registration(self):
+        cached = redis_lru_cache(cache_id='test_tag_index_registration', tags=['a', 'b'])(lambda x: x)
+        self.addCleanup(cached.cache_clear)
+        cached(1)
+        info = tag_index.registered_caches()[cached.cache_key_prefix]
+        self.assertEqual((info['cache_id'], info['tags']), ('test_tag_index_registration', ['a', 'b']))
+        self.assertIn(cached.cache_key_prefix, tag_index.prefixes_for_tags(cached.redis_client, ['b', 'zzz']))
+
+    def test_chunked_clear(self):
+        cached = redis_lru_cache(cache_id='test_tag_index_clear', maxsize=None)(lambda x: x)
+        cached.prefetch([(x,) for x in range(95)])
+        prefix, redis = cached.cache_key_prefix, cached.redis_client  # the node holding the cache, if sharded
+        redis.rpush(f"{prefix}:keys", f"{prefix}:legacy")  # the list index of older versions
+        redis.set(f"{prefix}:legacy", b'old')
+        self.assertEqual(tag_index.clear_prefix(redis, prefix, chunk_size=10), 96)
+        self.assertEqual(cached.cache_info(), 0)
+        self.assertEqual(redis.keys(f"{prefix}*"), [])
+        cached(1)  # the cache keeps working with a fresh index
+        self.assertEqual(cached.cache_info(), 1)
+        cached.cache_clear()
+        self.assertEqual(redis.keys(f"{prefix}*"), [])
+
+    def test_stores_during_clear_are_kept(self):
+        cached = redis_lru_cache(cache_id='test_tag_index_concurrent', maxsize=None)(lambda x: x)
+        self.addCleanup(cached.cache_clear)
+        cached.prefetch([(x,) for x in range(20)])
+        redis, index = cached.redis_client, redis_scripts.index_keys(cached.cache_key_prefix)
+        detached = tuple(f"{key}:clearing:test" for key in index)
+        self.assertEqual(redis_scripts.DETACH_INDEX(redis, keys=(*index, *detached)), 20)
+        cached(100)  # stored while the old index is being drained
+        while redis_scripts.CLEAR_CHUNK(redis, keys=(detached[0], detached[2]), args=(7,)):
+            pass
+        self.assertEqual(cached.contains_many([(0,), (100,)]), [False, True])
+
+    def test_invalidate_from_another_process(self):
+        first, second = Reports('test_tag_index_first'), Reports('test_tag_index_second')
+        for service in (first, second):
+            self.addCleanup(service.clear_caches)
+            service.monthly(1)
+            service.daily(1)
+        with multiprocessing.get_context('spawn').Pool(1) as pool:
+            self.assertEqual(pool.apply(invalidate_in_other_process, (['reports'],)), 2)
+        first.monthly(1)
+        first.daily(1)
+        self.assertEqual(first.calls, 3)  # monthly recomputed, daily still cached
+        second.clear_caches(tags=['daily'], everywhere=True)
+        first.daily(1)
+        self.assertEqual(first.calls, 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+from HANK_Caching.decorators import redis_lru_cache
+from HANK_Caching.concurrency import WriteBehind
+from HANK_Caching.utils import RedisClientManager
+import os, unittest
+import time
+
+class FailingClient:
+    def pipeline(self, transaction=True):
+        raise ConnectionError("down")
+
+class RecordingClient:
+    def __init__(self):
+        self.transactions = []
+
+    def pipeline(self, transaction=True):
+        self.transactions.append(transaction)
+        return self
+
+    def execute(self):
+        return []
+
+class TestWriteBehindQueue(unittest.TestCase):
+    def test_drop_policies(self):
+        written = []
+        writer = lambda pipe, items: written.extend(items)
+        queue = WriteBehind(max_queue=2, flush_interval=60, policy='drop_newest')
+        self.addCleanup(queue.close)
+        self.assertTrue(queue.put(FailingClient(), writer, 'a', 1))
+        self.assertTrue(queue.put(FailingClient(), writer, 'b', 2))
+        self.assertFalse(queue.put(FailingClient(), writer, 'c', 3))
+        self.assertEqual((queue.queued, queue.dropped, queue.pending()), (2, 1, 2))
+        queue.flush()
+        self.assertEqual((queue.failed, queue.pending()), (2, 0))
+
+        oldest = WriteBehind(max_queue=2, flush_interval=60, policy='drop_oldest')
+        self.addCleanup(oldest.close)
+        for i in range(3):
+            oldest.put(FailingClient(), writer, i, i)
+        self.assertEqual([entry[2] for entry in oldest._queue], [1, 2])
+        self.assertEqual(oldest.dropped, 1)
+
+    def test_batches_are_transactions(self):
+        client, written = RecordingClient(), []
+        queue = WriteBehind(flush_interval=60)
+        self.addCleanup(queue.close)
+        queue.put(client, lambda pipe, items: written.extend(items), 'a', 1)
+        queue.flush()
+        self.assertEqual((client.transactions, written), ([True], [('a', 1)]))
+
+    @unittest.skipUnless(hasattr(os, 'fork'), "needs fork")
+    def test_fork_while_locked(self):
+        queue = WriteBehind(flush_interval=60)
+        self.addCleanup(queue.close)
+        queue.put(RecordingClient(), lambda pipe, items: None, 'parent', 1)
+        with queue._cond:  # another thread holds the lock when the process forks
+            pid = os.fork()
+            if pid == 0:
+                client = RecordingClient()
+                queue.put(client, lambda pipe, items: None, 'child', 2)
+                queue.flush()
+                os._exit(0 if client.transactions == [True] and queue.pending() == 0 else 1)
+        deadline = time.time() + 5
+        while (status := os.waitpid(pid, os.WNOHANG))[0] == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        if status[0] == 0:
+            os.kill(pid, 9)
+            os.waitpid(pid, 0)
+            self.fail("the forked child deadlocked on the parent's lock")
+        self.assertEqual(os.waitstatus_to_exitcode(status[1]), 0)
+        self.assertEqual(queue.pending(), 1)  # the parent's write is still queued in the parent
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            WriteBehind(policy='nope')
+
+@unittest.skipIf(RedisClientManager.get_redis_client(name="default") is None, "Redis is not available")
+class TestRedisWriteBehind(unittest.TestCase):
+    def setUp(self):
+        self.calls = 0
+
+    def func(self, a):
+        self.calls += 1
+        return a * 2
+
+    def test_writes_land_in_batches(self):
+        queue = WriteBehind(flush_interval=0.5)
+        self.addCleanup(queue.close)
+        cached = redis_lru_cache(cache_id='test_write_behind', ttl=60, write_behind=queue)(self.func)
+        cached.cache_clear()
+        self.addCleanup(cached.cache_clear)
+        self.assertEqual([cached(i) for i in range(20)], [i * 2 for i in range(20)])
+        self.assertEqual(cached.cache_info(), 0)  # nothing written yet
+        deadline = time.time() + 5
+        while queue.flushed < 20 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(queue.stats(), {'queued': 20, 'flushed': 20, 'dropped': 0, 'failed': 0, 'pending': 0})
+        self.assertEqual(cached.cache_info(), 20)
+        self.assertEqual(cached(3), 6)
+        self.assertEqual(self.calls, 20)
+
+    def test_clear_flushes_first(self):
+        queue = WriteBehind(flush_interval=60)
+        self.addCleanup(queue.close)
+        cached = redis_lru_cache(cache_id='test_write_behind_clear', write_behind=queue)(self.func)
+        cached(1)
+        cached.cache_clear()
+        self.assertEqual(queue.pending(), 0)
+        self.assertEqual(cached.cache_info(), 0)
+
+if __name__ == '__main__':
+    unittest.main()